@@ -0,0 +1 @@
+"""Couche de données du tableau de bord des accidents de la route (BAAC)."""
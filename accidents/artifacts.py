@@ -0,0 +1,150 @@
+"""Magasin d'artefacts de figures pré-calculées.
+
+Les figures de accidents/figures.py ne dépendent que des données : pour une
+version des données, elles sont construites une seule fois, hors ligne, puis
+sérialisées (JSON Plotly, PNG et SVG pour matplotlib, JSON pour les tableaux).
+
+Chaque artefact est stocké sous l'empreinte de son contenu dans
+`data/cache/artifacts/objects/`, et un manifeste par version des données et
+des figures (`manifests/<clé>.json`) associe le nom de chaque figure à son
+objet. Des figures identiques entre deux versions partagent le même objet.
+
+Construction headless (par exemple lors du déploiement) :
+
+    python -m accidents.artifacts              # chaque année, puis toutes ensemble
+    python -m accidents.artifacts 2022 2023    # une sélection d'années
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+
+from accidents import figures, ingestion
+
+ARTIFACTS_DIR = os.path.join(ingestion.CACHE_DIR, "artifacts")
+
+# Extension des objets par format
+_EXTENSIONS = {"plotly": "json", "png": "png", "svg": "svg", "table": "json"}
+
+
+def manifest_key(data_version, filters=figures.FILTRES_MOTORISES):
+    """Clé du manifeste : version des données, filtres et version des figures."""
+    key = f"{data_version}:{filters!r}:{figures.FIGURES_VERSION}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _manifest_path(key):
+    return os.path.join(ARTIFACTS_DIR, "manifests", f"{key}.json")
+
+
+def _object_path(digest, kind):
+    return os.path.join(ARTIFACTS_DIR, "objects", digest[:2], f"{digest}.{_EXTENSIONS[kind]}")
+
+
+def _write_atomic(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def put_object(payload, kind):
+    """Enregistre un contenu sous son empreinte et retourne celle-ci."""
+    digest = hashlib.sha256(payload).hexdigest()
+    path = _object_path(digest, kind)
+    if not os.path.exists(path):
+        _write_atomic(path, payload)
+    return digest
+
+
+def serialize(figure):
+    """Contenus sérialisés d'une figure : {format: octets}."""
+    if isinstance(figure, pd.DataFrame):
+        return {"table": figure.to_json(orient="table").encode()}
+    if hasattr(figure, "savefig"):
+        rendered = {}
+        for kind in ("png", "svg"):
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format=kind, facecolor=figure.get_facecolor(), bbox_inches="tight")
+            rendered[kind] = buffer.getvalue()
+        return rendered
+    return {"plotly": figure.to_json().encode()}
+
+
+def render(built):
+    """Figures prêtes à afficher : les figures matplotlib sont rendues en PNG."""
+    return {
+        name: serialize(figure)["png"] if hasattr(figure, "savefig") else figure
+        for name, figure in built.items()
+    }
+
+
+def build(partitions):
+    """Construit et enregistre les figures des années données ; retourne la clé du manifeste."""
+    source_paths = [path for tables in partitions.values() for path in tables.values()]
+    key = manifest_key(ingestion.data_version(source_paths))
+    ingestion.ingest_partitions(partitions)
+    built = figures.build_all(figures.severity_cubes(partitions))
+    manifest = {
+        name: {kind: put_object(payload, kind) for kind, payload in serialize(figure).items()}
+        for name, figure in built.items()
+    }
+    _write_atomic(_manifest_path(key), json.dumps(manifest, indent=2).encode())
+    return key
+
+
+def referenced_paths(key):
+    """Fichiers d'un manifeste : le manifeste et les objets qu'il référence (aucun s'il n'existe pas)."""
+    path = _manifest_path(key)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        manifest = json.load(f)
+    return [path] + [_object_path(digest, kind) for objects in manifest.values() for kind, digest in objects.items()]
+
+
+def available(key):
+    """Indique si le manifeste a déjà été construit."""
+    return os.path.exists(_manifest_path(key))
+
+
+def load(key):
+    """Figures d'un manifeste : Plotly et tableaux désérialisés, PNG en octets.
+
+    Retourne None si le manifeste n'a pas été construit.
+    """
+    import plotly.io as pio
+
+    path = _manifest_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    loaded = {}
+    for name, objects in manifest.items():
+        if "plotly" in objects:
+            with open(_object_path(objects["plotly"], "plotly")) as f:
+                loaded[name] = pio.from_json(f.read())
+        elif "table" in objects:
+            with open(_object_path(objects["table"], "table")) as f:
+                loaded[name] = pd.read_json(io.StringIO(f.read()), orient="table")
+        else:
+            with open(_object_path(objects["png"], "png"), "rb") as f:
+                loaded[name] = f.read()
+    return loaded
+
+
+if __name__ == "__main__":
+    found = ingestion.discover_partitions()
+    if sys.argv[1:]:
+        selections = [[int(year) for year in sys.argv[1:]]]
+    else:
+        # Configurations du tableau de bord : chaque année seule, puis toutes les années
+        selections = [[year] for year in found] + ([list(found)] if len(found) > 1 else [])
+    for years in selections:
+        key = build({year: found[year] for year in years})
+        print(f"{', '.join(map(str, years))} -> {_manifest_path(key)}")
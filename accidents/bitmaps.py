@@ -0,0 +1,112 @@
+"""Index bitmap des dimensions filtrables (filtres croisés du tableau de bord).
+
+Pour chaque valeur de chaque dimension, un bitmap compressé (`np.packbits`,
+un bit par ligne) marque les lignes qui la portent. Il est construit une fois
+par version des données. Un filtre est l'union (OU) des bitmaps des valeurs
+retenues, ou le complément de l'union des valeurs exclues lorsque la
+sélection couvre plus de la moitié des valeurs, et les dimensions sont
+combinées par ET : aucun `isin` sur le DataFrame complet. Les plages de dates
+sont évaluées sur le nombre de jours depuis 1970 (int32).
+
+L'index des lignes sert aux cartes comme aux graphiques : les figures
+filtrées sont construites à partir des usagers retenus, le cube de comptages
+ne portant pas les dimensions des seuls filtres (luminosité, météo, surface).
+En mode approché, un index est construit sur l'échantillon.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from accidents import features, schema
+
+# Dimensions filtrables et leur libellé
+FILTER_DIMENSIONS = {
+    "dep": "Département",
+    "grav": "Gravité",
+    "catv": "Catégorie de véhicule",
+    "lum": "Luminosité",
+    "atm": "Conditions atmosphériques",
+    "surf": "État de la surface",
+    "plage_horaire": "Plage horaire",
+    "jour_semaine": "Jour de la semaine",
+}
+
+# Clé du filtre de dates : (date de début, date de fin) incluses
+DATE_FILTER = "date"
+
+_EPOCH = datetime.date(1970, 1, 1)
+
+
+def value_label(column, value):
+    """Libellé d'une valeur de dimension (libellé du code pour les colonnes codées)."""
+    return schema.LABELS.get(column, {}).get(value, value)
+
+
+def filter_key(filters):
+    """Représentation stable d'un jeu de filtres, utilisable comme clé de cache."""
+    return repr(sorted((column, sorted(map(str, values))) for column, values in filters.items()))
+
+
+class BitmapIndex:
+    """Bitmaps par valeur des dimensions filtrables d'un DataFrame."""
+
+    def __init__(self, frame, dimensions=FILTER_DIMENSIONS):
+        self.size = len(frame)
+        self.bitmaps = {}
+        for column in dimensions:
+            if column not in frame.columns:
+                continue
+            codes, uniques = pd.factorize(frame[column], sort=True)
+            # Lignes triées par code : chaque valeur occupe une tranche contiguë
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            bitmaps = {}
+            for position, value in enumerate(uniques):
+                rows = np.zeros(self.size, dtype=bool)
+                rows[order[bounds[position]:bounds[position + 1]]] = True
+                bitmaps[value.item() if hasattr(value, "item") else value] = np.packbits(rows)
+            self.bitmaps[column] = bitmaps
+        self.days = None
+        if {"an", "mois", "jour"} <= set(frame.columns):
+            self.days = features.days_from_civil(frame["an"], frame["mois"], frame["jour"]).astype(np.int32)
+
+    def values(self, column):
+        """Valeurs présentes d'une dimension."""
+        return list(self.bitmaps.get(column, {}))
+
+    def date_bounds(self):
+        """Première et dernière date présentes."""
+        return tuple(_EPOCH + datetime.timedelta(days=int(day)) for day in (self.days.min(), self.days.max()))
+
+    def _column_bits(self, column, selected):
+        bitmaps = self.bitmaps[column]
+        selected = set(selected)
+        excluded = [value for value in bitmaps if value not in selected]
+        # Sélection large : complément de l'union des valeurs exclues (moins d'opérations)
+        if len(excluded) < len(bitmaps) - len(excluded):
+            bits = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+            for value in excluded:
+                bits &= ~bitmaps[value]
+            return bits
+        bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for value in bitmaps:
+            if value in selected:
+                bits |= bitmaps[value]
+        return bits
+
+    def mask(self, filters):
+        """Masque booléen des lignes qui respectent tous les filtres.
+
+        `filters` associe à une dimension les valeurs retenues, et à "date" un
+        couple (début, fin) de `datetime.date`.
+        """
+        bits = np.full((self.size + 7) // 8, 0xFF, dtype=np.uint8)
+        for column, selected in filters.items():
+            if column != DATE_FILTER:
+                bits &= self._column_bits(column, selected)
+        mask = np.unpackbits(bits, count=self.size).view(bool)
+        if DATE_FILTER in filters and self.days is not None:
+            start, end = ((day - _EPOCH).days for day in filters[DATE_FILTER])
+            mask &= (self.days >= start) & (self.days <= end)
+        return mask
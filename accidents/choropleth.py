@@ -0,0 +1,140 @@
+"""Cartes choroplèthes des accidents par département et par commune.
+
+Les contours (fichiers GeoJSON locaux de data/geo/) sont simplifiés une fois
+par tolérance avec `shapely.coverage_simplify`, qui simplifie les limites
+partagées entre voisins de la même façon (ni trous ni chevauchements), puis
+enregistrés en GeoJSON compact (coordonnées arrondies à ~1 m) dans
+data/cache/geo/. La carte utilise la géométrie adaptée à son niveau de
+zoom : la carte nationale des ~35 000 communes n'envoie au navigateur que des
+contours grossiers, le détail n'étant chargé que pour un département.
+
+Pré-calcul de toutes les géométries simplifiées :
+
+    python -m accidents.choropleth
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import shapely
+
+from accidents import ingestion, spatial
+
+DEPARTEMENTS_PATH = "data/geo/departements.geojson"
+
+# Contours disponibles : niveau -> (fichier, colonne des accidents portant le code).
+# Les deux fichiers portent le code INSEE et le nom dans les mêmes propriétés que les communes.
+LEVELS = {
+    "dep": (DEPARTEMENTS_PATH, "dep"),
+    "com": (spatial.COMMUNES_PATH, "com"),
+}
+
+# Tolérance de simplification (mètres, projection de chaque territoire) à partir de chaque niveau de zoom
+TOLERANCES = {4: 2000, 6: 500, 8: 100, 10: 20}
+
+# À incrémenter si la simplification ou le format des fichiers change
+GEO_VERSION = 2
+
+GEO_CACHE_DIR = os.path.join(ingestion.CACHE_DIR, "geo")
+
+# Gravité « grave » : blessé hospitalisé ou tué
+_GRAVES = [3, 4]
+
+
+def tolerance_for_zoom(zoom):
+    """Tolérance de simplification adaptée à un niveau de zoom."""
+    eligible = [level for level in TOLERANCES if level <= zoom]
+    return TOLERANCES[max(eligible) if eligible else min(TOLERANCES)]
+
+
+def simplified_path(path, tolerance):
+    """Chemin du GeoJSON simplifié d'un fichier de contours."""
+    key = hashlib.sha256(f"{ingestion.file_hash(path)}:{tolerance}:{GEO_VERSION}".encode()).hexdigest()
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(GEO_CACHE_DIR, f"{name}-{tolerance}m-{key[:16]}.geojson")
+
+
+def simplify_boundaries(path, tolerance):
+    """Simplifie un fichier de contours (une fois) et retourne le chemin du résultat."""
+    target = simplified_path(path, tolerance)
+    if os.path.exists(target):
+        return target
+
+    boundaries = spatial.load_boundaries(path)
+    geometries = np.asarray(boundaries.geometry.values)
+    try:
+        geometries = shapely.coverage_simplify(geometries, tolerance)
+    except shapely.errors.GEOSException:
+        # Contours qui ne forment pas une couverture valide : simplification polygone par polygone
+        geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    simplified = boundaries[[spatial.COMMUNE_CODE, spatial.COMMUNE_NAME]].set_geometry(
+        spatial.unproject_geometries(geometries), crs=spatial.WGS84)
+    simplified = simplified.set_geometry(shapely.transform(simplified.geometry.values, lambda c: np.round(c, 5)))
+
+    os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(simplified.__geo_interface__, f, separators=(",", ":"))
+    os.replace(tmp_path, target)
+    return target
+
+
+def load_geojson(level, tolerance):
+    """Contours simplifiés d'un niveau ("dep" ou "com"), ou None sans fichier source."""
+    path = LEVELS[level][0]
+    if not os.path.exists(path):
+        return None
+    with open(simplify_boundaries(path, tolerance)) as f:
+        return json.load(f)
+
+
+def subset(geojson, prefix):
+    """Contours dont le code commence par `prefix` (ex. les communes d'un département)."""
+    features = [f for f in geojson["features"] if str(f["properties"][spatial.COMMUNE_CODE]).startswith(prefix)]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def severity_by_area(frame, level):
+    """Nombre d'usagers et part des usagers gravement atteints par zone."""
+    column = LEVELS[level][1]
+    severe = frame["grav"].isin(_GRAVES)
+    grouped = severe.groupby(frame[column], observed=True)
+    stats = grouped.agg(["size", "mean"]).reset_index()
+    stats.columns = ["code", "count", "part_graves"]
+    stats["code"] = stats["code"].astype(str)
+    return stats
+
+
+def choropleth_figure(geojson, stats, metric, zoom, center):
+    """Carte choroplèthe Plotly d'un indicateur ("count" ou "part_graves")."""
+    import plotly.express as px
+
+    fig = px.choropleth_mapbox(
+        stats,
+        geojson=geojson,
+        locations="code",
+        featureidkey=f"properties.{spatial.COMMUNE_CODE}",
+        color=metric,
+        color_continuous_scale="YlOrRd",
+        range_color=(0, 1) if metric == "part_graves" else None,
+        labels={"count": "Nombre d'usagers", "part_graves": "Part hospitalisés ou tués", "code": "Code"},
+        mapbox_style="open-street-map",
+        zoom=zoom,
+        center={"lat": center[0], "lon": center[1]},
+        opacity=0.6,
+        height=700,
+    )
+    # Contours fins : le tracé des limites coûte autant que les polygones
+    fig.update_traces(marker_line_width=0.3)
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+    return fig
+
+
+if __name__ == "__main__":
+    for level, (path, _) in LEVELS.items():
+        if not os.path.exists(path):
+            print(f"{path} absent, niveau « {level} » ignoré")
+            continue
+        for tolerance in TOLERANCES.values():
+            print(f"{level} {tolerance} m -> {simplify_boundaries(path, tolerance)}")
@@ -0,0 +1,113 @@
+"""Cubes de comptages pré-agrégés, un par groupe de graphiques.
+
+Chaque cube compte les usagers par combinaison des seules dimensions des
+graphiques qui en sont tirés (`CUBES`) : un cube unique croisant date,
+heure, département et véhicule compterait presque autant de cellules que de
+lignes. Les cubes sont construits ensemble, une fois par année et par
+version des données, enregistrés dans le cache Arrow (une partition par
+année, relue en memory-map et partagée entre processus, cf.
+accidents/store.py), et tous les graphiques du tableau de bord sont obtenus
+par agrégation (roll-up) du cube de leur groupe : leur coût ne dépend plus
+du nombre de lignes.
+
+Véhicule, luminosité, météo et surface ne servent qu'aux filtres croisés :
+les figures filtrées sont construites à partir des usagers retenus par
+l'index bitmap des lignes (accidents/bitmaps.py).
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from accidents import ingestion, query, store
+
+# À incrémenter si la construction du cube change
+CUBE_VERSION = 5
+
+# Dimensions du cube de chaque groupe de graphiques (cf. `figures.FIGURE_CUBES`).
+# La plage horaire dépend de l'heure : elle n'augmente pas le nombre de cellules.
+CUBES = {
+    "temps": ["an", "mois", "jour", "grav"],
+    "departement": ["dep", "grav"],
+    "heure": ["dep", "heure", "plage_horaire", "grav"],
+    "jour_semaine": ["dep", "jour_semaine", "grav"],
+}
+
+# Colonnes à lire pour construire les cubes
+COLUMNS = list(dict.fromkeys(column for dimensions in CUBES.values() for column in dimensions))
+
+
+def build_cube(frame, dimensions):
+    """Agrège une vue usagers en comptages par combinaison de dimensions."""
+    cube = frame.groupby(dimensions, observed=True).size().reset_index(name="count")
+    cube["count"] = cube["count"].astype(np.int32)
+    return cube
+
+
+def build_cubes(frame):
+    """Cube de chaque groupe de graphiques à partir d'une vue usagers : {groupe: cube}."""
+    return {group: build_cube(frame, dimensions) for group, dimensions in CUBES.items()}
+
+
+def apply_delta(cube, removed, added):
+    """Cube mis à jour : comptages des usagers retirés (vue usagers) soustraits, ceux des ajoutés ajoutés."""
+    dimensions = [column for column in cube.columns if column != "count"]
+    removed_cube = build_cube(removed, dimensions)
+    removed_cube["count"] = -removed_cube["count"]
+    merged = query.concat_frames([cube, removed_cube, build_cube(added, dimensions)])
+    updated = merged.groupby(dimensions, observed=True)["count"].sum().reset_index()
+    updated = updated[updated["count"] != 0].reset_index(drop=True)
+    updated["count"] = updated["count"].astype(np.int32)
+    return updated
+
+
+def cube_path(source_paths, filters, group):
+    """Chemin du cube d'un groupe pour une version des données et un jeu de filtres."""
+    version = ingestion.data_version(source_paths.values())
+    key = hashlib.sha256(f"{version}:{filters!r}:{CUBES[group]!r}:{CUBE_VERSION}".encode()).hexdigest()
+    _, year = ingestion.partition_of(source_paths["caract"])
+    return os.path.join(ingestion.CACHE_DIR, f"an={year}", f"cube-{group}-{key[:16]}.arrow")
+
+
+def load_year_cubes(source_paths, filters=()):
+    """Cubes d'une année depuis le cache partagé, ou construits (une fois par hôte) puis enregistrés.
+
+    Les colonnes ne sont lues qu'une fois pour tous les cubes à construire.
+    """
+    rows = []
+
+    def build(dimensions):
+        if not rows:
+            rows.append(query.run_query(source_paths, COLUMNS, filters).user_view(COLUMNS))
+        return build_cube(rows[0], dimensions)
+
+    return {group: store.shared(cube_path(source_paths, filters, group), lambda dimensions=dimensions: build(dimensions))
+            for group, dimensions in CUBES.items()}
+
+
+def load_cubes(partitions, filters=()):
+    """Cubes des années demandées ({année: {table: chemin}}), partition par partition : {groupe: cube}."""
+    per_year = [load_year_cubes(paths, filters) for paths in partitions.values()]
+    return {group: query.concat_frames([cubes[group] for cubes in per_year]) for group in CUBES}
+
+
+def rollup(cube, by, where=None):
+    """Somme des comptages du cube par dimensions `by`.
+
+    `where` restreint le cube avant agrégation, ex. {"dep": ["75", "92"]}.
+    """
+    if where:
+        mask = np.ones(len(cube), dtype=bool)
+        for column, values in where.items():
+            mask &= cube[column].isin(values).to_numpy()
+        cube = cube[mask]
+    return cube.groupby(by, observed=True)["count"].sum().reset_index()
+
+
+def crosstab(cube, index, columns, where=None, normalize=False):
+    """Équivalent de `pd.crosstab` obtenu à partir du cube."""
+    table = rollup(cube, [index, columns], where).pivot(index=index, columns=columns, values="count")
+    table = table.fillna(0)
+    if normalize:
+        table = table.div(table.sum(axis=1), axis=0)
+    return table
@@ -0,0 +1,66 @@
+"""Modèle en étoile des données BAAC.
+
+Les caractéristiques et les lieux forment la dimension « accident » (une
+ligne par Num_Acc). Les véhicules s'y rattachent par Num_Acc et les usagers
+à leur véhicule par (Num_Acc, id_vehicule). Chaque vue est construite au
+grain demandé, sans jamais matérialiser le produit cartésien
+véhicules × usagers d'un même accident.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+
+ACCIDENT_KEY = ["Num_Acc"]
+VEHICLE_KEY = ["Num_Acc", "id_vehicule"]
+
+
+def _attach(fact, dimension, key, columns):
+    """Ajoute à `fact` les colonnes demandées de `dimension` (jointure n-1)."""
+    wanted = [c for c in columns if c in dimension.columns and c not in fact.columns]
+    if not wanted:
+        return fact
+    return fact.merge(dimension[key + wanted], on=key, how="left", validate="many_to_one")
+
+
+def _select(frame, columns):
+    """Restreint un DataFrame aux colonnes demandées (clés comprises)."""
+    if columns is None:
+        return frame
+    return frame[[c for c in frame.columns if c in columns]]
+
+
+@dataclass(frozen=True)
+class StarSchema:
+    """Tables du modèle en étoile : accidents, véhicules et usagers."""
+    accidents: pd.DataFrame
+    vehicules: pd.DataFrame
+    usagers: pd.DataFrame
+
+    def accident_view(self, columns=None):
+        """Une ligne par accident (caractéristiques + lieux)."""
+        return _select(self.accidents, columns)
+
+    def vehicle_view(self, columns=None):
+        """Une ligne par véhicule, enrichie des colonnes de l'accident."""
+        wanted = list(self.accidents.columns) if columns is None else list(columns)
+        view = _select(self.vehicules, None if columns is None else VEHICLE_KEY + wanted)
+        return _attach(view, self.accidents, ACCIDENT_KEY, wanted)
+
+    def user_view(self, columns=None):
+        """Une ligne par usager, enrichie de son véhicule et de l'accident."""
+        if columns is None:
+            wanted = list(self.vehicules.columns) + list(self.accidents.columns)
+        else:
+            wanted = list(columns)
+        view = _select(self.usagers, None if columns is None else VEHICLE_KEY + wanted)
+        view = _attach(view, self.vehicules, VEHICLE_KEY, wanted)
+        return _attach(view, self.accidents, ACCIDENT_KEY, wanted)
+
+
+def build_schema(caract_df, lieux_df, vehicules_df, usagers_df):
+    """Construit le modèle en étoile à partir des quatre fichiers BAAC."""
+    # Quelques accidents ont plusieurs lignes de lieux : on garde la première
+    lieux_df = lieux_df.drop_duplicates(subset=ACCIDENT_KEY)
+    accidents = caract_df.merge(lieux_df, on=ACCIDENT_KEY, how="left", validate="one_to_one")
+    vehicules = vehicules_df.drop_duplicates(subset=VEHICLE_KEY)
+    return StarSchema(accidents=accidents, vehicules=vehicules, usagers=usagers_df)
@@ -0,0 +1,157 @@
+"""Description des variables de chaque fichier BAAC (codes et libellés)."""
+
+# Dictionnaire contenant les descriptions des variables pour chaque fichier
+DESCRIPTIONS = {
+    "Caractéristiques (caract-2023.csv)": {
+        "Num_Acc": "Identifiant unique de l'accident.",
+        "an": "Année de l'accident.",
+        "mois": "Mois de l'accident.",
+        "jour": "Jour de l'accident.",
+        "hrmn": "Heure et minute de l'accident (exemple : '13h45').",
+        "lum": "Conditions de luminosité :\n"
+               "1 : Plein jour.\n"
+               "2 : Crépuscule ou aube.\n"
+               "3 : Nuit sans éclairage.\n"
+               "4 : Nuit avec éclairage non allumé.\n"
+               "5 : Nuit avec éclairage allumé.",
+        "agg": "L'accident a-t-il eu lieu en agglomération ?\n"
+               "1 : Oui.\n"
+               "2 : Non.",
+        "int": "Type d'intersection :\n"
+               "1 : Hors intersection.\n"
+               "2 : Intersection en X.\n"
+               "3 : Intersection en T.\n"
+               "4 : Intersection en Y.\n"
+               "5 : Rond-point.\n"
+               "6 : Place.\n"
+               "7 : Autre intersection.",
+        "atm": "Conditions atmosphériques :\n"
+               "1 : Normales.\n"
+               "2 : Pluie légère.\n"
+               "3 : Pluie forte.\n"
+               "4 : Neige ou grêle.\n"
+               "5 : Brouillard ou fumée.\n"
+               "6 : Vent fort ou tempête.\n"
+               "7 : Temps éblouissant.\n"
+               "8 : Temps couvert.\n"
+               "9 : Autres.",
+        "col": "Type de collision :\n"
+               "1 : Deux véhicules - frontale.\n"
+               "2 : Deux véhicules - par l'arrière.\n"
+               "3 : Deux véhicules - par le côté.\n"
+               "4 : Trois véhicules ou plus - en chaîne.\n"
+               "5 : Trois véhicules ou plus - collisions multiples.\n"
+               "6 : Autre collision.",
+        "dep": "Département où l'accident a eu lieu.",
+        "com": "Commune où l'accident a eu lieu.",
+        "adr": "Adresse approximative de l'accident."
+    },
+    "Lieux (lieux-2023.csv)": {
+        "Num_Acc": "Identifiant unique de l'accident.",
+        "catr": "Catégorie de route :\n"
+                "1 : Autoroute.\n"
+                "2 : Route nationale.\n"
+                "3 : Route départementale.\n"
+                "4 : Voie communale.\n"
+                "5 : Hors réseau public.\n"
+                "6 : Parking.\n"
+                "7 : Autres.",
+        "voie": "Numéro de voie.",
+        "v1": "Numéro de l'indice de lieu (précision géographique).",
+        "v2": "Numéro de l'indice de lieu (précision géographique).",
+        "circ": "Régime de circulation :\n"
+                "1 : À sens unique.\n"
+                "2 : Bidirectionnelle.\n"
+                "3 : Avec voies spécialisées.",
+        "nbv": "Nombre de voies.",
+        "prof": "Profil de la route :\n"
+                "1 : Plat.\n"
+                "2 : Pente.\n"
+                "3 : Sommet de côte.\n"
+                "4 : Bas de côte.",
+        "plan": "Tracé en plan :\n"
+                "1 : Rectiligne.\n"
+                "2 : En courbe à gauche.\n"
+                "3 : En courbe à droite.\n"
+                "4 : En S.",
+        "surf": "État de la surface :\n"
+                "1 : Normale.\n"
+                "2 : Mouillée.\n"
+                "3 : En flaques.\n"
+                "4 : Verglacée.\n"
+                "5 : Boue.\n"
+                "6 : Neige.\n"
+                "7 : Sable ou gravillons.\n"
+                "8 : Huile.\n"
+                "9 : Autres.",
+        "infra": "Présence d'infrastructure particulière :\n"
+                 "0 : Aucune.\n"
+                 "1 : Souterrain.\n"
+                 "2 : Pont.\n"
+                 "3 : Bretelle.\n"
+                 "4 : Voie ferrée.\n"
+                 "5 : Carrefour aménagé.\n"
+                 "6 : Zone piétonne.\n"
+                 "7 : Zone de péage.",
+        "situ": "Localisation de l'accident :\n"
+                "1 : Sur chaussée.\n"
+                "2 : Sur bande d'arrêt d'urgence.\n"
+                "3 : Sur accotement.\n"
+                "4 : Sur trottoir.\n"
+                "5 : Sur piste cyclable."
+    },
+    "Véhicules (vehicules-2023.csv)": {
+        "Num_Acc": "Identifiant unique de l'accident.",
+        "id_vehicule": "Identifiant unique du véhicule.",
+        "catv": "Catégorie du véhicule :\n"
+                "1 : Vélo.\n"
+                "2 : Cyclomoteur.\n"
+                "3 : Moto < 50 cm³.\n"
+                "4 : Moto > 50 cm³.\n"
+                "5 : VL seul.\n"
+                "6 : VL + remorque.\n"
+                "7 : VU seul.\n"
+                "8 : VU + remorque.\n"
+                "9 : PL seul 3,5T < PTAC < 7,5T.\n"
+                "10 : PL > 7,5T.\n"
+                "11 : Bus.\n"
+                "12 : Tramway.\n"
+                "13 : Train.\n"
+                "14 : Engin spécial.\n"
+                "15 : Autre.",
+        "obs": "Obstacle fixe heurté.",
+        "obsm": "Obstacle mobile heurté.",
+        "choc": "Point initial du choc :\n"
+                "1 : Avant.\n"
+                "2 : Avant droit.\n"
+                "3 : Avant gauche.\n"
+                "4 : Arrière.\n"
+                "5 : Arrière droit.\n"
+                "6 : Arrière gauche.",
+        "manv": "Manœuvre principale avant l'accident."
+    },
+    "Usagers (usagers-2023.csv)": {
+        "Num_Acc": "Identifiant unique de l'accident.",
+        "id_vehicule": "Identifiant unique du véhicule associé.",
+        "place": "Position dans le véhicule (conducteur, passager, etc.).",
+        "catu": "Catégorie d'usager :\n"
+                "1 : Conducteur.\n"
+                "2 : Passager.\n"
+                "3 : Piéton.",
+        "grav": "Gravité de l'accident pour la personne :\n"
+                "1 : Indemne.\n"
+                "2 : Blessé léger.\n"
+                "3 : Blessé hospitalisé.\n"
+                "4 : Tué.",
+        "sexe": "Sexe de l'usager :\n"
+                "1 : Masculin.\n"
+                "2 : Féminin.",
+        "trajet": "Raison du déplacement :\n"
+                  "1 : Domicile-travail.\n"
+                  "2 : Domicile-école.\n"
+                  "3 : Déplacement professionnel.\n"
+                  "4 : Loisirs.\n"
+                  "5 : Autres.",
+        "secu": "Utilisation des équipements de sécurité (ceinture, casque, etc.)."
+    }
+}
@@ -0,0 +1,340 @@
+"""Export en continu des données filtrées (Parquet ou CSV).
+
+L'export porte sur la vue choisie (usagers, véhicules ou accidents) des
+années sélectionnées, restreinte aux filtres du tableau de bord (filtres de
+lecture et filtres croisés) et aux seules colonnes demandées. Il est produit
+année par année, sans DataFrame : les filtres sont poussés dans la lecture
+des caches Arrow, les clés des accidents, véhicules et usagers retenus sont
+déterminées, puis la table au grain de la vue est lue par lots de
+`CHUNK_ROWS` lignes (record batches), complétée des colonnes des tables
+rattachées et écrite dans un fichier Parquet ou CSV. La mémoire est bornée
+par un lot, les clés retenues et les colonnes demandées des tables
+rattachées d'une année.
+
+Les exports sont construits dans des threads (`EXPORT_WORKERS` au plus par
+processus) sans bloquer les sessions, écrits de façon atomique dans
+static/exports/, puis servis par le serveur de fichiers statiques de
+Streamlit (option `server.enableStaticServing`, cf. .streamlit/config.toml),
+qui les lit depuis le disque par morceaux. Un export déjà construit pour la
+même version des données, la même vue, les mêmes colonnes et les mêmes
+filtres est réutilisé ; les exports plus anciens que `EXPORT_TTL_S` sont
+supprimés.
+"""
+import glob
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from accidents import bitmaps, figures, ingestion, query, store
+from accidents.data_model import ACCIDENT_KEY, VEHICLE_KEY
+
+# À incrémenter si le contenu ou le format des exports change
+EXPORT_VERSION = 2
+
+# Dossier servi par Streamlit sous l'URL app/static/
+STATIC_DIR = "static"
+EXPORTS_DIR = os.path.join(STATIC_DIR, "exports")
+
+# Verrous de construction, hors du dossier servi : un nombre fixe de fichiers, jamais
+# supprimés (supprimer un verrou tenu par un autre processus le rendrait inopérant)
+LOCKS_DIR = os.path.join(ingestion.CACHE_DIR, "exports")
+LOCK_STRIPES = 64
+
+# Taille maximale d'un fichier servi par Streamlit (server.enableStaticServing)
+MAX_EXPORT_BYTES = 200 * 1024 * 1024
+
+# Lignes par lot écrit
+CHUNK_ROWS = 100_000
+
+# Exports construits simultanément par processus
+EXPORT_WORKERS = 2
+
+# Durée de conservation d'un export (secondes)
+EXPORT_TTL_S = 6 * 3600
+
+# Vues exportables : grain et tables dont les colonnes sont proposées
+VIEWS = {
+    "usagers": ("Usagers (une ligne par usager)", ["usagers", "vehicules", "caract", "lieux"]),
+    "vehicules": ("Véhicules (une ligne par véhicule)", ["vehicules", "caract", "lieux"]),
+    "accidents": ("Accidents (une ligne par accident)", ["caract", "lieux"]),
+}
+
+# Colonnes proposées par défaut
+DEFAULT_COLUMNS = {
+    "usagers": ["Num_Acc", "id_vehicule", "catu", "grav", "sexe", "an_nais", "dep", "an", "mois", "jour"],
+    "vehicules": ["Num_Acc", "id_vehicule", "catv", "obsm", "choc", "manv", "dep", "an", "mois", "jour"],
+    "accidents": ["Num_Acc", "an", "mois", "jour", "hrmn", "dep", "com", "lat", "long", "lum", "atm"],
+}
+
+# Formats : (libellé, extension)
+FORMATS = {
+    "parquet": ("Parquet", "parquet"),
+    "csv": ("CSV", "csv"),
+    "csv.gz": ("CSV compressé (gzip)", "csv.gz"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+
+# Exports en cours ou terminés dans ce processus : {chemin: future}
+_lock = threading.Lock()
+_jobs = {}
+
+
+def view_columns(partitions, view):
+    """Colonnes exportables d'une vue, dans l'ordre des tables (schéma des caches Arrow)."""
+    source_paths = next(iter(partitions.values()))
+    columns = {}
+    for table in VIEWS[view][1]:
+        for name in ds.dataset(ingestion.ensure_cached(source_paths[table]), format="ipc").schema.names:
+            columns.setdefault(name, table)
+    return list(columns)
+
+
+def export_path(data_version, view, columns, fmt, filters=figures.FILTRES_MOTORISES, cross_filters=None):
+    """Chemin de l'export d'une version des données, d'une vue, de colonnes et de filtres."""
+    key = (f"{data_version}:{view}:{list(columns)!r}:{filters!r}:"
+           f"{bitmaps.filter_key(cross_filters or {})}:{EXPORT_VERSION}")
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return os.path.join(EXPORTS_DIR, f"accidents-{view}-{digest[:16]}.{FORMATS[fmt][1]}")
+
+
+def _lock_path(path):
+    """Verrou de construction d'un export : l'un des `LOCK_STRIPES` verrous, choisi par son nom."""
+    stripe = int(hashlib.sha256(os.path.basename(path).encode()).hexdigest(), 16) % LOCK_STRIPES
+    return os.path.join(LOCKS_DIR, f"verrou-{stripe:02d}")
+
+
+def url(path):
+    """URL de téléchargement d'un export servi par Streamlit."""
+    return "app/" + os.path.relpath(path).replace(os.sep, "/")
+
+
+# Table au grain de chaque vue et sa clé
+_GRAINS = {
+    "usagers": ("usagers", VEHICLE_KEY),
+    "vehicules": ("vehicules", VEHICLE_KEY),
+    "accidents": ("caract", ACCIDENT_KEY),
+}
+
+# Tables rattachées à chaque grain (jointure n-1) et leur clé
+_DIMENSIONS = {
+    "usagers": [("vehicules", VEHICLE_KEY), ("caract", ACCIDENT_KEY), ("lieux", ACCIDENT_KEY)],
+    "vehicules": [("caract", ACCIDENT_KEY), ("lieux", ACCIDENT_KEY)],
+    "accidents": [("lieux", ACCIDENT_KEY)],
+}
+
+
+def export_schema(partitions, columns):
+    """Schéma d'un export : type de chaque colonne dans le cache Arrow, catégories décodées."""
+    datasets = query.open_datasets(next(iter(partitions.values())))
+    owner = query.column_owners(datasets)
+    fields = []
+    for column in columns:
+        field = datasets[owner[column]].schema.field(column)
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _date_expression(first, last):
+    """Plage de dates incluses, évaluée sur an * 10000 + mois * 100 + jour."""
+    ordinal = (pc.field("an").cast(pa.int32()) * 10_000 + pc.field("mois").cast(pa.int32()) * 100
+               + pc.field("jour").cast(pa.int32()))
+    return ((ordinal >= first.year * 10_000 + first.month * 100 + first.day)
+            & (ordinal <= last.year * 10_000 + last.month * 100 + last.day))
+
+
+def _key(data, key):
+    """Clé d'une table ou d'un lot Arrow ; la clé véhicule est ramenée à une chaîne « Num_Acc:id_vehicule »."""
+    if key == ACCIDENT_KEY:
+        keys = data.column("Num_Acc")
+    else:
+        keys = pc.binary_join_element_wise(pc.cast(data.column("Num_Acc"), pa.large_string()),
+                                           pc.cast(data.column("id_vehicule"), pa.large_string()),
+                                           pa.scalar(":", pa.large_string()))
+    return keys.combine_chunks() if isinstance(keys, pa.ChunkedArray) else keys
+
+
+def _read(dataset, columns, expressions):
+    return dataset.to_table(columns=list(dict.fromkeys(columns)), filter=query.combine(expressions))
+
+
+def _year_batches(source_paths, view, columns, filters, cross_filters, schema, batch_rows):
+    """Lots exportés d'une année.
+
+    Les filtres de lecture et les filtres croisés sont poussés dans la lecture
+    de la table qui porte leur colonne ; seules les clés des accidents, véhicules
+    et usagers retenus sont lues en entier, les colonnes exportées étant lues
+    par lots de la table au grain de la vue.
+    """
+    datasets = query.open_datasets(source_paths)
+    owner = query.column_owners(datasets)
+    expressions = query.filter_expressions(owner, list(filters) + [
+        (column, "in", list(values)) for column, values in cross_filters.items() if column != bitmaps.DATE_FILTER])
+    if bitmaps.DATE_FILTER in cross_filters:
+        expressions[owner["an"]].append(_date_expression(*cross_filters[bitmaps.DATE_FILTER]))
+
+    # Clés retenues : accidents, puis véhicules, puis usagers (mêmes règles que `query.query_datasets`)
+    accidents = _key(_read(datasets["caract"], ACCIDENT_KEY, expressions["caract"]), ACCIDENT_KEY)
+    if expressions["lieux"]:
+        lieux = _key(_read(datasets["lieux"], ACCIDENT_KEY, expressions["lieux"]), ACCIDENT_KEY)
+        accidents = pc.filter(accidents, pc.is_in(accidents, value_set=lieux))
+    vehicles = _read(datasets["vehicules"], VEHICLE_KEY,
+                     expressions["vehicules"] + [pc.field("Num_Acc").isin(accidents)])
+    vehicle_keys = pc.unique(_key(vehicles, VEHICLE_KEY))
+    vehicle_accidents = pc.unique(vehicles.column("Num_Acc"))
+    user_filter = query.combine(expressions["usagers"] + [pc.field("Num_Acc").isin(vehicle_accidents)])
+
+    grain, key = _GRAINS[view]
+    if view == "usagers":
+        kept = vehicle_keys
+        grain_filter = user_filter
+    else:
+        users = datasets["usagers"].to_table(columns=VEHICLE_KEY, filter=user_filter)
+        users = users.filter(pc.is_in(_key(users, VEHICLE_KEY), value_set=vehicle_keys))
+        kept = pc.unique(_key(users, key))
+        grain_filter = pc.field("Num_Acc").isin(pc.unique(users.column("Num_Acc")))
+        users = None
+
+    # Colonnes des tables rattachées, restreintes aux accidents retenus
+    grain_columns = [column for column in columns if column in key or owner[column] == grain]
+    accident_filter = pc.field("Num_Acc").isin(accidents)
+    dimensions = []
+    for table, dimension_key in _DIMENSIONS[view]:
+        wanted = [column for column in columns if column not in grain_columns and owner[column] == table]
+        if wanted:
+            data = _read(datasets[table], dimension_key + wanted, [accident_filter])
+            dimensions.append((_key(data, dimension_key), dimension_key,
+                               {column: data.column(column).combine_chunks() for column in wanted}))
+
+    # Un véhicule présent plusieurs fois n'est exporté qu'une fois (première ligne, cf. `query.query_datasets`)
+    emitted = np.zeros(len(kept), dtype=bool) if view == "vehicules" else None
+    scanner = datasets[grain].scanner(columns=list(dict.fromkeys(key + grain_columns)), filter=grain_filter,
+                                      batch_size=batch_rows)
+    for batch in scanner.to_batches():
+        if key == VEHICLE_KEY:
+            positions = pc.index_in(_key(batch, key), value_set=kept)
+            batch = batch.filter(pc.is_valid(positions))
+            if emitted is not None:
+                positions = pc.drop_null(positions).to_numpy()
+                _, first = np.unique(positions, return_index=True)
+                first = first[~emitted[positions[first]]]
+                emitted[positions[first]] = True
+                batch = batch.take(pa.array(np.sort(first)))
+        if not batch.num_rows:
+            continue
+        values = {column: batch.column(column) for column in grain_columns}
+        for dimension_keys, dimension_key, dimension_columns in dimensions:
+            positions = pc.index_in(_key(batch, dimension_key), value_set=dimension_keys)
+            for column, array in dimension_columns.items():
+                values[column] = array.take(positions)
+        yield pa.RecordBatch.from_arrays([pc.cast(values[field.name], field.type) for field in schema],
+                                         schema=schema)
+
+
+def filtered_batches(partitions, view, columns, filters=figures.FILTRES_MOTORISES, cross_filters=None,
+                     schema=None, batch_rows=CHUNK_ROWS):
+    """Lignes exportées, par lots Arrow d'au plus `batch_rows` lignes, année après année.
+
+    Les usagers retenus sont ceux qui respectent les filtres sur toutes leurs
+    colonnes (usager, véhicule, accident) ; les véhicules et accidents exportés
+    sont ceux d'au moins un usager retenu.
+    """
+    schema = schema or export_schema(partitions, columns)
+    for source_paths in partitions.values():
+        yield from _year_batches(source_paths, view, list(columns), filters, cross_filters or {}, schema,
+                                 batch_rows)
+
+
+def _open_writer(path, fmt, schema):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(path, schema, compression="zstd"), None
+    import pyarrow.csv as csv
+
+    sink = pa.CompressedOutputStream(path, "gzip") if fmt == "csv.gz" else pa.OSFile(path, "wb")
+    return csv.CSVWriter(sink, schema), sink
+
+
+def write_export(batches, schema, path, fmt):
+    """Écrit des lots Arrow successifs (écriture atomique) ; retourne le nombre de lignes.
+
+    Le fichier est ouvert avant le premier lot : un export sans ligne conserve le schéma.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    rows = 0
+    writer, sink = _open_writer(tmp_path, fmt, schema)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+        if sink is not None:
+            sink.close()
+    os.replace(tmp_path, path)
+    return rows
+
+
+def remove_old_exports(max_age=EXPORT_TTL_S):
+    """Supprime les exports plus anciens que `max_age` secondes ; retourne leur nombre."""
+    removed = 0
+    limit = time.time() - max_age
+    # Exports terminés seulement (pas les écritures en cours, suffixées .tmp)
+    paths = [path for _, extension in FORMATS.values()
+             for path in glob.glob(os.path.join(EXPORTS_DIR, f"accidents-*.{extension}"))]
+    for path in paths:
+        if os.path.getmtime(path) < limit:
+            with _lock:
+                if path in _jobs and not _jobs[path].done():
+                    continue
+                _jobs.pop(path, None)
+            os.remove(path)
+            removed += 1
+    return removed
+
+
+def _build(partitions, view, columns, fmt, filters, cross_filters, path):
+    # Un seul export d'un même fichier à la fois sur l'hôte
+    with store.build_lock(_lock_path(path)):
+        if not os.path.exists(path):
+            schema = export_schema(partitions, columns)
+            write_export(filtered_batches(partitions, view, columns, filters, cross_filters, schema), schema, path, fmt)
+    return path
+
+
+def submit(data_version, partitions, view, columns, fmt, filters=figures.FILTRES_MOTORISES, cross_filters=None):
+    """Lance la construction d'un export en arrière-plan (sauf s'il existe déjà) ; retourne son chemin."""
+    path = export_path(data_version, view, columns, fmt, filters, cross_filters)
+    remove_old_exports()
+    with _lock:
+        job = _jobs.get(path)
+        running = job is not None and not job.done()
+        # Un export en échec est relancé
+        if not running and not os.path.exists(path):
+            _jobs[path] = _executor.submit(_build, partitions, view, list(columns), fmt, filters,
+                                           cross_filters or {}, path)
+    return path
+
+
+def status(path):
+    """État d'un export : ("pret", taille en octets), ("en_cours", None), ("echec", message) ou (None, None)."""
+    with _lock:
+        job = _jobs.get(path)
+    if job is not None and not job.done():
+        return "en_cours", None
+    if job is not None and job.exception() is not None:
+        return "echec", str(job.exception())
+    if os.path.exists(path):
+        return "pret", os.path.getsize(path)
+    return None, None
@@ -0,0 +1,112 @@
+"""Variables temporelles dérivées (heure, plage horaire, jour de la semaine, etc.).
+
+Tout est calculé par arithmétique entière vectorisée et tables de
+correspondance : l'heure est extraite des ~1 440 catégories de `hrmn` et non
+ligne par ligne, et les dates sont converties en nombre de jours depuis le
+1er janvier 1970 (algorithme « days from civil » de H. Hinnant) sans passer
+par `pd.to_datetime`. Les variables sont ajoutées à la table des
+caractéristiques lors de l'ingestion et donc mises en cache avec elle.
+"""
+import numpy as np
+import pandas as pd
+
+PLAGES_HORAIRES = ["Matin (6h-12h)", "Après-midi (12h-18h)", "Soir (18h-6h)"]
+JOURS_SEMAINE = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+
+# Plage horaire de chaque heure : 0-5 soir, 6-11 matin, 12-17 après-midi, 18-23 soir
+_PLAGE_PAR_HEURE = np.array([2] * 6 + [0] * 6 + [1] * 6 + [2] * 6, dtype=np.int8)
+
+# Nombre de jours écoulés avant chaque mois (année non bissextile)
+_JOURS_AVANT_MOIS = np.array([0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334], dtype=np.int16)
+
+
+def hour_minute(hrmn):
+    """Heure et minute (int8) d'une colonne 'HH:MM' ou 'HHMM', calculées sur ses catégories."""
+    hrmn = hrmn if isinstance(hrmn.dtype, pd.CategoricalDtype) else hrmn.astype("category")
+    # 'HH:MM' depuis 2019, 'HHMM' sans zéros initiaux (ex. '845') jusqu'en 2018
+    digits = hrmn.cat.categories.astype(str).str.replace(":", "", regex=False).str.zfill(4)
+    hour_lookup = np.asarray(pd.to_numeric(digits.str.slice(0, 2), errors="coerce"), dtype=float)
+    minute_lookup = np.asarray(pd.to_numeric(digits.str.slice(2, 4), errors="coerce"), dtype=float)
+    # Code -1 (valeur manquante) : dernière case de la table, à -1
+    hour_lookup = np.append(np.nan_to_num(hour_lookup, nan=-1), -1).astype(np.int8)
+    minute_lookup = np.append(np.nan_to_num(minute_lookup, nan=-1), -1).astype(np.int8)
+    codes = hrmn.cat.codes.to_numpy()
+    return hour_lookup[codes], minute_lookup[codes]
+
+
+def time_slots(heure):
+    """Plage horaire (category ordonnée) de chaque heure."""
+    heure = np.asarray(heure, dtype=np.int64)
+    codes = np.where((heure >= 0) & (heure < 24), _PLAGE_PAR_HEURE[heure % 24], -1)
+    return pd.Categorical.from_codes(codes, PLAGES_HORAIRES, ordered=True)
+
+
+def days_from_civil(an, mois, jour):
+    """Nombre de jours depuis le 1970-01-01 pour des dates (année, mois, jour)."""
+    y = np.asarray(an, dtype=np.int64) - (np.asarray(mois) <= 2)
+    m = np.asarray(mois, dtype=np.int64)
+    d = np.asarray(jour, dtype=np.int64)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _is_leap(an):
+    an = np.asarray(an, dtype=np.int64)
+    return (an % 4 == 0) & ((an % 100 != 0) | (an % 400 == 0))
+
+
+def day_of_year(an, mois, jour):
+    """Quantième (1-366) de chaque date."""
+    mois = np.asarray(mois, dtype=np.int64)
+    return _JOURS_AVANT_MOIS[mois] + np.asarray(jour) + ((mois > 2) & _is_leap(an))
+
+
+def weekday(days):
+    """Jour de la semaine (0 = lundi) à partir du nombre de jours depuis 1970."""
+    # Le 1970-01-01 était un jeudi
+    return (np.asarray(days) + 3) % 7
+
+
+def iso_week(an, mois, jour):
+    """Numéro de semaine ISO 8601 de chaque date."""
+    days = days_from_civil(an, mois, jour)
+    doy = day_of_year(an, mois, jour)
+    # La semaine ISO est celle de son jeudi
+    thursday_doy = doy - weekday(days) + 3
+    an = np.asarray(an, dtype=np.int64)
+    year_length = 365 + _is_leap(an)
+    previous_length = 365 + _is_leap(an - 1)
+    thursday_doy = np.select(
+        [thursday_doy < 1, thursday_doy > year_length],
+        [thursday_doy + previous_length, thursday_doy - year_length],
+        default=thursday_doy,
+    )
+    return (thursday_doy - 1) // 7 + 1
+
+
+def dates(an, mois, jour):
+    """Dates (datetime64) sans analyse de chaînes."""
+    return pd.to_datetime(days_from_civil(an, mois, jour), unit="D")
+
+
+def weekdays(an, mois, jour):
+    """Jour de la semaine en français (category ordonnée) de chaque date."""
+    return pd.Categorical.from_codes(weekday(days_from_civil(an, mois, jour)), JOURS_SEMAINE, ordered=True)
+
+
+def add_time_features(caract_df):
+    """Ajoute les variables temporelles à la table des caractéristiques."""
+    heure, minute = hour_minute(caract_df["hrmn"])
+    an, mois, jour = caract_df["an"], caract_df["mois"], caract_df["jour"]
+    days = days_from_civil(an, mois, jour)
+    return caract_df.assign(
+        heure=heure,
+        minute=minute,
+        plage_horaire=time_slots(heure),
+        jour_semaine=pd.Categorical.from_codes(weekday(days), JOURS_SEMAINE, ordered=True),
+        semaine_iso=iso_week(an, mois, jour).astype(np.int8),
+        jour_annee=day_of_year(an, mois, jour).astype(np.int16),
+    )
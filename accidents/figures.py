@@ -0,0 +1,351 @@
+"""Figures statiques du tableau de bord, construites à partir des cubes de gravité.
+
+Chaque fonction de `FIGURES` prend le cube de son groupe (`FIGURE_CUBES`,
+avec la colonne `grav_desc`) et retourne une figure Plotly, une figure matplotlib ou un tableau pandas. Les
+mêmes fonctions servent à l'affichage direct et à la construction des
+artefacts pré-calculés (accidents/artifacts.py). Plotly et matplotlib ne
+sont importés qu'à la construction d'une figure : le démarrage du tableau de
+bord n'en dépend pas.
+"""
+import pandas as pd
+
+from accidents import cube, features, schema
+
+# À incrémenter si l'apparence ou le contenu d'une figure change (invalide les artefacts)
+FIGURES_VERSION = 1
+
+# Codes des véhicules motorisés
+CODES_MOTORISES = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 14]
+
+# Colonnes de la vue usagers du tableau de bord (cartes, filtres croisés, échantillons)
+COLONNES_TABLEAU = ['Num_Acc', 'an', 'mois', 'jour', 'heure', 'plage_horaire', 'jour_semaine', 'dep', 'com',
+                    'lat', 'long', 'catv', 'grav', 'lum', 'atm', 'surf']
+
+# Filtres appliqués à la lecture : véhicules motorisés, coordonnées et gravité renseignées
+FILTRES_MOTORISES = [
+    ('catv', 'in', CODES_MOTORISES),
+    ('lat', 'notnull', None),
+    ('long', 'notnull', None),
+    ('grav', 'in', list(schema.LABELS['grav'])),
+]
+
+# Départements d'Île-de-France
+IDF_DEPARTMENTS = {
+    "75": "Paris",
+    "77": "Seine-et-Marne",
+    "78": "Yvelines",
+    "91": "Essonne",
+    "92": "Hauts-de-Seine",
+    "93": "Seine-Saint-Denis",
+    "94": "Val-de-Marne",
+    "95": "Val-d'Oise"
+}
+
+# Les analyses Île-de-France sont des agrégations du cube restreintes à ces départements
+FILTRE_IDF = {'dep': list(IDF_DEPARTMENTS)}
+
+# Thème noir des heatmaps
+_THEME_NOIR = dict(
+    title=" ",
+    xaxis=dict(tickangle=-45, title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
+    yaxis=dict(title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
+    plot_bgcolor="black",
+    paper_bgcolor="black",
+    font=dict(color="white")
+)
+
+
+def _with_labels(cubes):
+    for severity_cube in cubes.values():
+        severity_cube['grav_desc'] = schema.label_series(severity_cube['grav'], 'grav')
+    return cubes
+
+
+def severity_cubes(partitions, filters=FILTRES_MOTORISES):
+    """Cubes de comptages des usagers impliqués ({groupe: cube}), avec le libellé de la gravité."""
+    return _with_labels(cube.load_cubes(partitions, filters))
+
+
+def filtered_cubes(rows):
+    """Cubes de gravité des usagers retenus par les filtres croisés (vue usagers filtrée)."""
+    return _with_labels(cube.build_cubes(rows))
+
+
+def pie_gravite(cube_gravite):
+    """Camembert de la répartition par gravité."""
+    import plotly.express as px
+
+    grav_count = cube.rollup(cube_gravite, ['grav_desc'])
+    grav_count.columns = ['Gravité', 'Nombre d\'accidents']
+    return px.pie(
+        grav_count,
+        values='Nombre d\'accidents',
+        names='Gravité',
+        color_discrete_sequence=px.colors.sequential.RdBu,
+        template="presentation",
+        hole=0.4  # Donut chart
+    )
+
+
+def heatmap_plage_horaire(cube_gravite):
+    """Heatmap des proportions de gravité par plage horaire (Île-de-France)."""
+    import plotly.express as px
+
+    heatmap_data = cube.crosstab(cube_gravite, 'plage_horaire', 'grav_desc', where=FILTRE_IDF, normalize=True)
+    heatmap_data = heatmap_data.reindex(features.PLAGES_HORAIRES)
+    fig = px.imshow(
+        heatmap_data,
+        text_auto=".2f",
+        labels=dict(x="Gravité", y="Plage Horaire", color="Proportion"),
+        color_continuous_scale="YlOrRd"
+    )
+    fig.update_layout(**_THEME_NOIR)
+    return fig
+
+
+def heatmap_departement(cube_gravite):
+    """Heatmap des proportions de gravité par département d'Île-de-France."""
+    import plotly.express as px
+
+    heatmap_data = cube.crosstab(cube_gravite, 'dep', 'grav_desc', where=FILTRE_IDF, normalize=True)
+    heatmap_data.index = heatmap_data.index.map(IDF_DEPARTMENTS)
+    fig = px.imshow(
+        heatmap_data,
+        text_auto=".2f",  # Formater les valeurs avec 2 décimales
+        labels=dict(x="Gravité", y="Département", color="Proportion"),
+        color_continuous_scale="YlOrRd"
+    )
+    fig.update_layout(**_THEME_NOIR)
+    return fig
+
+
+def barres_jour_semaine(cube_gravite):
+    """Barres empilées (matplotlib) des gravités par jour de la semaine."""
+    import matplotlib.pyplot as plt
+    from matplotlib.figure import Figure
+
+    stacked_data = cube.crosstab(cube_gravite, 'jour_semaine', 'grav_desc', where=FILTRE_IDF)
+    # Sans usager d'Île-de-France retenu par les filtres croisés : barres vides plutôt qu'une erreur
+    stacked_data = stacked_data.reindex(index=features.JOURS_SEMAINE, columns=list(schema.LABELS['grav'].values()),
+                                        fill_value=0)
+    colors = ["#ffcc66", "#ff9966", "#FFFF00", "#ff3333"]
+
+    # Figure créée sans pyplot : elle n'est pas conservée par l'état global de matplotlib
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+
+    # Définir le fond noir
+    fig.patch.set_facecolor('black')  # Fond noir pour la figure
+    ax.set_facecolor('black')  # Fond noir pour le graphique
+
+    # Traçage des données empilées
+    stacked_data.plot(kind='bar', stacked=True, color=colors, ax=ax)
+
+    # Personnalisation des titres et axes
+    ax.set_title(" ", fontsize=16, fontweight='bold', color='white')
+    ax.set_xlabel("Jour de la Semaine", fontsize=14, color='white')
+    ax.set_ylabel("Nombre d'Accidents", fontsize=14, color='white')
+    ax.legend(
+        title="Gravité",
+        fontsize=12,
+        title_fontsize=14,
+        loc='upper left',
+        bbox_to_anchor=(1.05, 1),
+        labelcolor='white'  # Couleur des labels de légende
+    )
+
+    # Ajustement des couleurs des ticks
+    plt.setp(ax.get_xticklabels(), fontsize=12, rotation=45, color='white')
+    plt.setp(ax.get_yticklabels(), fontsize=12, color='white')
+    return fig
+
+
+def serie_temporelle(cube_gravite):
+    """Nombre d'usagers impliqués par jour."""
+    import plotly.express as px
+
+    time_analysis = cube.rollup(cube_gravite, ['an', 'mois', 'jour'])
+    time_analysis['date'] = features.dates(time_analysis['an'], time_analysis['mois'], time_analysis['jour'])
+    time_analysis = time_analysis.sort_values('date')
+
+    fig = px.line(
+        time_analysis,
+        x='date',
+        y='count',
+        title=" ",
+        labels={'date': 'Date', 'count': "Nombre d'accidents"},
+        markers=True,  # Ajouter des marqueurs
+        line_shape='spline',  # Lissage de la courbe
+        color_discrete_sequence=["#FF5733"]  # Couleur vibrante
+    )
+    fig.update_layout(
+        title=dict(
+            text=" ",
+            font=dict(size=20, color='#f7f7f7', family="Arial")  # Titre en blanc
+        ),
+        xaxis=dict(
+            title="Date",
+            showgrid=True,
+            gridcolor="rgba(200,200,200,0.3)",  # Couleur discrète pour les lignes de la grille
+            tickformat="%b %d",  # Afficher le mois et le jour
+            tickangle=-45,
+            title_font=dict(color="white"),  # Texte de l'axe X en blanc
+            tickfont=dict(color="white")  # Ticks en blanc
+        ),
+        yaxis=dict(
+            title="Nombre d'accidents",
+            showgrid=True,
+            gridcolor="rgba(200,200,200,0.3)",  # Couleur discrète pour les lignes de la grille
+            title_font=dict(color="white"),  # Texte de l'axe Y en blanc
+            tickfont=dict(color="white")  # Ticks en blanc
+        ),
+        plot_bgcolor="#303030",  # Fond du graphique (gris foncé pour s'aligner sur le thème sombre)
+        paper_bgcolor="#303030",  # Fond de la figure (même couleur que le Dashboard)
+        font=dict(color="white"),  # Couleur du texte
+        margin=dict(l=50, r=50, t=80, b=50),
+        hovermode="x unified"  # Info survol unifiée
+    )
+    return fig
+
+
+def histogramme_heure(cube_gravite):
+    """Distribution des accidents par heure de la journée (Île-de-France)."""
+    import plotly.express as px
+
+    data = cube.rollup(cube_gravite, ['heure'], where=FILTRE_IDF)
+    fig = px.histogram(
+        data,
+        x='heure',
+        y='count',  # Les comptages du cube sont sommés par classe
+        nbins=24,  # 24 bins pour les heures de la journée
+        title=" ",
+        labels={'heure': 'Heure', 'count': 'Fréquence'},  # Étiquettes des axes
+        color_discrete_sequence=["#FF5733"]  # Couleur personnalisée
+    )
+    fig.update_layout(
+        title=dict(
+            font=dict(size=20, family='Arial', color='#f7f7f7')
+        ),
+        xaxis=dict(
+            title="Heure",
+            tickmode='linear',
+            tick0=0,
+            dtick=2  # Affiche une graduation toutes les deux heures
+        ),
+        yaxis=dict(title="Fréquence"),
+        bargap=0.1  # Espacement entre les barres
+    )
+    return fig
+
+
+def courbes_mensuelles(cube_gravite):
+    """Nombre d'usagers par mois et gravité."""
+    import plotly.express as px
+
+    monthly_data = cube.rollup(cube_gravite, ['mois', 'grav_desc'])
+    fig = px.line(
+        monthly_data,
+        x='mois',
+        y='count',
+        color='grav_desc',
+        title=" ",
+        markers=True,
+        line_shape='spline',
+        color_discrete_sequence=px.colors.qualitative.Dark24
+    )
+    fig.update_layout(
+        title=dict(
+            font=dict(size=20, family='Arial', color='#f7f7f7')
+        )
+    )
+    return fig
+
+
+def barres_annees(cube_gravite):
+    """Usagers impliqués par année et gravité."""
+    import plotly.express as px
+
+    yearly_data = cube.rollup(cube_gravite, ['an', 'grav_desc'])
+    yearly_data['an'] = yearly_data['an'].astype(str)
+    return px.bar(
+        yearly_data,
+        x='an',
+        y='count',
+        color='grav_desc',
+        barmode='group',
+        labels={'an': 'Année', 'count': "Nombre d'usagers", 'grav_desc': 'Gravité'},
+        color_discrete_sequence=px.colors.qualitative.Dark24
+    )
+
+
+def variation_annees(cube_gravite):
+    """Total d'usagers par année et variation d'une année sur l'autre."""
+    totals = cube.rollup(cube_gravite, ['an']).set_index('an')['count']
+    return pd.DataFrame({
+        "Nombre d'usagers": totals,
+        "Variation (%)": (totals.pct_change() * 100).round(1)
+    })
+
+
+def courbes_mensuelles_annees(cube_gravite):
+    """Nombre d'usagers par mois, une courbe par année."""
+    import plotly.express as px
+
+    monthly_yearly = cube.rollup(cube_gravite, ['an', 'mois'])
+    monthly_yearly['an'] = monthly_yearly['an'].astype(str)
+    return px.line(
+        monthly_yearly,
+        x='mois',
+        y='count',
+        color='an',
+        markers=True,
+        labels={'mois': 'Mois', 'count': "Nombre d'usagers", 'an': 'Année'},
+        color_discrete_sequence=px.colors.qualitative.Dark24
+    )
+
+
+# Figures du tableau de bord, dans l'ordre d'affichage
+FIGURES = {
+    "gravite": pie_gravite,
+    "plage_horaire": heatmap_plage_horaire,
+    "departement": heatmap_departement,
+    "jour_semaine": barres_jour_semaine,
+    "serie_temporelle": serie_temporelle,
+    "heure": histogramme_heure,
+    "mensuel": courbes_mensuelles,
+}
+
+# Figures de comparaison, construites seulement si plusieurs années sont chargées
+FIGURES_ANNEES = {
+    "annees_gravite": barres_annees,
+    "variation_annees": variation_annees,
+    "mensuel_annees": courbes_mensuelles_annees,
+}
+
+# Groupe du cube (cf. cube.CUBES) dont chaque figure est tirée
+FIGURE_CUBES = {
+    "gravite": "temps",
+    "plage_horaire": "heure",
+    "departement": "departement",
+    "jour_semaine": "jour_semaine",
+    "serie_temporelle": "temps",
+    "heure": "heure",
+    "mensuel": "temps",
+    "annees_gravite": "temps",
+    "variation_annees": "temps",
+    "mensuel_annees": "temps",
+}
+
+
+def build_all(cubes):
+    """Toutes les figures applicables : {nom: figure}.
+
+    `cubes` associe à chaque groupe son cube de gravité ; un échantillon
+    pondéré (colonne `count`, cf. accidents/sampling.py) sert à tous les groupes.
+    """
+    if isinstance(cubes, pd.DataFrame):
+        cubes = dict.fromkeys(cube.CUBES, cubes)
+    builders = dict(FIGURES)
+    if cubes["temps"]['an'].nunique() > 1:
+        builders.update(FIGURES_ANNEES)
+    return {name: builder(cubes[FIGURE_CUBES[name]]) for name, builder in builders.items()}
@@ -0,0 +1,147 @@
+"""Détection des zones à forte concentration d'accidents (hotspots).
+
+Les usagers sont d'abord agrégés sur une grille de `CELL_METRES` mètres dans
+la projection de leur territoire (Lambert-93 en métropole, UTM outre-mer, cf.
+accidents/spatial.py), en comptant les usagers de chaque gravité par
+cellule, puis les cellules sont regroupées par DBSCAN (distance haversine,
+arbre à boules) en pondérant chaque cellule par son nombre d'usagers. Les
+cellules trop isolées pour appartenir à un hotspot (moins de `min_usagers`
+usagers à moins de deux fois le rayon de voisinage) sont écartées au
+préalable par un comptage sur une grille grossière. Le regroupement porte donc sur peu de cellules, et non sur
+tous les points : la détection nationale prend quelques secondes et sa
+mémoire reste bornée.
+"""
+import numpy as np
+import pandas as pd
+
+from accidents import schema, spatial
+
+# Taille des cellules de pré-agrégation
+CELL_METRES = 100
+
+# Rayon de voisinage et nombre minimal d'usagers d'un hotspot
+EPS_METRES = 300
+MIN_USAGERS = 30
+
+_EARTH_RADIUS_M = 6_371_000
+
+# Codes de gravité et libellés des colonnes de comptage
+_GRAV_CODES = list(schema.LABELS["grav"])
+_GRAVES = [3, 4]
+
+
+def grid_cells(lat, lon, grav, cell_metres=CELL_METRES):
+    """Cellules de grille occupées : barycentre (lat, long, x, y) et comptages par gravité."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    grav = np.asarray(grav)
+    x, y = spatial.project(lat, lon)
+    cell_ids = np.floor(x / cell_metres).astype(np.int64) * 10_000_000 + np.floor(y / cell_metres).astype(np.int64)
+    _, inverse = np.unique(cell_ids, return_inverse=True)
+    count = np.bincount(inverse)
+    cells = pd.DataFrame({
+        "lat": np.bincount(inverse, weights=lat) / count,
+        "long": np.bincount(inverse, weights=lon) / count,
+        "x": np.bincount(inverse, weights=x) / count,
+        "y": np.bincount(inverse, weights=y) / count,
+        "count": count,
+    })
+    for code in _GRAV_CODES:
+        cells[f"grav_{code}"] = np.bincount(inverse, weights=grav == code, minlength=len(count)).astype(np.int64)
+    return cells
+
+
+def candidate_cells(cells, eps_metres=EPS_METRES, min_usagers=MIN_USAGERS):
+    """Masque des cellules pouvant appartenir à un hotspot.
+
+    Un point d'un hotspot est à moins de `eps_metres` d'un point central, dont
+    le voisinage compte au moins `min_usagers` usagers : il y a donc au moins
+    autant d'usagers à moins de 2 x `eps_metres`, c'est-à-dire dans le bloc de
+    5 x 5 cellules grossières (de côté `eps_metres`) qui l'entoure.
+    """
+    col = np.floor(cells["x"].to_numpy() / eps_metres).astype(np.int64)
+    row = np.floor(cells["y"].to_numpy() / eps_metres).astype(np.int64)
+    keys, inverse = np.unique(col * 10_000_000 + row, return_inverse=True)
+    totals = np.bincount(inverse, weights=cells["count"].to_numpy())
+    block = np.zeros(len(keys))
+    for d_col in range(-2, 3):
+        for d_row in range(-2, 3):
+            neighbours = keys + d_col * 10_000_000 + d_row
+            position = np.minimum(np.searchsorted(keys, neighbours), len(keys) - 1)
+            block += np.where(keys[position] == neighbours, totals[position], 0)
+    return block[inverse] >= min_usagers
+
+
+def cluster_cells(cells, eps_metres=EPS_METRES, min_usagers=MIN_USAGERS):
+    """Étiquette DBSCAN de chaque cellule (-1 hors hotspot)."""
+    from sklearn.cluster import DBSCAN
+
+    labels = np.full(len(cells), -1, dtype=np.int64)
+    candidates = candidate_cells(cells, eps_metres, min_usagers) if len(cells) else labels.astype(bool)
+    if not candidates.any():
+        return labels
+    coordinates = np.radians(cells.loc[candidates, ["lat", "long"]].to_numpy())
+    clustering = DBSCAN(eps=eps_metres / _EARTH_RADIUS_M, min_samples=min_usagers, metric="haversine",
+                        algorithm="ball_tree", n_jobs=-1)
+    labels[candidates] = clustering.fit_predict(coordinates, sample_weight=cells.loc[candidates, "count"].to_numpy())
+    return labels
+
+
+def detect(lat, lon, grav, cell_metres=CELL_METRES, eps_metres=EPS_METRES, min_usagers=MIN_USAGERS):
+    """Hotspots classés par nombre d'usagers, avec leur répartition par gravité."""
+    cells = grid_cells(lat, lon, grav, cell_metres)
+    cells["hotspot"] = cluster_cells(cells, eps_metres, min_usagers)
+    cells = cells[cells["hotspot"] >= 0]
+    columns = ["count"] + [f"grav_{code}" for code in _GRAV_CODES]
+    if cells.empty:
+        return pd.DataFrame(columns=["rang", "lat", "long", "cellules", "rayon_m", "part_graves"] + columns)
+
+    # Barycentre pondéré, comptages et étendue de chaque hotspot
+    weighted = cells.assign(lat=cells["lat"] * cells["count"], long=cells["long"] * cells["count"])
+    grouped = weighted.groupby("hotspot")
+    hotspots = grouped[columns].sum()
+    hotspots["lat"] = grouped["lat"].sum() / hotspots["count"]
+    hotspots["long"] = grouped["long"].sum() / hotspots["count"]
+    hotspots["cellules"] = grouped.size()
+    centre_x, centre_y = spatial.project(hotspots["lat"], hotspots["long"])
+    position = hotspots.index.get_indexer(cells["hotspot"])
+    distances = pd.Series(np.hypot(cells["x"].to_numpy() - centre_x[position],
+                                   cells["y"].to_numpy() - centre_y[position]), index=cells.index)
+    hotspots["rayon_m"] = distances.groupby(cells["hotspot"]).max().round() + cell_metres / 2
+    hotspots["part_graves"] = hotspots[[f"grav_{code}" for code in _GRAVES]].sum(axis=1) / hotspots["count"]
+
+    hotspots = hotspots.sort_values(["count", "part_graves"], ascending=False).reset_index(drop=True)
+    hotspots.insert(0, "rang", np.arange(1, len(hotspots) + 1))
+    return hotspots
+
+
+def severity_labels(hotspots):
+    """Colonnes de comptage renommées avec les libellés de gravité, pour l'affichage."""
+    return hotspots.rename(columns={f"grav_{code}": label for code, label in schema.LABELS["grav"].items()})
+
+
+def hotspots_figure(hotspots, zoom, center):
+    """Carte Plotly des hotspots : taille selon le nombre d'usagers, couleur selon la part de graves."""
+    import plotly.express as px
+
+    labelled = severity_labels(hotspots)
+    fig = px.scatter_mapbox(
+        labelled,
+        lat="lat",
+        lon="long",
+        size="count",
+        color="part_graves",
+        color_continuous_scale="YlOrRd",
+        range_color=(0, 1),
+        hover_data={"rang": True, "rayon_m": True, "lat": False, "long": False,
+                    **{label: True for label in schema.LABELS["grav"].values()}},
+        labels={"count": "Nombre d'usagers", "part_graves": "Part hospitalisés ou tués", "rang": "Rang",
+                "rayon_m": "Rayon (m)"},
+        mapbox_style="open-street-map",
+        zoom=zoom,
+        center={"lat": center[0], "lon": center[1]},
+        size_max=30,
+        height=600,
+    )
+    fig.update_layout(margin=dict(l=0, r=0, t=0, b=0))
+    return fig
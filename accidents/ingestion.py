@@ -0,0 +1,313 @@
+"""Ingestion des fichiers CSV BAAC vers un cache colonnaire Arrow partitionné.
+
+Les fichiers sources sont rangés par année et par table, soit sous la forme
+`data/<table>-<année>.csv`, soit `data/<année>/<table>.csv`. Chaque fichier
+est converti une seule fois en fichier Arrow IPC (non compressé, donc
+lisible par memory-map) dans `data/cache/an=<année>/`. Le nom du fichier de
+cache contient l'empreinte du CSV : un fichier source modifié produit
+automatiquement un nouveau cache.
+
+Les fichiers jusqu'en 2018 (ancien format du BAAC : séparateur ',',
+latin-1, cf. accidents/schema.py) et ceux depuis 2019 (séparateur ';',
+UTF-8, virgule décimale) sont reconnus d'après leur année ; le séparateur est
+lu sur la ligne d'en-tête.
+
+Une fois un rafraîchissement publié (`python -m accidents.refresh`), les
+empreintes des fichiers sources sont figées par le pointeur
+`data/cache/CURRENT` : versions des données, caches et agrégats restent ceux
+de la génération publiée même si un fichier de data/ est remplacé, jusqu'à la
+publication suivante.
+
+Les conversions sont faites en parallèle par un pool de processus, toujours
+dans un sous-processus dédié (`python -m accidents.ingestion --convertir`) :
+chaque processus d'un pool « spawn » réimporte le module principal, qui est
+le script du tableau de bord dans un serveur Streamlit.
+
+Pré-construction du cache de toutes les années, en parallèle (par exemple
+dans l'image des réplicas) :
+
+    python -m accidents.ingestion
+"""
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from accidents import features, schema
+
+DATA_DIR = "data"
+
+# Dossier contenant le paquet `accidents` (chemin d'import des sous-processus de conversion)
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dossier des fichiers Arrow générés
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+
+TABLES = ["caract", "lieux", "vehicules", "usagers"]
+
+# Séparateurs possibles des fichiers BAAC (';' depuis 2019, ',' ou tabulation avant)
+_SEPARATORS = [";", ",", "\t"]
+
+_SOURCE_NAME = re.compile(r"^(?P<table>[a-z]+)(?:-(?P<an>\d{4}))?\.csv$")
+
+# Pointeur vers la génération publiée des fichiers sources (cf. accidents/refresh.py)
+CURRENT_PATH = os.path.join(CACHE_DIR, "CURRENT")
+
+# Empreintes déjà calculées, par (chemin, date de modification, taille)
+_hash_memo = {}
+
+# Pointeur lu, par (date de modification, taille) du fichier
+_published_memo = {}
+
+# Empreintes imposées pendant la préparation d'une génération (accidents/refresh.py)
+_pinned = {}
+
+
+def published():
+    """Génération publiée : {"generation", "fichiers": {chemin: {"empreinte", ...}}, ...} ou None."""
+    try:
+        stat = os.stat(CURRENT_PATH)
+    except FileNotFoundError:
+        return None
+    memo_key = (stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _published_memo:
+        with open(CURRENT_PATH) as f:
+            _published_memo.clear()
+            _published_memo[memo_key] = json.load(f)
+    return _published_memo[memo_key]
+
+
+def content_hash(file_path, chunk_size=1 << 20):
+    """Calcule l'empreinte SHA-256 du contenu d'un fichier."""
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if memo_key not in _hash_memo:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _hash_memo[memo_key] = digest.hexdigest()
+    return _hash_memo[memo_key]
+
+
+def file_hash(file_path):
+    """Empreinte d'un fichier source : celle de la génération publiée, sinon celle de son contenu."""
+    path = os.path.normpath(file_path)
+    if path in _pinned:
+        return _pinned[path]
+    current = published()
+    if current is not None and path in current["fichiers"]:
+        return current["fichiers"][path]["empreinte"]
+    return content_hash(file_path)
+
+
+@contextlib.contextmanager
+def pinned(hashes):
+    """Fige les empreintes de fichiers sources ({chemin: empreinte}) le temps d'un bloc.
+
+    Sert à calculer les chemins des caches d'une génération avant de la publier.
+    """
+    previous = dict(_pinned)
+    _pinned.update({os.path.normpath(path): digest for path, digest in hashes.items()})
+    try:
+        yield
+    finally:
+        _pinned.clear()
+        _pinned.update(previous)
+
+
+def combine_hashes(hashes):
+    """Version combinée d'empreintes de fichiers ({chemin: empreinte})."""
+    digest = hashlib.sha256()
+    for file_path in sorted(hashes):
+        digest.update(hashes[file_path].encode())
+    return digest.hexdigest()[:16]
+
+
+def data_version(file_paths):
+    """Version des données : empreinte combinée de tous les fichiers sources."""
+    return combine_hashes({file_path: file_hash(file_path) for file_path in file_paths})
+
+
+def partition_of(file_path):
+    """Table et année d'un fichier source, ex. ('caract', 2023)."""
+    match = _SOURCE_NAME.match(os.path.basename(file_path))
+    if match is None:
+        raise ValueError(f"Nom de fichier BAAC non reconnu : {file_path}")
+    year = match.group("an") or os.path.basename(os.path.dirname(file_path))
+    return match.group("table"), int(year)
+
+
+def discover_partitions(data_dir=DATA_DIR, unpublished=False):
+    """Fichiers sources par année : {année: {table: chemin}}.
+
+    Seules les années dont les quatre tables sont présentes sont retenues et,
+    une fois un rafraîchissement publié, seules celles qu'il contient (sauf
+    avec `unpublished=True`).
+    """
+    partitions = {}
+    candidates = glob.glob(os.path.join(data_dir, "*-[0-9][0-9][0-9][0-9].csv"))
+    candidates += glob.glob(os.path.join(data_dir, "[0-9][0-9][0-9][0-9]", "*.csv"))
+    for file_path in sorted(candidates):
+        table, year = partition_of(file_path)
+        if table in TABLES:
+            partitions.setdefault(year, {})[table] = file_path
+    current = None if unpublished else published()
+    return {
+        year: tables for year, tables in sorted(partitions.items())
+        if len(tables) == len(TABLES)
+        and (current is None or all(os.path.normpath(path) in current["fichiers"] for path in tables.values()))
+    }
+
+
+def cache_path(file_path, digest):
+    """Chemin du fichier Arrow correspondant à un CSV, à son empreinte et au schéma."""
+    table, year = partition_of(file_path)
+    key = hashlib.sha256(f"{digest}:{schema.SCHEMA_VERSION}".encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"an={year}", f"{table}-{key[:16]}.arrow")
+
+
+def source_format(file_path):
+    """Options de lecture d'un CSV BAAC selon son année : séparateur (lu sur l'en-tête), encodage, décimale."""
+    _, year = partition_of(file_path)
+    encoding = "latin-1" if year <= schema.LEGACY_LAST_YEAR else "utf-8"
+    with open(file_path, encoding=encoding) as f:
+        header = f.readline()
+    separator = max(_SEPARATORS, key=header.count)
+    return {"sep": separator, "encoding": encoding, "decimal": "." if separator == "," else ","}
+
+
+def read_source(file_path):
+    """Lit un CSV BAAC (ancien ou nouveau format), le type et le complète."""
+    df = pd.read_csv(file_path, **source_format(file_path), dtype=schema.read_dtypes(), low_memory=False)
+    table = schema.table_name(file_path)
+    _, year = partition_of(file_path)
+    if year <= schema.LEGACY_LAST_YEAR:
+        df = schema.normalize_legacy(df, table)
+    df = schema.apply_schema(df, table)
+    # Les variables temporelles dérivées sont calculées une fois et mises en cache avec la table
+    if table == "caract":
+        df = features.add_time_features(df)
+    return df
+
+
+def convert(file_path, target):
+    """Convertit un CSV en fichier Arrow IPC (écriture atomique).
+
+    Sans génération publiée, les caches obsolètes du même fichier sont
+    supprimés ; sinon, c'est le rafraîchissement qui les supprime une fois la
+    nouvelle génération publiée.
+    """
+    table = pa.Table.from_pandas(read_source(file_path), preserve_index=False)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, target)
+
+    if published() is not None:
+        return
+    # Supprimer les caches obsolètes du même fichier source
+    stem = os.path.basename(target).rsplit("-", 1)[0]
+    for old_path in glob.glob(os.path.join(os.path.dirname(target), f"{stem}-*.arrow")):
+        if old_path != target:
+            os.remove(old_path)
+
+
+def _check_unchanged(file_path, digest):
+    if digest != content_hash(file_path):
+        # Le cache de la génération publiée a disparu et le fichier a changé depuis
+        raise RuntimeError(f"{file_path} a changé depuis la dernière publication : "
+                           "lancez python -m accidents.refresh")
+
+
+def ensure_cached(file_path):
+    """Retourne le chemin du cache Arrow d'un CSV, en le créant si besoin."""
+    digest = file_hash(file_path)
+    target = cache_path(file_path, digest)
+    if not os.path.exists(target):
+        _check_unchanged(file_path, digest)
+        convert(file_path, target)
+    return target
+
+
+def pending_conversions(partitions):
+    """Fichiers pas encore en cache : [(chemin, cache)]."""
+    pending = []
+    for tables in partitions.values():
+        for file_path in tables.values():
+            digest = file_hash(file_path)
+            target = cache_path(file_path, digest)
+            if not os.path.exists(target):
+                _check_unchanged(file_path, digest)
+                pending.append((file_path, target))
+    return pending
+
+
+def convert_all(conversions, max_workers=None):
+    """Convertit des fichiers [(chemin, cache)], en parallèle dans un pool de processus.
+
+    À n'appeler que depuis la ligne de commande (module principal protégé par
+    `if __name__ == "__main__"`) : voir `ingest_partitions`.
+    """
+    if len(conversions) <= 1:
+        for file_path, target in conversions:
+            convert(file_path, target)
+        return
+    # « spawn » : le processus parent peut avoir des threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        list(pool.map(convert, *zip(*conversions)))
+
+
+def ingest_partitions(partitions, max_workers=None):
+    """Convertit en parallèle les fichiers pas encore en cache, dans un sous-processus dédié."""
+    pending = pending_conversions(partitions)
+    if len(pending) <= 1:
+        convert_all(pending)
+        return
+    # Le pool est lancé par `python -m accidents.ingestion` : depuis le serveur Streamlit, chaque
+    # processus du pool réimporterait le script du tableau de bord et le réexécuterait en entier.
+    # Les caches visés sont calculés ici (empreintes figées d'un rafraîchissement comprises).
+    command = [sys.executable, "-m", "accidents.ingestion", "--convertir"]
+    if max_workers:
+        command += ["--processus", str(max_workers)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_PACKAGE_ROOT, os.environ.get("PYTHONPATH")])))
+    result = subprocess.run(command, input=json.dumps(pending), capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec de la conversion des fichiers sources :\n{result.stderr.strip()[-2000:]}")
+
+
+def load_table(file_path, columns=None):
+    """Charge un fichier BAAC depuis son cache Arrow (memory-map)."""
+    table = feather.read_table(ensure_cached(file_path), columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion des fichiers BAAC en cache Arrow.")
+    parser.add_argument("fichiers", nargs="*", help="fichiers à convertir (par défaut : toutes les années)")
+    parser.add_argument("--convertir", action="store_true",
+                        help="conversions [(chemin, cache)] lues en JSON sur l'entrée standard (ingest_partitions)")
+    parser.add_argument("--processus", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.convertir:
+        convert_all(json.load(sys.stdin), args.processus)
+    elif args.fichiers:
+        for path in args.fichiers:
+            print(f"{path} -> {ensure_cached(path)}")
+    else:
+        found = discover_partitions()
+        convert_all(pending_conversions(found), args.processus)
+        print(f"Années en cache : {', '.join(str(year) for year in found)}")
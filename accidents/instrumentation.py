@@ -0,0 +1,293 @@
+"""Instrumentation du tableau de bord.
+
+- `span(nom)` mesure la durée (et, en mode profilage, le pic mémoire) d'une
+  étape du pipeline ou d'un graphique ;
+- `instrumented(st.cache_data)` remplace un décorateur de cache et compte
+  les appels et les calculs effectifs (hits = appels - calculs) ;
+- `plotly_chart`, `pyplot`, `image` et `folium_map` affichent un graphique en
+  mesurant la taille envoyée au navigateur.
+
+Les mesures sont conservées par session (`st.session_state`), dans la limite
+des `MAX_RECORDS` plus récentes, et exportables en JSON ou CSV. La mesure des
+tailles des graphiques est activée par la variable d'environnement
+DASHBOARD_PROFILING=1 ou, pour la seule session concernée, par le paramètre
+d'URL `?admin=1`. Le suivi mémoire (tracemalloc) s'applique à tout le
+processus : il n'est activé que par DASHBOARD_PROFILING=1, ne trace que
+pendant les étapes en cours, et le pic d'une étape n'est rapporté que si
+aucune autre session ne mesurait une étape en même temps.
+"""
+import collections
+import contextlib
+import csv
+import functools
+import io
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+_SESSION_KEY = "_instrumentation"
+
+# Compteurs de cache cumulés pour tout le processus
+_process_lock = threading.Lock()
+_process_cache_stats = {}
+
+# Mesures conservées par session (étapes, tailles des graphiques) : les plus récentes
+MAX_RECORDS = 2000
+
+
+def profiling_enabled():
+    """Vrai si la mesure des tailles des graphiques est demandée (variable d'environnement, ou URL de la session)."""
+    if os.environ.get("DASHBOARD_PROFILING") == "1":
+        return True
+    try:
+        return st.query_params.get("admin") == "1"
+    except Exception:
+        # Hors d'une session Streamlit (build headless, benchmarks)
+        return False
+
+
+def memory_profiling_enabled():
+    """Vrai si le suivi mémoire est demandé (variable d'environnement seulement : il vaut pour tout le processus)."""
+    return os.environ.get("DASHBOARD_PROFILING") == "1"
+
+
+def _new_metrics():
+    return {"spans": collections.deque(maxlen=MAX_RECORDS), "cache": {},
+            "payloads": collections.deque(maxlen=MAX_RECORDS)}
+
+
+def _session_metrics():
+    """Mesures de la session courante (un dictionnaire vide hors session)."""
+    try:
+        if _SESSION_KEY not in st.session_state:
+            st.session_state[_SESSION_KEY] = _new_metrics()
+        return st.session_state[_SESSION_KEY]
+    except Exception:
+        return _new_metrics()
+
+
+def _max_rss_mb():
+    """Pic de mémoire résidente du processus (Mo)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Étapes suivies en mémoire, tous threads confondus : {id du thread: [étapes ouvertes]}.
+# Le pic de tracemalloc est global au processus : une étape qui en chevauche une autre
+# d'un autre thread n'a pas de pic attribuable.
+_tracing_lock = threading.Lock()
+_traced = {}
+_started_here = []
+
+
+def _open_traced(record):
+    thread = threading.get_ident()
+    with _tracing_lock:
+        others = [other for ident, records in _traced.items() if ident != thread for other in records]
+        if not _traced and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_here.append(True)
+        if others:
+            record["partage"] = True
+            for other in others:
+                other["partage"] = True
+        current, peak = tracemalloc.get_traced_memory()
+        records = _traced.setdefault(thread, [])
+        # Le pic de l'étape parente atteint avant cette étape est conservé avant la remise à zéro
+        if records:
+            records[-1]["pic_enfants"] = max(records[-1]["pic_enfants"], peak)
+        records.append(record)
+        record["base"] = record["pic_enfants"] = current
+        tracemalloc.reset_peak()
+
+
+def _close_traced(record):
+    """Pic de l'étape au-delà de sa mémoire initiale (Mo), ou None s'il n'est pas attribuable."""
+    thread = threading.get_ident()
+    with _tracing_lock:
+        absolute_peak = max(tracemalloc.get_traced_memory()[1], record["pic_enfants"])
+        records = _traced[thread]
+        records.pop()
+        if records:
+            records[-1]["pic_enfants"] = max(records[-1]["pic_enfants"], absolute_peak)
+        else:
+            del _traced[thread]
+        # Plus aucune étape suivie : le traçage s'arrête (il ralentit chaque allocation)
+        if not _traced and _started_here:
+            tracemalloc.stop()
+            _started_here.clear()
+    if record.get("partage"):
+        return None
+    return (absolute_peak - record["base"]) / 2 ** 20
+
+
+@contextlib.contextmanager
+def span(name):
+    """Mesure la durée et, avec DASHBOARD_PROFILING=1, le pic mémoire (au-delà de la mémoire initiale) d'une étape."""
+    record = {} if memory_profiling_enabled() else None
+    if record is not None:
+        _open_traced(record)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        peak = None if record is None else _close_traced(record)
+        _session_metrics()["spans"].append({
+            "etape": name,
+            "debut": time.time() - duration,
+            "duree_ms": round(duration * 1000, 2),
+            "pic_memoire_mo": None if peak is None else round(peak, 2),
+            "rss_max_mo": round(_max_rss_mb(), 1),
+        })
+
+
+def _count(name, field):
+    stats = _session_metrics()["cache"].setdefault(name, {"appels": 0, "calculs": 0})
+    stats[field] += 1
+    with _process_lock:
+        totals = _process_cache_stats.setdefault(name, {"appels": 0, "calculs": 0})
+        totals[field] += 1
+
+
+def instrumented(cache_decorator, name=None):
+    """Décorateur de cache Streamlit instrumenté.
+
+    Exemple : `@instrumented(st.cache_resource(max_entries=16))`. Le corps de
+    la fonction ne s'exécute qu'en cas d'absence dans le cache : chaque
+    exécution compte un calcul (« miss »), chaque appel un appel.
+    """
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            _count(label, "calculs")
+            with span(f"{label} (calcul)"):
+                return func(*args, **kwargs)
+
+        cached = cache_decorator(compute)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            _count(label, "appels")
+            return cached(*args, **kwargs)
+
+        call.clear = cached.clear
+        return call
+    return decorate
+
+
+def _record_payload(name, kind, size):
+    _session_metrics()["payloads"].append({"graphique": name, "type": kind, "octets": size})
+
+
+def plotly_chart(fig, name, **kwargs):
+    """`st.plotly_chart` avec mesure du temps et de la taille de la figure."""
+    with span(f"graphique : {name}"):
+        if profiling_enabled():
+            _record_payload(name, "plotly", len(fig.to_json()))
+        st.plotly_chart(fig, **kwargs)
+
+
+def pyplot(fig, name, **kwargs):
+    """`st.pyplot` avec mesure du temps et de la taille de l'image."""
+    with span(f"graphique : {name}"):
+        if profiling_enabled():
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
+            _record_payload(name, "matplotlib", buffer.tell())
+        st.pyplot(fig, **kwargs)
+
+
+def image(png, name, **kwargs):
+    """`st.image` d'une image pré-rendue, avec mesure du temps et de la taille."""
+    with span(f"graphique : {name}"):
+        _record_payload(name, "image", len(png))
+        st.image(png, **kwargs)
+
+
+def folium_map(m, name, **kwargs):
+    """`st_folium` avec mesure du temps et de la taille du HTML de la carte."""
+    from streamlit_folium import st_folium
+
+    with span(f"graphique : {name}"):
+        if profiling_enabled():
+            _record_payload(name, "folium", len(m.get_root().render().encode()))
+        return st_folium(m, **kwargs)
+
+
+def cache_summary(process_wide=False):
+    """Appels, calculs et taux de succès par fonction en cache."""
+    if process_wide:
+        with _process_lock:
+            stats = {name: dict(values) for name, values in _process_cache_stats.items()}
+    else:
+        stats = _session_metrics()["cache"]
+    return [
+        {
+            "fonction": name,
+            "appels": values["appels"],
+            "calculs": values["calculs"],
+            "hits": values["appels"] - values["calculs"],
+            "taux_hits": round(1 - values["calculs"] / values["appels"], 3) if values["appels"] else None,
+        }
+        for name, values in sorted(stats.items())
+    ]
+
+
+def export_json():
+    """Mesures de la session au format JSON."""
+    metrics = _session_metrics()
+    return json.dumps({
+        "spans": list(metrics["spans"]),
+        "cache": cache_summary(),
+        "cache_processus": cache_summary(process_wide=True),
+        "payloads": list(metrics["payloads"]),
+    }, ensure_ascii=False, indent=2)
+
+
+def export_csv():
+    """Mesures de la session au format CSV (une ligne par mesure)."""
+    metrics = _session_metrics()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["categorie", "nom", "valeur", "unite"])
+    for record in metrics["spans"]:
+        writer.writerow(["etape", record["etape"], record["duree_ms"], "ms"])
+        if record["pic_memoire_mo"] is not None:
+            writer.writerow(["memoire", record["etape"], record["pic_memoire_mo"], "Mo"])
+    for record in cache_summary():
+        writer.writerow(["cache_appels", record["fonction"], record["appels"], "appels"])
+        writer.writerow(["cache_hits", record["fonction"], record["hits"], "appels"])
+    for record in metrics["payloads"]:
+        writer.writerow(["payload", record["graphique"], record["octets"], "octets"])
+    return buffer.getvalue()
+
+
+def admin_panel():
+    """Panneau d'administration, affiché uniquement avec `?admin=1` dans l'URL."""
+    if st.query_params.get("admin") != "1":
+        return
+    import pandas as pd
+
+    metrics = _session_metrics()
+    with st.expander("🛠️ Instrumentation (administration)", expanded=True):
+        st.markdown("**Étapes et graphiques**")
+        st.dataframe(pd.DataFrame(list(metrics["spans"])))
+        st.markdown("**Caches (session)**")
+        st.dataframe(pd.DataFrame(cache_summary()))
+        st.markdown("**Caches (processus)**")
+        st.dataframe(pd.DataFrame(cache_summary(process_wide=True)))
+        st.markdown("**Taille des graphiques envoyés au navigateur**")
+        st.dataframe(pd.DataFrame(list(metrics["payloads"])))
+        st.download_button("Exporter en JSON", export_json(), file_name="instrumentation.json",
+                           mime="application/json")
+        st.download_button("Exporter en CSV", export_csv(), file_name="instrumentation.csv",
+                           mime="text/csv")
+        if st.button("Réinitialiser les mesures de la session"):
+            del st.session_state[_SESSION_KEY]
@@ -0,0 +1,82 @@
+"""Niveaux de détail de la carte nationale.
+
+Pour chaque niveau de zoom, les accidents sont pré-agrégés sur une grille
+(cellules d'environ `CELL_PIXELS` pixels à l'écran). La carte affiche les
+points bruts lorsque la zone demandée en contient moins que le budget, et
+sinon la grille la plus fine qui respecte ce budget : la taille envoyée au
+navigateur reste bornée quel que soit le volume de données.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+ZOOM_LEVELS = range(4, 14)
+CELL_PIXELS = 12
+POINT_BUDGET = 20000
+
+# Emprise de la France métropolitaine (lat_min, lat_max, lon_min, lon_max)
+FRANCE_BBOX = (41.3, 51.1, -5.2, 9.6)
+
+
+def cell_size(zoom):
+    """Taille en degrés d'une cellule de grille au niveau de zoom donné."""
+    return 360.0 * CELL_PIXELS / (256 * 2 ** zoom)
+
+
+def zoom_for_bbox(bbox):
+    """Niveau de zoom permettant d'afficher une emprise en entier."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    span = max(lat_max - lat_min, lon_max - lon_min, 1e-3)
+    return int(min(max(math.floor(math.log2(360.0 / span)), ZOOM_LEVELS[0]), ZOOM_LEVELS[-1]))
+
+
+def grid_bins(lat, lon, grav, cell):
+    """Agrège des points sur une grille de pas `cell` degrés.
+
+    Chaque cellule est placée au barycentre de ses points et porte le nombre
+    d'accidents et la part d'usagers gravement atteints (hospitalisés ou tués).
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    rows = np.floor(lat / cell).astype(np.int64)
+    cols = np.floor(lon / cell).astype(np.int64)
+    _, inverse = np.unique(rows * 1_000_000 + cols, return_inverse=True)
+    count = np.bincount(inverse)
+    severe = np.bincount(inverse, weights=np.isin(grav, [3, 4]))
+    return pd.DataFrame({
+        "lat": np.bincount(inverse, weights=lat) / count,
+        "long": np.bincount(inverse, weights=lon) / count,
+        "count": count,
+        "part_graves": severe / count,
+    })
+
+
+def build_pyramid(lat, lon, grav, zooms=ZOOM_LEVELS):
+    """Grilles pré-agrégées pour chaque niveau de zoom."""
+    return {zoom: grid_bins(lat, lon, grav, cell_size(zoom)) for zoom in zooms}
+
+
+def in_bbox(lat, lon, bbox):
+    """Masque des points situés dans une emprise."""
+    lat_min, lat_max, lon_min, lon_max = bbox
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+
+def select_layer(lat, lon, pyramid, bbox, budget=POINT_BUDGET):
+    """Choisit la couche à afficher pour une emprise.
+
+    Retourne ("points", masque des points) si la zone tient dans le budget,
+    sinon ("grille", cellules du niveau de zoom le plus fin qui y tient).
+    """
+    mask = in_bbox(lat, lon, bbox)
+    if mask.sum() <= budget:
+        return "points", mask
+    for zoom in sorted((z for z in pyramid if z <= zoom_for_bbox(bbox) + 2), reverse=True):
+        bins = pyramid[zoom]
+        bins = bins[in_bbox(bins["lat"], bins["long"], bbox)]
+        if len(bins) <= budget:
+            return "grille", bins
+    return "grille", bins
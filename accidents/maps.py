@@ -0,0 +1,67 @@
+"""Construction vectorisée des cartes folium.
+
+Les accidents d'une carte forment une seule couche, construite dans le
+navigateur : Python n'envoie que trois tableaux (latitudes, longitudes,
+gravités), sérialisés d'un bloc depuis numpy, et le code JavaScript de la
+couche crée les points (rendu canvas), en déduit la couleur de la gravité et
+affiche un popup partagé au clic. Aucune Feature GeoJSON ni aucun style n'est
+construit en Python pour chaque accident.
+"""
+import numpy as np
+
+# Couleur des points selon la gravité (tué, hospitalisé) ; les autres gravités en `DEFAULT_COLOR`
+GRAV_COLORS = {4: "red", 3: "orange"}
+DEFAULT_COLOR = "blue"
+
+_POINTS_TEMPLATE = """
+{% macro script(this, kwargs) %}
+    var {{ this.get_name() }} = (function() {
+        var data = {{ this.data|tojson }};
+        var colors = {{ this.colors|tojson }};
+        var renderer = L.canvas({padding: 0.5});
+        var layer = L.featureGroup();
+        for (var i = 0; i < data.lat.length; i++) {
+            var color = colors[data.grav[i]] || {{ this.default_color|tojson }};
+            L.circleMarker([data.lat[i], data.lon[i]], {
+                renderer: renderer, radius: {{ this.radius }}, color: color, fillColor: color,
+                fill: true, fillOpacity: {{ this.fill_opacity }}, grav: data.grav[i]
+            }).addTo(layer);
+        }
+        layer.on("click", function(e) {
+            L.popup().setLatLng(e.latlng).setContent("Gravité : " + e.layer.options.grav)
+                .openOn({{ this._parent.get_name() }});
+        });
+        return layer.addTo({{ this._parent.get_name() }});
+    })();
+{% endmacro %}
+"""
+
+
+def points_layer(lat, lon, grav, radius=6, fill_opacity=0.7):
+    """Couche folium de points colorés par gravité, construite côté navigateur."""
+    from branca.element import MacroElement, Template
+
+    layer = MacroElement()
+    layer._name = "PointsGravite"
+    layer._template = Template(_POINTS_TEMPLATE)
+    layer.data = {
+        "lat": np.round(np.asarray(lat, dtype=float), 6).tolist(),
+        "lon": np.round(np.asarray(lon, dtype=float), 6).tolist(),
+        "grav": np.asarray(grav).astype(int).tolist(),
+    }
+    layer.colors = {str(code): color for code, color in GRAV_COLORS.items()}
+    layer.default_color = DEFAULT_COLOR
+    layer.radius = radius
+    layer.fill_opacity = fill_opacity
+    return layer
+
+
+def department_map(lat, lon, grav, zoom_start=10):
+    """Carte folium des accidents d'un département, en une seule couche de points."""
+    import folium
+
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    m = folium.Map(location=[lat.mean(), lon.mean()], zoom_start=zoom_start)
+    points_layer(lat, lon, grav).add_to(m)
+    return m
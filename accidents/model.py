@@ -0,0 +1,188 @@
+"""Modèle de prédiction de la gravité des usagers.
+
+Un `HistGradientBoostingClassifier` (scikit-learn) est entraîné sur les
+colonnes compactes du schéma : les codes BAAC (int8) sont utilisés tels quels
+comme variables catégorielles (-1 est traité comme valeur manquante) et les
+variables sont discrétisées en 255 classes au plus, ce qui limite la mémoire
+et permet un entraînement multi-thread (OpenMP) sur plusieurs années.
+
+Le modèle entraîné est enregistré avec joblib dans data/cache/models/, sous
+une clé formée de la version des données, des hyperparamètres et de
+`MODEL_VERSION` : le tableau de bord ne fait que le recharger, jamais
+l'entraîner, puis du scoring par lots (ex. risque moyen par département et
+heure). Un seul entraînement d'un même modèle a lieu à la fois sur l'hôte.
+
+Entraînement hors ligne :
+
+    python -m accidents.model              # toutes les années
+    python -m accidents.model 2022 2023
+"""
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from accidents import ingestion, query, store
+
+# À incrémenter si les variables ou la préparation des données changent
+MODEL_VERSION = 1
+
+MODELS_DIR = os.path.join(ingestion.CACHE_DIR, "models")
+
+# Variables catégorielles (codes BAAC) et numériques du modèle
+CATEGORICAL_FEATURES = ["lum", "agg", "int", "atm", "col", "catr", "circ", "prof", "plan", "surf", "infra",
+                        "situ", "catv", "obs", "obsm", "choc", "manv", "motor", "place", "catu", "sexe",
+                        "trajet", "secu1", "jour_semaine", "dep"]
+NUMERIC_FEATURES = ["heure", "mois", "nbv", "vma", "age"]
+FEATURES = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+# Colonnes à lire pour construire les variables
+COLUMNS = [column for column in FEATURES if column != "age"] + ["an", "an_nais", "grav"]
+
+# Usagers dont la gravité est connue
+FILTERS = [("grav", "in", [1, 2, 3, 4])]
+
+# Classes « graves » : blessé hospitalisé ou tué
+SEVERE_CLASSES = [3, 4]
+
+DEFAULT_PARAMS = {
+    "max_iter": 200,
+    "learning_rate": 0.1,
+    "max_leaf_nodes": 63,
+    "l2_regularization": 1.0,
+    "early_stopping": True,
+    "random_state": 0,
+}
+
+
+def model_path(data_version, params):
+    """Chemin du modèle pour une version des données et des hyperparamètres."""
+    key = f"{data_version}:{sorted(params.items())!r}:{MODEL_VERSION}"
+    return os.path.join(MODELS_DIR, f"grav-{hashlib.sha256(key.encode()).hexdigest()[:16]}.joblib")
+
+
+def prepare_features(frame, dep_categories):
+    """Matrice des variables (codes entiers, -1 pour les valeurs manquantes)."""
+    features = pd.DataFrame(index=frame.index)
+    for column in CATEGORICAL_FEATURES:
+        if column == "dep":
+            # Vocabulaire des départements figé à l'entraînement
+            codes = pd.Categorical(frame["dep"].astype(str), categories=dep_categories).codes
+        elif column == "jour_semaine":
+            codes = frame[column].cat.codes
+        else:
+            codes = frame[column]
+        features[column] = np.asarray(codes, dtype=np.int16)
+    for column in NUMERIC_FEATURES:
+        if column == "age":
+            values = frame["an"].astype(float) - frame["an_nais"].astype(float)
+        else:
+            values = frame[column].astype(float)
+        features[column] = values.where(values >= 0).to_numpy(dtype=np.float32)
+    return features
+
+
+def load_training_frame(partitions, sample=None, seed=0):
+    """Usagers des années données, avec les variables du modèle."""
+    frame = query.run_partitioned_query(partitions, COLUMNS, FILTERS).user_view(COLUMNS)
+    if sample is not None and len(frame) > sample:
+        frame = frame.sample(sample, random_state=seed)
+    return frame
+
+
+def train(frame, params=None):
+    """Entraîne le classifieur ; retourne l'artefact (modèle, vocabulaire, métriques)."""
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    from sklearn.metrics import log_loss, roc_auc_score
+    from sklearn.model_selection import train_test_split
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    dep_categories = sorted(frame["dep"].dropna().astype(str).unique())
+    X = prepare_features(frame, dep_categories)
+    y = frame["grav"].to_numpy()
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=0)
+
+    classifier = HistGradientBoostingClassifier(
+        categorical_features=[column in CATEGORICAL_FEATURES for column in FEATURES], **params
+    )
+    start = time.perf_counter()
+    classifier.fit(X_train, y_train)
+    duration = time.perf_counter() - start
+
+    probabilities = classifier.predict_proba(X_test)
+    severe = np.isin(classifier.classes_, SEVERE_CLASSES)
+    return {
+        "model": classifier,
+        "dep_categories": dep_categories,
+        "params": params,
+        "metrics": {
+            "usagers_entrainement": len(X_train),
+            "duree_entrainement_s": round(duration, 2),
+            "iterations": classifier.n_iter_,
+            "exactitude": round(float((classifier.classes_[probabilities.argmax(axis=1)] == y_test).mean()), 4),
+            "log_loss": round(float(log_loss(y_test, probabilities, labels=classifier.classes_)), 4),
+            "auc_graves": round(float(roc_auc_score(np.isin(y_test, SEVERE_CLASSES),
+                                                    probabilities[:, severe].sum(axis=1))), 4),
+        },
+    }
+
+
+def train_and_save(partitions, params=None, sample=None):
+    """Entraîne (si besoin) le modèle des années données et retourne son chemin."""
+    source_paths = [path for tables in partitions.values() for path in tables.values()]
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    target = model_path(ingestion.data_version(source_paths), params)
+    if os.path.exists(target):
+        return target
+    import joblib
+
+    # Un lancement concurrent attend le modèle au lieu de l'entraîner une seconde fois
+    with store.build_lock(target):
+        if not os.path.exists(target):
+            ingestion.ingest_partitions(partitions)
+            artifact = train(load_training_frame(partitions, sample), params)
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            joblib.dump(artifact, tmp_path)
+            os.replace(tmp_path, target)
+    return target
+
+
+def load_model(data_version, params=None):
+    """Artefact du modèle d'une version des données, ou None s'il n'a pas été entraîné."""
+    import joblib
+
+    target = model_path(data_version, {**DEFAULT_PARAMS, **(params or {})})
+    if not os.path.exists(target):
+        return None
+    return joblib.load(target)
+
+
+def severe_probability(artifact, frame, batch_size=500_000):
+    """Probabilité d'être hospitalisé ou tué, calculée par lots."""
+    classifier = artifact["model"]
+    severe = np.isin(classifier.classes_, SEVERE_CLASSES)
+    scores = np.empty(len(frame), dtype=np.float32)
+    for start in range(0, len(frame), batch_size):
+        batch = prepare_features(frame.iloc[start:start + batch_size], artifact["dep_categories"])
+        scores[start:start + batch_size] = classifier.predict_proba(batch)[:, severe].sum(axis=1)
+    return scores
+
+
+def risk_by(artifact, frame, by):
+    """Risque moyen prédit (et nombre d'usagers) par groupe, ex. by=["dep", "heure"]."""
+    scores = pd.Series(severe_probability(artifact, frame), index=frame.index, name="risque")
+    grouped = scores.groupby([frame[column] for column in by], observed=True)
+    return grouped.agg(["mean", "size"]).rename(columns={"mean": "risque", "size": "usagers"}).reset_index()
+
+
+if __name__ == "__main__":
+    import joblib
+
+    found = ingestion.discover_partitions()
+    years = [int(year) for year in sys.argv[1:]] or list(found)
+    path = train_and_save({year: found[year] for year in years})
+    print(f"{', '.join(map(str, years))} -> {path}")
+    print(joblib.load(path)["metrics"])
@@ -0,0 +1,207 @@
+"""Requêtes paresseuses sur les fichiers BAAC, avec projection et filtres poussés.
+
+Le tableau de bord déclare les colonnes et les filtres dont il a besoin ;
+chaque table est lue depuis son cache Arrow avec uniquement ces colonnes et
+ses propres filtres, puis les clés des accidents retenus sont propagées
+(semi-jointures) aux véhicules et aux usagers avant toute jointure.
+
+Un filtre est un triplet `(colonne, opérateur, valeur)`, par exemple
+`("catv", "in", [2, 3])` ou `("lat", "notnull", None)`.
+
+Les données sont partitionnées par année : seules les partitions des années
+demandées sont lues, en parallèle, puis concaténées. La vue usagers d'une
+requête est enregistrée par année dans le magasin partagé (accidents/store.py),
+où le rafraîchissement incrémental (accidents/refresh.py) la met à jour.
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from accidents import ingestion, store
+from accidents.data_model import ACCIDENT_KEY, VEHICLE_KEY, StarSchema
+
+# Ordre de lecture : dimensions accident, puis véhicules, puis usagers
+TABLES = ["caract", "lieux", "vehicules", "usagers"]
+TABLE_KEYS = {
+    "caract": ACCIDENT_KEY,
+    "lieux": ACCIDENT_KEY,
+    "vehicules": VEHICLE_KEY,
+    "usagers": VEHICLE_KEY,
+}
+
+
+def _expression(column, op, value):
+    """Traduit un filtre en expression pyarrow."""
+    field = pc.field(column)
+    if op == "in":
+        return field.isin(list(value))
+    if op == "not in":
+        return ~field.isin(list(value))
+    # Les colonnes catégorielles ne se comparent qu'avec isin
+    if op == "==":
+        return field.isin([value])
+    if op == "!=":
+        return ~field.isin([value])
+    if op == "notnull":
+        return field.is_valid()
+    if op == "<":
+        return field < value
+    if op == "<=":
+        return field <= value
+    if op == ">":
+        return field > value
+    if op == ">=":
+        return field >= value
+    raise ValueError(f"Opérateur de filtre inconnu : {op}")
+
+
+def combine(expressions):
+    """Conjonction d'une liste d'expressions (None si la liste est vide)."""
+    combined = None
+    for expression in expressions:
+        combined = expression if combined is None else combined & expression
+    return combined
+
+
+def _scan(dataset, columns, expressions):
+    """Lit les colonnes demandées d'une table, filtres appliqués pendant la lecture."""
+    return dataset.to_table(columns=columns, filter=combine(expressions)).to_pandas()
+
+
+def open_datasets(source_paths):
+    """Datasets pyarrow des caches Arrow d'une année ({table: dataset})."""
+    return {
+        table: ds.dataset(ingestion.ensure_cached(source_paths[table]), format="ipc")
+        for table in TABLES
+    }
+
+
+def column_owners(datasets):
+    """Table de chaque colonne : la première table (dans l'ordre de `TABLES`) qui la contient."""
+    owner = {}
+    for table in TABLES:
+        for name in datasets[table].schema.names:
+            owner.setdefault(name, table)
+    return owner
+
+
+def filter_expressions(owner, filters):
+    """Expressions pyarrow des filtres, réparties par table ({table: [expression]})."""
+    expressions = {table: [] for table in TABLES}
+    for column, op, value in filters:
+        if column not in owner:
+            raise KeyError(f"Colonne de filtre inconnue : {column}")
+        expressions[owner[column]].append(_expression(column, op, value))
+    return expressions
+
+
+def run_query(source_paths, columns, filters=()):
+    """Exécute une requête et retourne un `StarSchema` réduit.
+
+    `source_paths` associe chaque table ('caract', 'lieux', 'vehicules',
+    'usagers') à son fichier CSV ; `columns` liste les colonnes utiles,
+    toutes tables confondues.
+    """
+    return query_datasets(open_datasets(source_paths), columns, filters)
+
+
+def query_datasets(datasets, columns, filters=()):
+    """Exécute une requête sur des datasets pyarrow ({table: dataset}), ex. des tables en mémoire."""
+    # Répartir colonnes et filtres : chaque colonne appartient à la première table qui la contient
+    owner = column_owners(datasets)
+    table_columns = {table: list(TABLE_KEYS[table]) for table in TABLES}
+    for column in columns:
+        table = owner.get(column)
+        if table is not None and column not in table_columns[table]:
+            table_columns[table].append(column)
+    table_filters = filter_expressions(owner, filters)
+
+    # Dimensions accident, puis semi-jointure vers les véhicules et les usagers
+    caract = _scan(datasets["caract"], table_columns["caract"], table_filters["caract"])
+    lieux = _scan(datasets["lieux"], table_columns["lieux"], table_filters["lieux"])
+    lieux = lieux.drop_duplicates(subset=ACCIDENT_KEY)
+    how = "inner" if table_filters["lieux"] else "left"
+    accidents = caract.merge(lieux, on=ACCIDENT_KEY, how=how, validate="one_to_one")
+
+    accident_keys = pa.array(accidents["Num_Acc"].to_numpy())
+    vehicules = _scan(
+        datasets["vehicules"],
+        table_columns["vehicules"],
+        table_filters["vehicules"] + [pc.field("Num_Acc").isin(accident_keys)],
+    ).drop_duplicates(subset=VEHICLE_KEY)
+
+    vehicle_accidents = pa.array(vehicules["Num_Acc"].unique())
+    usagers = _scan(
+        datasets["usagers"],
+        table_columns["usagers"],
+        table_filters["usagers"] + [pc.field("Num_Acc").isin(vehicle_accidents)],
+    )
+    usagers = usagers.merge(vehicules[VEHICLE_KEY], on=VEHICLE_KEY, how="inner")
+
+    # Un filtre sur les véhicules restreint aussi les accidents
+    if table_filters["vehicules"]:
+        accidents = accidents[accidents["Num_Acc"].isin(vehicules["Num_Acc"])]
+    return StarSchema(accidents=accidents, vehicules=vehicules, usagers=usagers)
+
+
+def concat_frames(frames):
+    """Concatène des DataFrames en conservant les colonnes catégorielles."""
+    if len(frames) == 1:
+        return frames[0]
+    for column in frames[0].columns:
+        first = frames[0][column].dtype
+        if isinstance(first, pd.CategoricalDtype) and any(f[column].dtype != first for f in frames):
+            categories = pd.api.types.union_categoricals([f[column] for f in frames]).categories
+            frames = [f.assign(**{column: f[column].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_partitioned_query(partitions, columns, filters=()):
+    """Exécute une requête sur plusieurs années et concatène les résultats.
+
+    `partitions` associe chaque année retenue à ses fichiers sources
+    ({année: {table: chemin}}) ; les autres années ne sont pas lues.
+    """
+    if not partitions:
+        raise ValueError("Aucune année sélectionnée.")
+    with ThreadPoolExecutor() as pool:
+        parts = list(pool.map(lambda paths: run_query(paths, columns, filters), partitions.values()))
+    return StarSchema(
+        accidents=concat_frames([part.accidents for part in parts]),
+        vehicules=concat_frames([part.vehicules for part in parts]),
+        usagers=concat_frames([part.usagers for part in parts]),
+    )
+
+
+def user_view_path(source_paths, columns, filters=()):
+    """Chemin de la vue usagers d'une année pour une version des données, des colonnes et des filtres."""
+    version = ingestion.data_version(source_paths.values())
+    key = hashlib.sha256(f"{version}:{list(columns)!r}:{filters!r}:{store.STORE_VERSION}".encode()).hexdigest()
+    _, year = ingestion.partition_of(source_paths["caract"])
+    return os.path.join(ingestion.CACHE_DIR, f"an={year}", f"vue-{key[:16]}.arrow")
+
+
+def load_user_view(source_paths, columns, filters=()):
+    """Vue usagers d'une année, construite une fois par hôte puis partagée (lecture seule)."""
+    return store.shared(user_view_path(source_paths, columns, filters),
+                        lambda: run_query(source_paths, columns, filters).user_view(columns))
+
+
+def partitioned_view_path(data_version, columns, filters=()):
+    """Chemin de la vue usagers de plusieurs années dans le magasin partagé."""
+    return store.dataset_path("usagers", (data_version, list(columns), filters))
+
+
+def load_partitioned_user_view(partitions, columns, filters=()):
+    """Vue usagers de plusieurs années, assemblée à partir des vues annuelles (lecture seule)."""
+    if len(partitions) == 1:
+        return load_user_view(next(iter(partitions.values())), columns, filters)
+    source_paths = [path for tables in partitions.values() for path in tables.values()]
+    target = partitioned_view_path(ingestion.data_version(source_paths), columns, filters)
+    return store.shared(target, lambda: concat_frames(
+        [load_user_view(paths, columns, filters) for paths in partitions.values()]))
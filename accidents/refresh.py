@@ -0,0 +1,269 @@
+"""Rafraîchissement incrémental des données publiées.
+
+Lorsque des fichiers corrigés ou complétés sont déposés dans data/, le
+rafraîchissement :
+
+1. détecte les fichiers modifiés (date de modification et taille, puis
+   empreinte du contenu) par rapport à la génération publiée ;
+2. convertit ces seuls fichiers en cache Arrow ;
+3. compare ancienne et nouvelle version à la maille de l'accident
+   (`Num_Acc`) : une empreinte par accident, combinant ses lignes des quatre
+   tables, donne les accidents ajoutés, modifiés et supprimés ;
+4. met à jour par différence les jeux de données préparés de l'année (vue
+   usagers du tableau de bord et cubes de comptages) : les usagers des
+   accidents supprimés ou modifiés sont retirés, ceux des accidents ajoutés
+   ou modifiés sont ajoutés ;
+5. reconstruit les figures pré-calculées à partir des cubes mis à jour ;
+6. publie la nouvelle génération en remplaçant atomiquement le pointeur
+   data/cache/CURRENT, puis supprime de data/cache/ tout fichier qui n'est
+   référencé ni par elle ni par la génération précédente (cf.
+   `referenced_caches`).
+
+Jusqu'à la publication, le tableau de bord continue d'utiliser la génération
+précédente (cf. `ingestion.file_hash`) ; les sessions basculent ensuite d'un
+bloc vers la nouvelle version.
+
+    python -m accidents.refresh
+"""
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+
+from accidents import artifacts, choropleth, cube, export, figures, ingestion, model, query, sampling, search, store
+
+# Jeux de données mis à jour par différence : vues usagers (colonnes, filtres) et cubes (filtres)
+VIEWS = [(figures.COLONNES_TABLEAU, figures.FILTRES_MOTORISES)]
+CUBES = [figures.FILTRES_MOTORISES]
+
+
+def detect_changes(current, partitions):
+    """Empreintes des fichiers sources ; seuls les fichiers dont la date ou la taille a changé sont relus."""
+    known = current["fichiers"] if current else {}
+    files = {}
+    for tables in partitions.values():
+        for file_path in tables.values():
+            path = os.path.normpath(file_path)
+            stat = os.stat(path)
+            entry = known.get(path)
+            if entry and (entry["mtime_ns"], entry["taille"]) == (stat.st_mtime_ns, stat.st_size):
+                digest = entry["empreinte"]
+            else:
+                digest = ingestion.content_hash(path)
+            files[path] = {"empreinte": digest, "mtime_ns": stat.st_mtime_ns, "taille": stat.st_size}
+    return files
+
+
+def _table_digests(table):
+    """Somme des empreintes des lignes de chaque accident d'une table (Series indexée par Num_Acc)."""
+    frame = table.to_pandas()
+    rows = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    keys = frame["Num_Acc"].to_numpy()
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    sums = np.add.reduceat(rows, starts) if len(keys) else np.array([], dtype=np.uint64)
+    return pd.Series(sums, index=keys[starts])
+
+
+def accident_digests(tables):
+    """Empreinte de chaque accident, combinant ses lignes des quatre tables."""
+    digests = [_table_digests(tables[table]) for table in query.TABLES]
+    keys = np.unique(np.concatenate([digest.index.to_numpy() for digest in digests]))
+    combined = np.zeros(len(keys), dtype=np.uint64)
+    for position, digest in enumerate(digests):
+        values = np.zeros(len(keys), dtype=np.uint64)
+        values[np.searchsorted(keys, digest.index.to_numpy())] = digest.to_numpy()
+        # Multiplicateur impair propre à chaque table (arithmétique modulo 2**64)
+        combined += values * np.uint64(2 * position + 1)
+    return pd.Series(combined, index=keys)
+
+
+def diff_accidents(old_tables, new_tables):
+    """Accidents ajoutés, modifiés et supprimés entre deux versions des tables d'une année."""
+    old = accident_digests(old_tables)
+    new = accident_digests(new_tables)
+    common = new.index.intersection(old.index)
+    return {
+        "ajoutes": new.index.difference(old.index).to_numpy(),
+        "modifies": common[new[common].to_numpy() != old[common].to_numpy()].to_numpy(),
+        "supprimes": old.index.difference(new.index).to_numpy(),
+    }
+
+
+def _subset(tables, keys):
+    """Datasets restreints aux accidents donnés."""
+    key_array = pa.array(np.asarray(keys, dtype=np.int64))
+    return {
+        name: ds.dataset(table.filter(pc.is_in(table["Num_Acc"], value_set=key_array.cast(table["Num_Acc"].type))))
+        for name, table in tables.items()
+    }
+
+
+def _user_view(tables, keys, columns, filters):
+    return query.query_datasets(_subset(tables, keys), columns, filters).user_view(columns)
+
+
+def update_year(source_paths, old_hashes, new_hashes):
+    """Met à jour par différence les jeux de données préparés d'une année ; retourne le diff."""
+    tables = {table: os.path.normpath(path) for table, path in source_paths.items()}
+    old_caches = {table: ingestion.cache_path(path, old_hashes[path]) for table, path in tables.items()}
+    new_caches = {table: ingestion.cache_path(path, new_hashes[path]) for table, path in tables.items()}
+    pending = [table for table in tables if not os.path.exists(new_caches[table])]
+    ingestion.convert_all([(tables[table], new_caches[table]) for table in pending])
+    if not all(os.path.exists(path) for path in old_caches.values()):
+        # Caches de la génération précédente absents : les jeux de données seront reconstruits
+        return None
+
+    old_tables = {table: feather.read_table(path, memory_map=True) for table, path in old_caches.items()}
+    new_tables = {table: feather.read_table(path, memory_map=True) for table, path in new_caches.items()}
+    diff = diff_accidents(old_tables, new_tables)
+    removed = np.concatenate([diff["supprimes"], diff["modifies"]])
+    added = np.concatenate([diff["ajoutes"], diff["modifies"]])
+
+    for columns, filters in VIEWS:
+        with ingestion.pinned(old_hashes):
+            old_path = query.user_view_path(tables, columns, filters)
+        with ingestion.pinned(new_hashes):
+            new_path = query.user_view_path(tables, columns, filters)
+        if os.path.exists(old_path) and not os.path.exists(new_path):
+            view = store.read(old_path)
+            kept = view[~view["Num_Acc"].isin(removed)]
+            updated = query.concat_frames([kept, _user_view(new_tables, added, columns, filters)])
+            store.write(new_path, updated.reset_index(drop=True))
+
+    for filters in CUBES:
+        removed_view = _user_view(old_tables, removed, cube.COLUMNS, filters)
+        added_view = _user_view(new_tables, added, cube.COLUMNS, filters)
+        for group in cube.CUBES:
+            with ingestion.pinned(old_hashes):
+                old_path = cube.cube_path(tables, filters, group)
+            with ingestion.pinned(new_hashes):
+                new_path = cube.cube_path(tables, filters, group)
+            if os.path.exists(old_path) and not os.path.exists(new_path):
+                store.write(new_path, cube.apply_delta(store.read(old_path), removed_view, added_view))
+    return diff
+
+
+def publish(files, previous):
+    """Remplace atomiquement le pointeur de génération publiée."""
+    current = {
+        "generation": (previous["generation"] + 1) if previous else 1,
+        "publie_le": datetime.datetime.now().isoformat(timespec="seconds"),
+        "fichiers": files,
+        "precedent": {path: entry["empreinte"] for path, entry in previous["fichiers"].items()} if previous else {},
+    }
+    tmp_path = f"{ingestion.CURRENT_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(current, f, indent=2)
+    os.replace(tmp_path, ingestion.CURRENT_PATH)
+    return current
+
+
+def referenced_caches(hashes):
+    """Fichiers de data/cache/ référencés par une génération ({chemin source: empreinte}).
+
+    Caches Arrow des fichiers sources, vues usagers et cubes de chaque année,
+    puis, pour chaque année seule et pour toutes les années ensemble (les
+    sélections dont les figures sont pré-calculées) : vue usagers assemblée,
+    échantillons, index de recherche, modèle et figures pré-calculées. Les jeux
+    de données des autres sélections sont reconstruits à la demande.
+    """
+    partitions = {}
+    for path in hashes:
+        table, year = ingestion.partition_of(path)
+        partitions.setdefault(year, {})[table] = path
+    selections = [{year: tables} for year, tables in partitions.items()]
+    if len(partitions) > 1:
+        selections.append(partitions)
+
+    referenced = set()
+    with ingestion.pinned(hashes):
+        referenced.update(ingestion.cache_path(path, digest) for path, digest in hashes.items())
+        for tables in partitions.values():
+            referenced.update(query.user_view_path(tables, columns, filters) for columns, filters in VIEWS)
+            referenced.update(cube.cube_path(tables, filters, group) for filters in CUBES for group in cube.CUBES)
+        for selection in selections:
+            version = ingestion.data_version([path for tables in selection.values() for path in tables.values()])
+            if len(selection) > 1:
+                referenced.update(query.partitioned_view_path(version, columns, filters) for columns, filters in VIEWS)
+            referenced.update(sampling.sample_path(version, size) for size in sampling.SAMPLE_SIZES)
+            referenced.update(search.index_paths(version))
+            referenced.add(model.model_path(version, model.DEFAULT_PARAMS))
+            referenced.update(artifacts.referenced_paths(artifacts.manifest_key(version)))
+    return {os.path.normpath(path) for path in referenced}
+
+
+def remove_stale_caches(current):
+    """Supprime de data/cache/ les fichiers référencés ni par la génération publiée ni par la précédente.
+
+    Sont conservés le pointeur, les fichiers temporaires (écritures en cours),
+    les contours simplifiés, qui ne dépendent pas des fichiers BAAC, et les
+    verrous des exports.
+    """
+    kept = referenced_caches({path: entry["empreinte"] for path, entry in current["fichiers"].items()})
+    kept |= referenced_caches(current["precedent"])
+    kept |= {os.path.normpath(ingestion.CURRENT_PATH)}
+    kept |= {f"{path}.lock" for path in kept}
+    removed = 0
+    for root, dirs, names in os.walk(ingestion.CACHE_DIR):
+        if os.path.normpath(root) in (os.path.normpath(choropleth.GEO_CACHE_DIR), os.path.normpath(export.LOCKS_DIR)):
+            dirs.clear()
+            continue
+        for name in names:
+            path = os.path.normpath(os.path.join(root, name))
+            if path not in kept and not name.endswith(".tmp"):
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def refresh():
+    """Détecte les changements, met à jour les jeux de données et publie ; retourne un résumé par année."""
+    with store.build_lock(ingestion.CURRENT_PATH):
+        previous = ingestion.published()
+        partitions = ingestion.discover_partitions(unpublished=True)
+        files = detect_changes(previous, partitions)
+        old_hashes = {path: entry["empreinte"] for path, entry in previous["fichiers"].items()} if previous else {}
+        new_hashes = {path: entry["empreinte"] for path, entry in files.items()}
+        if previous is not None and old_hashes == new_hashes:
+            return previous, {}
+
+        summary = {}
+        with ingestion.pinned(new_hashes):
+            for year, source_paths in partitions.items():
+                paths = [os.path.normpath(path) for path in source_paths.values()]
+                if all(old_hashes.get(path) == new_hashes[path] for path in paths):
+                    continue
+                if any(path not in old_hashes for path in paths):
+                    summary[year] = "nouvelle année"
+                    continue
+                diff = update_year(source_paths, old_hashes, new_hashes)
+                summary[year] = "reconstruction complète" if diff is None else {
+                    name: len(keys) for name, keys in diff.items()}
+
+            # Figures pré-calculées de la nouvelle génération : chaque année, puis toutes les années
+            ingestion.ingest_partitions(partitions)
+            selections = [[year] for year in partitions] + ([list(partitions)] if len(partitions) > 1 else [])
+            for years in selections:
+                artifacts.build({year: partitions[year] for year in years})
+
+        current = publish(files, previous)
+        remove_stale_caches(current)
+        return current, summary
+
+
+if __name__ == "__main__":
+    current, summary = refresh()
+    if not summary:
+        print(f"Aucun changement : génération {current['generation']} inchangée")
+    for year, changes in summary.items():
+        print(f"{year} : {changes}")
+    if summary:
+        print(f"Génération {current['generation']} publiée")
@@ -0,0 +1,230 @@
+"""Échantillons stratifiés et estimations avec intervalles de confiance.
+
+Tant que les figures exactes ne sont pas disponibles, le tableau de bord les
+estime sur un échantillon stratifié par département et gravité. Chaque
+strate reçoit une part de l'échantillon proportionnelle à sa taille (au moins
+`MIN_PAR_STRATE` usagers, ou toute la strate si elle est plus petite), et
+chaque usager tiré porte le poids population / échantillon de sa strate : les
+comptages estimés sont à l'échelle des données complètes, sans biais.
+
+Les échantillons des différentes tailles (`SAMPLE_SIZES`) sont emboîtés (même
+tirage aléatoire par strate) et enregistrés dans data/cache/samples/ par
+version des données. Ils sont tirés dans les seules colonnes des cubes et des
+filtres croisés, lues depuis les caches Arrow (filtres appliqués à la lecture), sans passer par la
+vue usagers complète du tableau de bord ; le préchauffage
+(accidents/startup.py) les prépare avant la première session. Leur colonne
+`count` porte le poids de chaque usager : un échantillon est donc un cube de
+comptages valide pour accidents/figures.py.
+
+Les intervalles de confiance suivent l'estimateur stratifié classique
+(correction de population finie comprise) pour les comptages, et sa
+linéarisation pour les proportions (ex. part de chaque gravité par plage
+horaire).
+
+Construction hors ligne :
+
+    python -m accidents.sampling              # toutes les années
+    python -m accidents.sampling 2022 2023
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+from accidents import bitmaps, cube, figures, ingestion, query, store
+
+# À incrémenter si le tirage ou le format des échantillons change
+SAMPLES_VERSION = 1
+
+SAMPLES_DIR = os.path.join(ingestion.CACHE_DIR, "samples")
+
+# Tailles des échantillons, de la première estimation à la plus précise
+SAMPLE_SIZES = (20_000, 200_000)
+
+# Colonnes des échantillons : dimensions des cubes et des filtres croisés
+COLUMNS = cube.COLUMNS + [column for column in bitmaps.FILTER_DIMENSIONS if column not in cube.COLUMNS]
+
+# Variables de stratification
+STRATA = ["dep", "grav"]
+
+# Taille minimale d'une strate dans l'échantillon (nécessaire à l'estimation de la variance)
+MIN_PAR_STRATE = 5
+
+# Quantile de la loi normale pour un intervalle de confiance à 95 %
+Z_95 = 1.96
+
+# Estimation affichée avec chaque figure : (dimensions, dimension dont on estime
+# la répartition ou None pour des comptages, restriction du cube)
+ESTIMATES = {
+    "gravite": (["grav_desc"], None, None),
+    "plage_horaire": (["plage_horaire"], "grav_desc", figures.FILTRE_IDF),
+    "departement": (["dep"], "grav_desc", figures.FILTRE_IDF),
+    "jour_semaine": (["jour_semaine", "grav_desc"], None, figures.FILTRE_IDF),
+    "serie_temporelle": (["an", "mois", "jour"], None, None),
+    "heure": (["heure"], None, figures.FILTRE_IDF),
+    "mensuel": (["mois", "grav_desc"], None, None),
+    "annees_gravite": (["an", "grav_desc"], None, None),
+    "variation_annees": (["an"], None, None),
+    "mensuel_annees": (["an", "mois"], None, None),
+}
+
+
+def sample_path(data_version, size, filters=figures.FILTRES_MOTORISES):
+    """Chemin de l'échantillon d'une taille donnée pour une version des données."""
+    key = hashlib.sha256(f"{data_version}:{filters!r}:{SAMPLES_VERSION}".encode()).hexdigest()
+    return os.path.join(SAMPLES_DIR, f"echantillon-{key[:16]}-{size}.arrow")
+
+
+def stratified_samples(frame, sizes=SAMPLE_SIZES, seed=0):
+    """Échantillons emboîtés de chaque taille : {taille: DataFrame pondéré}."""
+    strata = frame.groupby(STRATA, observed=True).ngroup().to_numpy()
+    population = np.bincount(strata)
+
+    # Rang aléatoire de chaque usager dans sa strate : les tirages des différentes tailles sont emboîtés
+    keys = np.random.default_rng(seed).random(len(frame))
+    order = np.lexsort((keys, strata))
+    starts = np.cumsum(population) - population
+    rank = np.empty(len(frame), dtype=np.int64)
+    rank[order] = np.arange(len(frame)) - np.repeat(starts, population)
+
+    samples = {}
+    for size in sizes:
+        allocation = np.round(size * population / len(frame)).astype(np.int64)
+        allocation = np.minimum(population, np.maximum(allocation, MIN_PAR_STRATE))
+        keep = rank < allocation[strata]
+        sample = frame.loc[keep, COLUMNS].reset_index(drop=True)
+        sample["strate"] = strata[keep].astype(np.int32)
+        sample["population"] = population[strata[keep]].astype(np.int32)
+        sample["count"] = (population / allocation)[strata[keep]]
+        samples[size] = sample
+    return samples
+
+
+def strata_sizes(sample):
+    """Population et taille d'échantillon de chaque strate (échantillon non filtré)."""
+    return sample.groupby("strate").agg(population=("population", "first"), echantillon=("strate", "size"))
+
+
+def save_samples(data_version, frame, filters=figures.FILTRES_MOTORISES):
+    """Tire et enregistre les échantillons d'une vue usagers ; retourne {taille: échantillon}."""
+    samples = stratified_samples(frame)
+    for size, sample in samples.items():
+        store.write(sample_path(data_version, size, filters), sample)
+    return samples
+
+
+def read_columns(partitions, filters=figures.FILTRES_MOTORISES):
+    """Colonnes des échantillons pour les usagers des années données, lues depuis les caches Arrow."""
+    return query.run_partitioned_query(partitions, COLUMNS, filters).user_view(COLUMNS)
+
+
+def load_sample(data_version, size, partitions=None, filters=figures.FILTRES_MOTORISES):
+    """Échantillon d'une taille donnée : lu dans le cache, ou tiré dans les années `partitions` (une fois par hôte).
+
+    Retourne None si l'échantillon n'existe pas et qu'aucune année n'est fournie.
+    """
+    target = sample_path(data_version, size, filters)
+    if not os.path.exists(target) and partitions is not None:
+        with store.build_lock(target):
+            if not os.path.exists(target):
+                save_samples(data_version, read_columns(partitions, filters), filters)
+    if not os.path.exists(target):
+        return None
+    return store.read(target)
+
+
+def _interval(estimate, variance, upper=None):
+    half_width = Z_95 * np.sqrt(np.maximum(variance, 0))
+    low = np.maximum(estimate - half_width, 0)
+    high = estimate + half_width if upper is None else np.minimum(estimate + half_width, upper)
+    return low, high
+
+
+def estimate_counts(sample, strata, by, mask=None):
+    """Comptages estimés par dimensions `by`, avec leur intervalle de confiance à 95 %.
+
+    `strata` vient de `strata_sizes` sur l'échantillon complet : un masque
+    (filtres croisés) restreint le domaine estimé sans changer les strates.
+    """
+    selected = sample if mask is None else sample[mask]
+    counts = selected.groupby(["strate"] + by, observed=True).size().rename("n_g").reset_index()
+    counts = counts.join(strata, on="strate")
+    n = counts["echantillon"].to_numpy(dtype=float)
+    population = counts["population"].to_numpy(dtype=float)
+    share = counts["n_g"].to_numpy() / n
+    # Variance de l'indicatrice du groupe dans la strate (estimateur sans biais)
+    s2 = np.where(n > 1, share * (1 - share) * n / np.maximum(n - 1, 1), 0)
+    counts["estimation"] = population * share
+    counts["variance"] = population ** 2 * (1 - n / population) * s2 / n
+
+    result = counts.groupby(by, observed=True)[["estimation", "variance"]].sum().reset_index()
+    result["ic_bas"], result["ic_haut"] = _interval(result["estimation"], result["variance"])
+    return result.drop(columns="variance")
+
+
+def estimate_shares(sample, strata, by, column, mask=None):
+    """Répartition estimée de `column` au sein des groupes `by`, avec intervalle de confiance à 95 %.
+
+    La variance de la proportion R = Y_gk / Y_g est obtenue par linéarisation :
+    chaque usager du groupe g contribue (1 - R) / Y_g s'il porte la valeur k,
+    -R / Y_g sinon.
+    """
+    selected = sample if mask is None else sample[mask]
+    # Comptages (strate, groupe, valeur), y compris les valeurs absentes d'une strate
+    counts = selected.groupby(["strate"] + by + [column], observed=True).size()
+    counts = counts.unstack(column, fill_value=0).stack().rename("a").reset_index()
+    counts["n_g"] = counts.groupby(["strate"] + by, observed=True)["a"].transform("sum")
+    counts = counts.join(strata, on="strate")
+    n = counts["echantillon"].to_numpy(dtype=float)
+    population = counts["population"].to_numpy(dtype=float)
+    weight = population / n
+
+    counts["y_gk"] = weight * counts["a"]
+    counts["y_g"] = weight * counts["n_g"]
+    totals = counts.groupby(by + [column], observed=True)[["y_gk", "y_g"]].transform("sum")
+    ratio = (totals["y_gk"] / totals["y_g"]).to_numpy()
+    a = counts["a"].to_numpy()
+    b = counts["n_g"].to_numpy() - a
+    y_g = totals["y_g"].to_numpy()
+    sum_z = (a * (1 - ratio) - b * ratio) / y_g
+    sum_z2 = (a * (1 - ratio) ** 2 + b * ratio ** 2) / y_g ** 2
+    s2 = np.where(n > 1, (sum_z2 - sum_z ** 2 / n) / np.maximum(n - 1, 1), 0)
+    counts["part"] = ratio
+    counts["variance"] = population ** 2 * (1 - n / population) * s2 / n
+
+    result = counts.groupby(by + [column], observed=True).agg(part=("part", "first"), variance=("variance", "sum"))
+    result = result.reset_index()
+    result["ic_bas"], result["ic_haut"] = _interval(result["part"], result["variance"], upper=1)
+    return result.drop(columns="variance")
+
+
+def _restrict(sample, where, mask):
+    if not where:
+        return mask
+    restricted = np.ones(len(sample), dtype=bool) if mask is None else mask.copy()
+    for column, values in where.items():
+        restricted &= sample[column].isin(values).to_numpy()
+    return restricted
+
+
+def estimate_figure(name, sample, strata, mask=None):
+    """Estimations et intervalles de confiance des valeurs d'une figure (None si non prévue)."""
+    if name not in ESTIMATES:
+        return None
+    by, column, where = ESTIMATES[name]
+    mask = _restrict(sample, where, mask)
+    if column is None:
+        return estimate_counts(sample, strata, by, mask)
+    return estimate_shares(sample, strata, by, column, mask)
+
+
+if __name__ == "__main__":
+    found = ingestion.discover_partitions()
+    years = [int(year) for year in sys.argv[1:]] or list(found)
+    partitions = {year: found[year] for year in years}
+    source_paths = [path for tables in partitions.values() for path in tables.values()]
+    ingestion.ingest_partitions(partitions)
+    version = ingestion.data_version(source_paths)
+    for size, sample in save_samples(version, read_columns(partitions)).items():
+        print(f"{', '.join(map(str, years))} : {len(sample)} usagers -> {sample_path(version, size)}")
@@ -0,0 +1,152 @@
+"""Schéma typé des fichiers BAAC.
+
+Les colonnes codées de la nomenclature BAAC sont stockées en int8 (-1 pour
+« non renseigné »), les codes géographiques et horaires en `category` de
+chaînes (les départements corses 2A/2B sont conservés). Les libellés des
+codes sont extraits du dictionnaire `DESCRIPTIONS`.
+
+Les fichiers publiés jusqu'en 2018 suivent l'ancien format du BAAC :
+séparateur ',' (tabulation certaines années), encodage latin-1, année sur
+deux chiffres, département sur trois caractères ("590", "201" pour la
+Corse-du-Sud), commune sans le département, coordonnées en cent-millièmes de
+degré (0 si absentes), heure "HHMM" sans zéros initiaux et pas
+d'identifiant de véhicule. `normalize_legacy` les ramène aux conventions du
+format actuel avant typage.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from accidents.descriptions import DESCRIPTIONS
+
+# À incrémenter à chaque modification du schéma (invalide le cache Arrow)
+SCHEMA_VERSION = 3
+
+# Colonnes codées de chaque fichier, stockées en int8
+CODED_COLUMNS = {
+    "caract": ["lum", "agg", "int", "atm", "col"],
+    "lieux": ["catr", "circ", "vosp", "prof", "plan", "surf", "infra", "situ"],
+    "vehicules": ["senc", "catv", "obs", "obsm", "choc", "manv", "motor"],
+    "usagers": ["place", "catu", "grav", "sexe", "trajet", "secu", "secu1", "secu2", "secu3",
+                "locp", "etatp"],
+}
+
+# Petits entiers (jour, mois, année, etc.)
+INTEGER_COLUMNS = {
+    "jour": "int8",
+    "mois": "int8",
+    "an": "int16",
+    "nbv": "Int8",
+    "vma": "Int16",
+    "an_nais": "Int16",
+    "occutc": "Int16",
+}
+
+# Codes textuels à faible cardinalité, stockés en category
+CATEGORICAL_COLUMNS = ["dep", "com", "hrmn", "actp"]
+
+# Colonnes à lire en texte pour ne pas perdre les zéros initiaux
+STRING_COLUMNS = ["dep", "com", "hrmn", "actp", "adr", "voie", "v1", "v2", "pr", "pr1",
+                  "id_vehicule", "id_usager", "num_veh"]
+
+# Dernière année publiée dans l'ancien format du BAAC
+LEGACY_LAST_YEAR = 2018
+
+# Départements corses dans l'ancien format
+_LEGACY_CORSE = {"201": "2A", "202": "2B"}
+
+_LABEL_LINE = re.compile(r"^\s*(-?\d+)\s*:\s*(.+?)\.?\s*$")
+
+
+def table_name(file_path):
+    """Nom de la table BAAC d'un fichier (ex. 'caract' pour caract-2023.csv)."""
+    return os.path.splitext(os.path.basename(file_path))[0].split("-")[0]
+
+
+def _parse_labels():
+    """Extrait les libellés « code : libellé » de chaque variable décrite."""
+    labels = {}
+    for variables in DESCRIPTIONS.values():
+        for column, description in variables.items():
+            codes = {}
+            for line in description.split("\n")[1:]:
+                match = _LABEL_LINE.match(line)
+                if match:
+                    codes[int(match.group(1))] = match.group(2)
+            if codes:
+                labels[column] = codes
+    return labels
+
+
+# Libellés des codes par variable, ex. LABELS["grav"][4] == "Tué"
+LABELS = _parse_labels()
+
+
+def read_dtypes():
+    """Types à imposer à la lecture du CSV."""
+    return {column: str for column in STRING_COLUMNS}
+
+
+def normalize_legacy(df, table):
+    """Ramène une table de l'ancien format (jusqu'en 2018) aux conventions du format actuel.
+
+    L'heure "HHMM" est lue telle quelle par `features.hour_minute`.
+    """
+    df = df.copy()
+    if "an" in df.columns:
+        an = pd.to_numeric(df["an"], errors="coerce")
+        df["an"] = an.where(an >= 100, an + 2000)
+    if "dep" in df.columns:
+        dep = df["dep"].str.strip().replace(_LEGACY_CORSE)
+        # "590" -> "59" ; les départements d'outre-mer gardent leurs trois chiffres
+        metropole = (dep.str.len() == 3) & ~dep.str.startswith("97")
+        df["dep"] = dep.where(~metropole, dep.str.slice(0, 2))
+        if "com" in df.columns:
+            com = df["com"].str.strip()
+            df["com"] = com.where(com.str.len() > 3, df["dep"].str.slice(0, 2) + com.str.zfill(3))
+    for column in ["lat", "long"]:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            df[column] = (values / 100_000).where(values != 0)
+    if table in ("vehicules", "usagers") and "id_vehicule" not in df.columns and "num_veh" in df.columns:
+        # Le numéro du véhicule dans l'accident (A01, B01, ...) tient lieu d'identifiant
+        df["id_vehicule"] = df["num_veh"]
+    return df
+
+
+def apply_schema(df, table):
+    """Convertit les colonnes d'une table BAAC vers leurs types compacts."""
+    df = df.copy()
+    for column in CODED_COLUMNS.get(table, []):
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce").fillna(-1).astype("int8")
+    for column, dtype in INTEGER_COLUMNS.items():
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            if dtype[0] == "i":
+                values = values.fillna(-1)
+            df[column] = values.astype(dtype)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].str.strip().astype("category")
+    for column in ["lat", "long"]:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def label_series(codes, column):
+    """Libellés d'une colonne codée, sous forme de Series `category`.
+
+    Les codes absents du dictionnaire (dont -1) donnent une valeur manquante.
+    """
+    labels = LABELS[column]
+    categories = list(labels.values())
+    # Table de correspondance code int8 -> position de la catégorie
+    lookup = np.full(256, -1, dtype=np.int16)
+    for position, code in enumerate(labels):
+        lookup[code + 128] = position
+    positions = lookup[codes.to_numpy(dtype=np.int16) + 128]
+    return pd.Series(pd.Categorical.from_codes(positions, categories), index=codes.index, name=column)
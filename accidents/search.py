@@ -0,0 +1,282 @@
+"""Recherche d'accidents par adresse, route ou commune (index inversé).
+
+Les champs `adr` (adresse), `voie` (numéro ou nom de la route) et `com`
+(code INSEE de la commune) sont normalisés :
+
+- accents et casse repliés (« Av. des Champs-Élysées » -> « av des champs elysees ») ;
+- types de voie développés (av -> avenue, bd -> boulevard, r -> rue...) et
+  numéros de route réunis (« RN 7 », « N7 », « route nationale 7 » -> « n7 ») ;
+- mots vides (de, la, des...) écartés de l'index.
+
+Chaque terme pointe vers la liste triée des accidents qui le contiennent
+(positions dans la table des accidents). Une recherche intersecte les listes
+de ses termes, le dernier étant traité comme un préfixe (saisie en cours) :
+quelques millisecondes, au lieu de `str.contains` sur des millions de
+chaînes. La normalisation porte sur les valeurs distinctes de chaque champ,
+et non ligne par ligne.
+
+La table des accidents (avec la rue normalisée et les comptages d'usagers
+par gravité) et l'index sont construits une fois par version des données
+dans le magasin partagé (accidents/store.py).
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from accidents import query, schema, store
+
+# À incrémenter si la normalisation ou le format de l'index change
+SEARCH_VERSION = 1
+
+# Champs indexés
+FIELDS = ["adr", "voie", "com"]
+
+# Colonnes de la table des accidents
+COLUMNS = ["an", "dep", "com", "adr", "voie", "grav"]
+
+# Types de voie et abréviations courantes, sous leur forme développée
+STREET_TYPES = {
+    "av": "avenue", "ave": "avenue", "avn": "avenue",
+    "bd": "boulevard", "bld": "boulevard", "blvd": "boulevard", "boul": "boulevard", "bvd": "boulevard",
+    "r": "rue",
+    "rte": "route", "rt": "route",
+    "ch": "chemin", "chem": "chemin", "che": "chemin",
+    "pl": "place",
+    "all": "allee",
+    "imp": "impasse",
+    "crs": "cours",
+    "qu": "quai", "qua": "quai",
+    "sq": "square",
+    "fg": "faubourg", "fbg": "faubourg",
+    "pte": "porte",
+    "rpt": "rond-point", "rdpt": "rond-point",
+    "st": "saint", "ste": "sainte",
+    "gal": "general", "gen": "general",
+    "mal": "marechal",
+    "pdt": "president",
+}
+
+# Préfixes des routes numérotées : autoroute, nationale, départementale
+ROAD_PREFIXES = {
+    "a": "a", "autoroute": "a", "aut": "a",
+    "n": "n", "rn": "n", "nationale": "n",
+    "d": "d", "rd": "d", "cd": "d", "departementale": "d",
+}
+
+# Mots non indexés
+STOP_WORDS = {"a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "sur"}
+
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+_ROAD = re.compile(r"^(a|n|d|rn|rd|cd)(\d+[a-z]?)$")
+_HOUSE_NUMBER = re.compile(r"^\d+[a-z]?$|^(bis|ter)$")
+
+# Codes de gravité et gravités comptées comme graves (hospitalisés et tués)
+_GRAV_CODES = list(schema.LABELS["grav"])
+_GRAVES = [3, 4]
+
+
+def fold(text):
+    """Texte sans accents, en minuscules, mots séparés par une espace."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _SEPARATORS.sub(" ", text.lower()).strip()
+
+
+def normalize(text):
+    """Mots normalisés d'un texte (mots vides compris) : types de voie développés, routes réunies."""
+    words = fold(text).split()
+    tokens = []
+    position = 0
+    while position < len(words):
+        word = words[position]
+        road = _ROAD.match(word)
+        following = words[position + 1] if position + 1 < len(words) else None
+        if road:
+            word = ROAD_PREFIXES[road.group(1)] + road.group(2)
+        elif word == "route" and following in ("nationale", "departementale"):
+            # « route nationale 7 » : le type de route suit
+            position += 1
+            continue
+        elif word in ROAD_PREFIXES and following and following[0].isdigit() and _ROAD.match("a" + following):
+            word = ROAD_PREFIXES[word] + following
+            position += 1
+        else:
+            word = STREET_TYPES.get(word, word)
+        tokens.append(word)
+        position += 1
+    return tokens
+
+
+def terms(text):
+    """Termes indexés d'un texte."""
+    return [token for token in normalize(text) if token not in STOP_WORDS]
+
+
+def street(text):
+    """Rue normalisée d'une adresse (numéro de voirie retiré), ex. « rue de la republique »."""
+    tokens = normalize(text)
+    while tokens and _HOUSE_NUMBER.match(tokens[0]):
+        tokens = tokens[1:]
+    return " ".join(tokens)
+
+
+def _normalized_categories(values, func):
+    """Applique `func` aux valeurs distinctes : (codes par ligne, -1 si manquant ; résultats par valeur)."""
+    codes, uniques = pd.factorize(values)
+    return codes, [func(value) for value in uniques]
+
+
+def build_accidents(partitions):
+    """Table des accidents : champs recherchés, rue normalisée et comptages d'usagers par gravité."""
+    star = query.run_partitioned_query(partitions, COLUMNS)
+    accidents = star.accidents[["Num_Acc", "an", "dep", "com", "adr", "voie"]].reset_index(drop=True)
+
+    # Rue : l'adresse, ou à défaut la route
+    adr_codes, adr_streets = _normalized_categories(accidents["adr"], street)
+    voie_codes, voie_streets = _normalized_categories(accidents["voie"], street)
+    rues = np.where(adr_codes >= 0, np.array(adr_streets + [""], dtype=object)[adr_codes], "")
+    rues_voie = np.where(voie_codes >= 0, np.array(voie_streets + [""], dtype=object)[voie_codes], "")
+    rues = np.where(rues == "", rues_voie, rues)
+    accidents["rue"] = pd.Categorical(rues)
+
+    # Usagers de chaque accident par gravité
+    usagers = star.usagers
+    counts = usagers.groupby(["Num_Acc", "grav"], observed=True).size().unstack(fill_value=0)
+    counts = counts.reindex(columns=_GRAV_CODES, fill_value=0)
+    counts = counts.reindex(accidents["Num_Acc"], fill_value=0)
+    accidents["usagers"] = counts.sum(axis=1).to_numpy(dtype=np.int32)
+    for code in _GRAV_CODES:
+        accidents[f"grav_{code}"] = counts[code].to_numpy(dtype=np.int32)
+    return accidents
+
+
+def build_postings(accidents):
+    """Index inversé : une ligne par (terme, accident), triée ; les termes sont une catégorie triée."""
+    term_ids = {}
+    pair_terms, pair_rows = [], []
+    for field in FIELDS:
+        codes, field_terms = _normalized_categories(accidents[field], terms)
+        valid = np.flatnonzero(codes >= 0)
+        order = valid[np.argsort(codes[valid], kind="stable")]
+        counts = np.bincount(codes[valid], minlength=len(field_terms))
+        starts = np.cumsum(counts) - counts
+
+        # Paires (valeur distincte, terme), puis développées en (accident, terme)
+        values = np.array([value for value, found in enumerate(field_terms) for _ in found], dtype=np.int64)
+        ids = np.array([term_ids.setdefault(term, len(term_ids)) for found in field_terms for term in found],
+                       dtype=np.int64)
+        lengths = counts[values]
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) - np.repeat(offsets, lengths) + np.repeat(starts[values], lengths)
+        pair_rows.append(order[positions])
+        pair_terms.append(np.repeat(ids, lengths))
+
+    # Identifiants des termes dans l'ordre alphabétique (recherche par préfixe)
+    vocabulary = np.array(list(term_ids), dtype=object)
+    alphabetical = np.argsort(vocabulary.astype(str), kind="stable")
+    rank = np.empty(len(vocabulary), dtype=np.int64)
+    rank[alphabetical] = np.arange(len(vocabulary))
+    term_codes = rank[np.concatenate(pair_terms)] if pair_terms else np.array([], dtype=np.int64)
+    rows = np.concatenate(pair_rows) if pair_rows else np.array([], dtype=np.int64)
+
+    # Tri par (terme, accident), sans doublon (même terme dans plusieurs champs)
+    keys = np.sort(term_codes * len(accidents) + rows)
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    return pd.DataFrame({
+        "terme": pd.Categorical.from_codes(keys // max(len(accidents), 1), vocabulary[alphabetical]),
+        "position": (keys % max(len(accidents), 1)).astype(np.int32),
+    })
+
+
+class AddressIndex:
+    """Index inversé des adresses, routes et communes des accidents."""
+
+    def __init__(self, accidents, postings):
+        self.accidents = accidents
+        self.vocabulary = np.asarray(postings["terme"].cat.categories, dtype=str)
+        codes = postings["terme"].cat.codes.to_numpy()
+        self.offsets = np.searchsorted(codes, np.arange(len(self.vocabulary) + 1))
+        self.positions = postings["position"].to_numpy()
+
+    def __len__(self):
+        return len(self.accidents)
+
+    def _term_range(self, term, prefix):
+        low = np.searchsorted(self.vocabulary, term, side="left")
+        if prefix:
+            high = np.searchsorted(self.vocabulary, term + "\uffff", side="left")
+        else:
+            high = low + 1 if low < len(self.vocabulary) and self.vocabulary[low] == term else low
+        return low, high
+
+    def search(self, text):
+        """Positions (triées) des accidents contenant tous les termes du texte, le dernier en préfixe."""
+        query_terms = terms(text)
+        result = None
+        for position, term in enumerate(query_terms):
+            low, high = self._term_range(term, prefix=position == len(query_terms) - 1)
+            found = self.positions[self.offsets[low]:self.offsets[high]]
+            if high - low > 1:
+                found = np.unique(found)
+            result = found if result is None else np.intersect1d(result, found, assume_unique=True)
+            if not len(result):
+                break
+        return np.array([], dtype=np.int32) if result is None else result
+
+    def matches(self, positions):
+        """Accidents trouvés."""
+        return self.accidents.iloc[positions]
+
+    def street_ranking(self, positions, by="accidents"):
+        """Rues des accidents trouvés, classées par nombre d'accidents ("accidents") ou d'usagers graves ("graves")."""
+        found = self.accidents.iloc[positions]
+        columns = ["usagers"] + [f"grav_{code}" for code in _GRAV_CODES]
+        grouped = found.groupby(["rue", "com"], observed=True)
+        ranking = grouped[columns].sum()
+        ranking.insert(0, "accidents", grouped.size())
+        ranking["graves"] = ranking[[f"grav_{code}" for code in _GRAVES]].sum(axis=1)
+        ranking["part_graves"] = ranking["graves"] / ranking["usagers"].where(ranking["usagers"] > 0)
+        ranking = ranking.sort_values([by, "graves" if by == "accidents" else "accidents"], ascending=False)
+        ranking = ranking.reset_index()
+        ranking.insert(0, "rang", np.arange(1, len(ranking) + 1))
+        return ranking
+
+
+def severity_labels(ranking):
+    """Colonnes de comptage renommées avec les libellés de gravité, pour l'affichage."""
+    return ranking.rename(columns={f"grav_{code}": label for code, label in schema.LABELS["grav"].items()})
+
+
+def index_paths(data_version):
+    """Chemins de la table des accidents et de l'index inversé d'une version des données."""
+    key = (data_version, SEARCH_VERSION)
+    return store.dataset_path("recherche-accidents", key), store.dataset_path("recherche-index", key)
+
+
+def load_index(data_version, partitions):
+    """Index de recherche d'une version des données, construit une fois par hôte (lecture seule)."""
+    accidents_path, postings_path = index_paths(data_version)
+    accidents = store.shared(accidents_path, lambda: build_accidents(partitions))
+    postings = store.shared(postings_path, lambda: build_postings(accidents))
+    return AddressIndex(accidents, postings)
+
+
+def wordcloud_png(ranking, weight="accidents", width=800, height=400):
+    """Nuage des rues pondérées par `weight` (PNG), ou None si wordcloud n'est pas installé."""
+    try:
+        from wordcloud import WordCloud
+    except ImportError:
+        return None
+    import io
+
+    frequencies = ranking.groupby("rue", observed=True)[weight].sum()
+    frequencies = frequencies[(frequencies > 0) & (frequencies.index != "")]
+    if frequencies.empty:
+        return None
+    cloud = WordCloud(width=width, height=height, background_color="white", colormap="YlOrRd")
+    cloud.generate_from_frequencies({str(rue): float(value) for rue, value in frequencies.items()})
+    buffer = io.BytesIO()
+    cloud.to_image().save(buffer, format="PNG")
+    return buffer.getvalue()
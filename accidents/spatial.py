@@ -0,0 +1,158 @@
+"""Index spatial des accidents.
+
+Les coordonnées sont projetées en mètres dans la projection de leur
+territoire, puis indexées dans un STRtree shapely, construit une fois par
+version des données. Lambert-93 n'est conforme qu'en métropole : les
+départements d'outre-mer (971 à 976) et les autres territoires présents dans
+les fichiers sont projetés dans leur projection UTM officielle, sans quoi
+distances et rayons y seraient faussés. Le plan de chaque territoire
+d'outre-mer est décalé de `TERRITORY_OFFSET` en x : les points de
+territoires différents ne se recouvrent jamais dans l'index. Les requêtes
+(emprise, rayon, k plus proches voisins, polygone) retournent les positions
+des accidents concernés dans le DataFrame d'origine.
+"""
+import functools
+
+import numpy as np
+import shapely
+
+LAMBERT93 = "EPSG:2154"
+WGS84 = "EPSG:4326"
+
+# Territoires d'outre-mer : emprise (lat_min, lat_max, lon_min, lon_max) et projection UTM locale.
+# Les points hors de ces emprises (métropole et Corse) sont projetés en Lambert-93.
+OVERSEAS_CRS = {
+    # Guadeloupe, Martinique, Saint-Martin, Saint-Barthélemy
+    "antilles": ((14.0, 18.6, -63.5, -60.5), "EPSG:5490"),
+    "guyane": ((1.5, 6.5, -55.0, -51.0), "EPSG:2972"),
+    "reunion": ((-21.6, -20.7, 54.9, 56.0), "EPSG:2975"),
+    "mayotte": ((-13.2, -12.5, 44.8, 45.5), "EPSG:4471"),
+    "saint_pierre": ((46.6, 47.2, -56.6, -55.9), "EPSG:4467"),
+}
+
+# Décalage en x (mètres) entre les plans des territoires (les abscisses locales sont comprises
+# entre 0 et 1 300 km)
+TERRITORY_OFFSET = 10_000_000
+
+# Fichier local des contours des communes et ses propriétés (code INSEE, nom)
+COMMUNES_PATH = "data/geo/communes.geojson"
+COMMUNE_CODE = "code"
+COMMUNE_NAME = "nom"
+
+
+@functools.cache
+def _transformers():
+    """Transformations WGS84 -> projection de chaque territoire (Lambert-93 d'abord), créées à la première
+    projection."""
+    from pyproj import Transformer
+
+    targets = [LAMBERT93] + [crs for _, crs in OVERSEAS_CRS.values()]
+    return [Transformer.from_crs(WGS84, target, always_xy=True) for target in targets]
+
+
+def territory(lat, lon):
+    """Territoire de chaque point : 0 pour la métropole, i pour le i-ème territoire de `OVERSEAS_CRS`."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    codes = np.zeros(lat.shape, dtype=np.int8)
+    for code, ((lat_min, lat_max, lon_min, lon_max), _) in enumerate(OVERSEAS_CRS.values(), start=1):
+        codes[(lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)] = code
+    return codes
+
+
+def project(lat, lon):
+    """Projette des coordonnées WGS84 dans la projection de leur territoire (x, y en mètres)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    codes = territory(lat, lon)
+    x = np.empty(lat.shape)
+    y = np.empty(lat.shape)
+    for code, transformer in enumerate(_transformers()):
+        rows = codes == code
+        if rows.any():
+            x[rows], y[rows] = transformer.transform(lon[rows], lat[rows])
+            x[rows] += code * TERRITORY_OFFSET
+    return x, y
+
+
+def unproject(x, y):
+    """Coordonnées WGS84 (lat, lon) de points projetés par `project`."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    codes = np.clip(np.floor(x / TERRITORY_OFFSET), 0, len(OVERSEAS_CRS)).astype(np.int8)
+    lat = np.empty(x.shape)
+    lon = np.empty(x.shape)
+    for code, transformer in enumerate(_transformers()):
+        rows = codes == code
+        if rows.any():
+            lon[rows], lat[rows] = transformer.transform(x[rows] - code * TERRITORY_OFFSET, y[rows],
+                                                         direction="INVERSE")
+    return lat, lon
+
+
+def project_geometries(geometries):
+    """Géométries WGS84 (lon, lat) projetées comme les accidents (cf. `project`)."""
+    return shapely.transform(geometries, lambda c: np.column_stack(project(c[:, 1], c[:, 0])))
+
+
+def unproject_geometries(geometries):
+    """Géométries projetées par `project` ramenées en WGS84 (lon, lat)."""
+    return shapely.transform(geometries, lambda c: np.column_stack(unproject(c[:, 0], c[:, 1])[::-1]))
+
+
+class SpatialIndex:
+    """STRtree des accidents projetés dans la projection de leur territoire."""
+
+    def __init__(self, lat, lon):
+        self.x, self.y = project(lat, lon)
+        self.tree = shapely.STRtree(shapely.points(self.x, self.y))
+
+    def __len__(self):
+        return len(self.x)
+
+    def in_bbox(self, lat_min, lat_max, lon_min, lon_max):
+        """Positions des accidents situés dans une emprise en degrés (d'un seul territoire)."""
+        box = shapely.segmentize(shapely.box(lon_min, lat_min, lon_max, lat_max), 0.01)
+        return self.in_polygon(project_geometries(box))
+
+    def within_distance(self, lat, lon, metres):
+        """Positions des accidents à moins de `metres` mètres d'un point."""
+        x, y = project([lat], [lon])
+        found = self.tree.query(shapely.points(x[0], y[0]), predicate="dwithin", distance=metres)
+        return np.sort(found)
+
+    def nearest(self, lat, lon, k, mask=None):
+        """Positions et distances (m) des `k` accidents les plus proches d'un point.
+
+        `mask` (booléens, un par accident) restreint la recherche aux accidents retenus.
+        """
+        k = min(k, len(self) if mask is None else int(mask.sum()))
+        if k == 0:
+            return np.array([], dtype=np.intp), np.array([])
+        x, y = project([lat], [lon])
+        point = shapely.points(x[0], y[0])
+        # Rayon doublé jusqu'à contenir k points : tous les points du rayon sont alors connus
+        radius = 100.0
+        while True:
+            found = self.tree.query(point, predicate="dwithin", distance=radius)
+            if mask is not None:
+                found = found[mask[found]]
+            if len(found) >= k:
+                break
+            radius *= 2
+        distances = np.hypot(self.x[found] - x[0], self.y[found] - y[0])
+        order = np.argsort(distances)[:k]
+        return found[order], distances[order]
+
+    def in_polygon(self, polygon):
+        """Positions des accidents situés dans un polygone projeté (cf. `project_geometries`)."""
+        return np.sort(self.tree.query(polygon, predicate="intersects"))
+
+
+def load_boundaries(path=COMMUNES_PATH):
+    """Contours (GeoJSON local) projetés comme les accidents (sans système de coordonnées unique)."""
+    import geopandas as gpd
+
+    boundaries = gpd.read_file(path).to_crs(WGS84)
+    return gpd.GeoDataFrame(boundaries.drop(columns=boundaries.geometry.name),
+                            geometry=project_geometries(boundaries.geometry.values), crs=None)
@@ -0,0 +1,218 @@
+"""Démarrage du tableau de bord : préchauffage en arrière-plan et signal de disponibilité.
+
+Dès le démarrage du serveur, un thread prépare les données de la sélection
+par défaut (dernière année) :
+
+1. conversion Arrow des fichiers sources, les quatre tables en parallèle
+   (pool de processus dans un sous-processus dédié, cf. `ingestion.ingest_partitions`) ;
+2. vue usagers du tableau de bord, construite dans le magasin partagé
+   (accidents/store.py) ;
+3. cubes de comptages des graphiques ;
+4. échantillons stratifiés du mode approché, si les figures exactes ne sont
+   pas encore pré-calculées (accidents/sampling.py).
+
+Pendant ce temps, le script affiche les sections statiques (introduction,
+description des variables) et des messages d'attente à la place des
+sections qui dépendent des données ; il attend la fin du préchauffage
+(`wait`) avant de lire les données depuis le magasin.
+
+Lancé par `python -m accidents.startup`, le préchauffage démarre avant le
+serveur Streamlit, sans attendre de session, et un petit serveur HTTP expose
+la disponibilité au répartiteur de charge : `GET /ready` répond 200 une fois
+le préchauffage terminé, 503 sinon, avec l'état détaillé en JSON ;
+`GET /live` répond 200 tant que le processus vit. Chaque processus a son
+propre port : `DASHBOARD_READY_PORT` s'il est défini (0 pour désactiver le
+signal), sinon le port du serveur Streamlit + `READY_PORT_OFFSET` (9501 pour
+8501). Un port déjà pris arrête le démarrage.
+
+Un préchauffage en échec (ex. fichiers de données pas encore déposés) est
+relancé après une attente croissante (`RETRY_DELAYS_S`, la dernière répétée
+indéfiniment) ; `/ready` répond 503 jusqu'au premier essai réussi, l'erreur
+et l'heure du prochain essai figurant dans la réponse. Les sessions
+n'attendent que le premier essai : en cas d'échec, le script charge lui-même
+les données.
+
+    python -m accidents.startup [options de streamlit run]      # serveur préchauffé dès le démarrage
+    python -m accidents.startup --verifier [options de streamlit run]  # sonde : code 0 si prêt
+
+Avec `streamlit run streamlit_app.py`, le préchauffage est lancé par la
+première session et aucun signal de disponibilité n'est exposé.
+"""
+import datetime
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from accidents import artifacts, cube, figures, ingestion, query, sampling
+
+# Écart entre le port du serveur Streamlit et celui du signal de disponibilité
+READY_PORT_OFFSET = 1000
+
+# Adresse d'écoute du signal (toutes les interfaces par défaut : le répartiteur de charge l'interroge)
+READY_ADDRESS = os.environ.get("DASHBOARD_READY_ADDRESS", "")
+
+# Attente avant chaque nouvel essai d'un préchauffage en échec (secondes) ; la dernière est répétée
+RETRY_DELAYS_S = [5, 15, 60, 300]
+
+# Script du tableau de bord lancé par la ligne de commande
+APP_SCRIPT = "streamlit_app.py"
+
+# Préchauffage du processus (un seul, partagé par toutes les sessions)
+_lock = threading.Lock()
+_warmup = None
+
+
+def default_selection(partitions):
+    """Années affichées à l'ouverture du tableau de bord (la plus récente)."""
+    latest = max(partitions)
+    return {latest: partitions[latest]}
+
+
+class Warmup:
+    """Préparation des données de la sélection par défaut, dans un thread."""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.state = {"etat": "en_attente", "debut": None, "etapes": {}, "erreur": None, "essais": 0,
+                      "prochain_essai": None}
+
+    def step(self, name, func):
+        start = time.perf_counter()
+        value = func()
+        self.state["etapes"][name] = round(time.perf_counter() - start, 3)
+        return value
+
+    def attempt(self):
+        """Un essai de préchauffage ; vrai s'il a réussi."""
+        self.state.update(etat="en_cours", debut=datetime.datetime.now().isoformat(timespec="seconds"), etapes={})
+        self.state["essais"] += 1
+        try:
+            partitions = ingestion.discover_partitions()
+            if not partitions:
+                raise FileNotFoundError(f"Aucun fichier de données dans {ingestion.DATA_DIR}/")
+            sources = default_selection(partitions)
+            self.state["annees"] = list(sources)
+            self.step("ingestion", lambda: ingestion.ingest_partitions(sources))
+            self.step("vue_usagers", lambda: query.load_partitioned_user_view(
+                sources, figures.COLONNES_TABLEAU, figures.FILTRES_MOTORISES))
+            self.step("cubes", lambda: cube.load_cubes(sources, figures.FILTRES_MOTORISES))
+            version = ingestion.data_version([path for tables in sources.values() for path in tables.values()])
+            if not artifacts.available(artifacts.manifest_key(version, figures.FILTRES_MOTORISES)):
+                self.step("echantillons", lambda: sampling.load_sample(version, sampling.SAMPLE_SIZES[0], sources))
+            self.state.update(etat="pret", erreur=None, prochain_essai=None)
+            return True
+        except Exception as e:
+            self.state["etat"] = "echec"
+            self.state["erreur"] = f"{type(e).__name__}: {e}"
+            return False
+        finally:
+            # Les sessions n'attendent que le premier essai : après un échec, le script charge lui-même les données
+            self.ready.set()
+
+    def run(self):
+        """Essais successifs jusqu'au premier succès, avec une attente croissante entre deux essais."""
+        failures = 0
+        while not self.attempt():
+            delay = RETRY_DELAYS_S[min(failures, len(RETRY_DELAYS_S) - 1)]
+            failures += 1
+            retry_at = datetime.datetime.now() + datetime.timedelta(seconds=delay)
+            self.state["prochain_essai"] = retry_at.isoformat(timespec="seconds")
+            time.sleep(delay)
+
+    def wait(self, timeout=None):
+        """Attend la fin du préchauffage ; vrai si les données sont prêtes."""
+        self.ready.wait(timeout)
+        return self.state["etat"] == "pret"
+
+
+class _ReadinessHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/live":
+            code, body = 200, {"etat": "vivant"}
+        elif self.path == "/ready":
+            body = status()
+            code = 200 if body["etat"] == "pret" else 503
+        else:
+            code, body = 404, {"erreur": "chemin inconnu"}
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # Sondes fréquentes : pas de journalisation
+        pass
+
+
+def ready_port(streamlit_args=()):
+    """Port du signal de disponibilité d'un serveur lancé avec ces options de `streamlit run` (0 : aucun)."""
+    if "DASHBOARD_READY_PORT" in os.environ:
+        return int(os.environ["DASHBOARD_READY_PORT"])
+    port = os.environ.get("STREAMLIT_SERVER_PORT", "8501")
+    for position, arg in enumerate(streamlit_args):
+        if arg.startswith("--server.port="):
+            port = arg.split("=", 1)[1]
+        elif arg == "--server.port" and position + 1 < len(streamlit_args):
+            port = streamlit_args[position + 1]
+    return int(port) + READY_PORT_OFFSET
+
+
+def serve_readiness(port, address=READY_ADDRESS):
+    """Démarre le serveur du signal de disponibilité dans un thread (OSError si le port est pris)."""
+    server = http.server.ThreadingHTTPServer((address, port), _ReadinessHandler)
+    threading.Thread(target=server.serve_forever, name="disponibilite", daemon=True).start()
+    return server
+
+
+def start(port=0):
+    """Lance le préchauffage une seule fois par processus, et le signal de disponibilité si `port`."""
+    global _warmup
+    with _lock:
+        if _warmup is None:
+            if port:
+                serve_readiness(port)
+            _warmup = Warmup()
+            threading.Thread(target=_warmup.run, name="prechauffage", daemon=True).start()
+        return _warmup
+
+
+def status():
+    """État du préchauffage : etat (en_attente, en_cours, pret, echec), durée des étapes, erreur, essais."""
+    if _warmup is None:
+        return {"etat": "en_attente", "debut": None, "etapes": {}, "erreur": None, "essais": 0, "prochain_essai": None}
+    return dict(_warmup.state)
+
+
+def check(port, timeout=2):
+    """Interroge le signal de disponibilité d'un serveur local ; vrai s'il est prêt."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["--verifier"]:
+        sys.exit(0 if check(ready_port(args[1:])) else 1)
+
+    # Module importé sous son nom : le script du tableau de bord retrouve le même préchauffage
+    from streamlit.web import cli
+
+    from accidents import startup
+
+    port = ready_port(args)
+    try:
+        startup.start(port)
+    except OSError as e:
+        sys.exit(f"Signal de disponibilité : port {port} indisponible ({e}) ; "
+                 "choisissez-en un autre avec DASHBOARD_READY_PORT")
+    cli.main(["run", APP_SCRIPT, *args], prog_name="streamlit")
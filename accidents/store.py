@@ -0,0 +1,86 @@
+"""Magasin de données préparées partagé entre processus.
+
+Les jeux de données préparés (vue usagers du tableau de bord, cubes de
+comptages, échantillons) sont enregistrés une fois par hôte en fichiers Arrow
+IPC non compressés dans data/cache/store/, puis relus en memory-map : les
+colonnes numériques sans valeur manquante deviennent des tableaux numpy qui
+pointent directement sur les pages du fichier. Ces pages sont celles du cache
+du système, partagées par tous les workers et réplicas de l'hôte : la mémoire
+ne croît plus avec le nombre de processus. Les DataFrames obtenus sont en
+lecture seule.
+
+Le premier processus qui a besoin d'un jeu de données le construit sous un
+verrou de fichier ; les autres attendent puis lisent le fichier. L'écriture
+est atomique (fichier temporaire puis `os.replace`).
+"""
+import contextlib
+import hashlib
+import os
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from accidents import ingestion
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou, un jeu de données peut être construit deux fois
+    fcntl = None
+
+# À incrémenter si le format des fichiers change
+STORE_VERSION = 1
+
+STORE_DIR = os.path.join(ingestion.CACHE_DIR, "store")
+
+
+def dataset_path(name, key):
+    """Chemin d'un jeu de données pour une clé (version des données, colonnes, filtres...)."""
+    digest = hashlib.sha256(f"{key!r}:{STORE_VERSION}".encode()).hexdigest()
+    return os.path.join(STORE_DIR, f"{name}-{digest[:16]}.arrow")
+
+
+@contextlib.contextmanager
+def build_lock(path):
+    """Verrou exclusif entre processus pour la construction d'un fichier."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def to_table(frame):
+    """Table Arrow d'un DataFrame ; les NaN des flottants restent des valeurs (lecture sans copie)."""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for position, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            table = table.set_column(position, field, pa.array(frame[field.name].to_numpy()))
+    return table
+
+
+def write(path, frame):
+    """Enregistre un DataFrame en Arrow IPC non compressé, de façon atomique."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    feather.write_feather(to_table(frame), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read(path):
+    """DataFrame en lecture seule adossé au fichier (memory-map, sans copie si possible)."""
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def shared(path, build):
+    """Jeu de données du fichier `path`, construit par `build()` une seule fois par hôte."""
+    if not os.path.exists(path):
+        with build_lock(path):
+            # Un autre processus a pu le construire pendant l'attente du verrou
+            if not os.path.exists(path):
+                write(path, build())
+    return read(path)
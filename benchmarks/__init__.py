@@ -0,0 +1 @@
+"""Générateur de données BAAC synthétiques et suite de benchmarks du pipeline."""
@@ -0,0 +1,244 @@
+"""Générateur de fichiers BAAC synthétiques, au format des fichiers publiés.
+
+Les quatre tables (caract, lieux, vehicules, usagers) respectent les colonnes,
+séparateurs (';', virgule décimale) et nomenclatures des fichiers ONISR. Les
+distributions reprennent les ordres de grandeur des données réelles : environ
+1,7 véhicule par accident, 1,4 usager par véhicule, répartition des accidents
+par département et gravité des usagers. Les fichiers sont écrits par blocs :
+la mémoire utilisée ne dépend pas de la taille demandée.
+
+    python -m benchmarks.generate 1000000 --annees 2022 2023 --dossier /tmp/baac/data
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Nombre d'accidents générés par bloc
+CHUNK_SIZE = 200_000
+
+# Département : (latitude, longitude, poids relatif dans le nombre d'accidents)
+DEPARTEMENTS = {
+    "01": (46.10, 5.35, 1.0), "02": (49.56, 3.56, 0.6), "03": (46.39, 3.19, 0.6), "04": (44.10, 6.24, 0.4),
+    "05": (44.66, 6.27, 0.4), "06": (43.94, 7.12, 3.2), "07": (44.75, 4.42, 0.5), "08": (49.62, 4.64, 0.3),
+    "09": (42.92, 1.50, 0.3), "10": (48.30, 4.16, 0.5), "11": (43.10, 2.41, 0.7), "12": (44.28, 2.68, 0.5),
+    "13": (43.54, 5.09, 6.0), "14": (49.10, -0.36, 1.0), "15": (45.05, 2.67, 0.2), "16": (45.72, 0.20, 0.5),
+    "17": (45.78, -0.67, 1.0), "18": (47.06, 2.49, 0.4), "19": (45.36, 1.88, 0.4), "21": (47.42, 4.77, 0.8),
+    "22": (48.44, -2.86, 0.8), "23": (46.09, 2.02, 0.2), "24": (45.10, 0.74, 0.6), "25": (47.17, 6.36, 0.8),
+    "26": (44.69, 5.17, 0.9), "27": (49.11, 0.99, 0.8), "28": (48.39, 1.37, 0.6), "29": (48.26, -4.06, 1.0),
+    "2A": (41.86, 8.98, 0.3), "2B": (42.39, 9.21, 0.3), "30": (43.99, 4.18, 1.2), "31": (43.36, 1.17, 2.8),
+    "32": (43.69, 0.45, 0.3), "33": (44.83, -0.58, 3.0), "34": (43.58, 3.37, 2.8), "35": (48.17, -1.64, 1.4),
+    "36": (46.78, 1.58, 0.3), "37": (47.26, 0.69, 0.9), "38": (45.26, 5.57, 2.0), "39": (46.73, 5.70, 0.4),
+    "40": (43.97, -0.78, 0.6), "41": (47.62, 1.43, 0.4), "42": (45.73, 4.17, 1.2), "43": (45.13, 3.81, 0.3),
+    "44": (47.35, -1.73, 2.2), "45": (47.91, 2.34, 1.0), "46": (44.62, 1.60, 0.2), "47": (44.37, 0.46, 0.5),
+    "48": (44.52, 3.50, 0.2), "49": (47.39, -0.56, 1.0), "50": (49.08, -1.33, 0.6), "51": (48.95, 4.24, 0.7),
+    "52": (48.11, 5.23, 0.2), "53": (48.15, -0.66, 0.4), "54": (48.79, 6.16, 0.9), "55": (48.99, 5.38, 0.2),
+    "56": (47.85, -2.81, 0.8), "57": (49.04, 6.66, 1.2), "58": (47.12, 3.50, 0.3), "59": (50.45, 3.22, 3.5),
+    "60": (49.41, 2.42, 1.0), "61": (48.58, 0.13, 0.3), "62": (50.49, 2.29, 1.6), "63": (45.72, 3.14, 1.0),
+    "64": (43.26, -0.76, 1.0), "65": (43.05, 0.16, 0.3), "66": (42.60, 2.52, 0.8), "67": (48.67, 7.55, 1.6),
+    "68": (47.86, 7.27, 1.0), "69": (45.87, 4.64, 4.0), "70": (47.64, 6.09, 0.3), "71": (46.64, 4.54, 0.7),
+    "72": (47.99, 0.22, 0.7), "73": (45.48, 6.44, 0.8), "74": (46.03, 6.43, 1.3), "75": (48.86, 2.35, 8.0),
+    "76": (49.66, 1.03, 1.6), "77": (48.62, 2.93, 2.5), "78": (48.82, 1.84, 2.2), "79": (46.56, -0.32, 0.4),
+    "80": (49.96, 2.28, 0.6), "81": (43.79, 2.16, 0.5), "82": (44.09, 1.28, 0.4), "83": (43.46, 6.22, 2.4),
+    "84": (43.99, 5.18, 1.0), "85": (46.67, -1.30, 0.9), "86": (46.56, 0.46, 0.5), "87": (45.89, 1.24, 0.5),
+    "88": (48.20, 6.38, 0.4), "89": (47.84, 3.56, 0.5), "90": (47.63, 6.93, 0.2), "91": (48.52, 2.24, 2.2),
+    "92": (48.84, 2.25, 3.5), "93": (48.92, 2.48, 3.5), "94": (48.78, 2.47, 3.0), "95": (49.08, 2.13, 2.0),
+    "971": (16.19, -61.55, 0.5), "972": (14.65, -61.02, 0.5), "974": (-21.13, 55.53, 0.8),
+}
+
+# Loi du nombre de véhicules par accident (1, 2, 3, 4, 5) et d'usagers par véhicule
+VEHICULES_PAR_ACCIDENT = [0.30, 0.58, 0.08, 0.03, 0.01]
+USAGERS_PAR_VEHICULE = [0.72, 0.19, 0.06, 0.02, 0.01]
+
+# Lois des codes (nomenclature de accidents/descriptions.py)
+LOIS = {
+    "lum": ([1, 2, 3, 4, 5], [0.66, 0.06, 0.07, 0.01, 0.20]),
+    "agg": ([1, 2], [0.35, 0.65]),
+    "int": ([1, 2, 3, 4, 5, 6, 7], [0.66, 0.12, 0.12, 0.01, 0.05, 0.01, 0.03]),
+    "atm": ([1, 2, 3, 4, 5, 6, 7, 8, 9], [0.80, 0.09, 0.02, 0.005, 0.005, 0.01, 0.01, 0.05, 0.01]),
+    "col": ([1, 2, 3, 4, 5, 6], [0.08, 0.16, 0.30, 0.05, 0.03, 0.38]),
+    "catr": ([1, 2, 3, 4, 5, 6, 7], [0.10, 0.04, 0.33, 0.45, 0.02, 0.02, 0.04]),
+    "circ": ([1, 2, 3], [0.20, 0.70, 0.10]),
+    "prof": ([1, 2, 3, 4], [0.85, 0.11, 0.02, 0.02]),
+    "plan": ([1, 2, 3, 4], [0.80, 0.08, 0.09, 0.03]),
+    "surf": ([1, 2, 3, 4, 5, 6, 7, 8, 9], [0.81, 0.15, 0.003, 0.007, 0.002, 0.004, 0.002, 0.002, 0.02]),
+    "infra": ([0, 1, 2, 3, 4, 5, 6, 7], [0.80, 0.01, 0.01, 0.03, 0.005, 0.12, 0.02, 0.005]),
+    "situ": ([1, 2, 3, 4, 5], [0.88, 0.01, 0.06, 0.03, 0.02]),
+    "catv": ([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15],
+             [0.08, 0.05, 0.03, 0.10, 0.58, 0.005, 0.07, 0.005, 0.01, 0.02, 0.02, 0.003, 0.002, 0.01, 0.025]),
+    "choc": ([1, 2, 3, 4, 5, 6], [0.45, 0.12, 0.13, 0.18, 0.05, 0.07]),
+    "catu": ([1, 2, 3], [0.70, 0.22, 0.08]),
+    "grav": ([-1, 1, 2, 3, 4], [0.002, 0.42, 0.39, 0.165, 0.023]),
+    "sexe": ([1, 2], [0.68, 0.32]),
+    "trajet": ([1, 2, 3, 4, 5], [0.15, 0.02, 0.05, 0.40, 0.38]),
+}
+
+ADRESSES = ["RUE DE LA REPUBLIQUE", "Avenue Jean Jaurès", "BD GAMBETTA", "route de Paris", "AUTOROUTE A6",
+            "Rue Victor Hugo", "CHEMIN DES VIGNES", "av. du Général de Gaulle", "RN 7", "Place de la Gare"]
+
+# Heures au format HH:MM, une par minute de la journée
+_HRMN = np.array([f"{h:02d}:{m:02d}" for h in range(24) for m in range(60)], dtype=object)
+
+# Poids horaires (creux la nuit, pics du matin et de fin d'après-midi)
+_POIDS_HEURE = np.array([1.5, 1.0, 0.8, 0.6, 0.6, 1.0, 2.0, 4.0, 6.0, 5.0, 4.5, 5.0,
+                         5.5, 5.0, 5.0, 6.0, 7.0, 8.0, 8.0, 6.5, 4.5, 3.5, 2.8, 2.0])
+
+# Lettre du véhicule dans l'accident (A01, B01, ...)
+_NUM_VEH = np.array([f"{chr(65 + i)}01" for i in range(26)], dtype=object)
+
+
+def _draw(rng, column, size):
+    values, weights = LOIS[column]
+    weights = np.asarray(weights, dtype=float)
+    return rng.choice(np.asarray(values, dtype=np.int8), size, p=weights / weights.sum())
+
+
+def _counts(rng, weights, size):
+    weights = np.asarray(weights, dtype=float)
+    return rng.choice(np.arange(1, len(weights) + 1), size, p=weights / weights.sum())
+
+
+def _rank_within(counts):
+    """Position (0, 1, ...) de chaque ligne au sein de son groupe, pour des groupes de tailles `counts`."""
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(counts.sum()) - starts
+
+
+def generate_chunk(rng, year, first_id, size, first_vehicle, first_user):
+    """Un bloc de `size` accidents : dictionnaire {table: DataFrame}."""
+    deps = np.array(list(DEPARTEMENTS), dtype=object)
+    coords = np.array([value[:2] for value in DEPARTEMENTS.values()])
+    weights = np.array([value[2] for value in DEPARTEMENTS.values()])
+    dep_idx = rng.choice(len(deps), size, p=weights / weights.sum())
+    num_acc = np.int64(year) * 100_000_000 + first_id + np.arange(size, dtype=np.int64)
+
+    # Date et heure : jour tiré dans le mois, heure selon la courbe journalière
+    mois = rng.integers(1, 13, size).astype(np.int8)
+    longueur_mois = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    jour = (rng.random(size) * longueur_mois[mois]).astype(np.int8) + 1
+    heure = rng.choice(24, size, p=_POIDS_HEURE / _POIDS_HEURE.sum())
+    minute = rng.integers(0, 60, size)
+
+    # Coordonnées dispersées autour du centre du département, ~1 % non renseignées
+    lat = coords[dep_idx, 0] + rng.normal(0, 0.12, size)
+    lon = coords[dep_idx, 1] + rng.normal(0, 0.16, size)
+    lat[rng.random(size) < 0.01] = np.nan
+
+    caract = pd.DataFrame({
+        "Num_Acc": num_acc,
+        "jour": jour,
+        "mois": mois,
+        "an": year,
+        "hrmn": _HRMN[heure * 60 + minute],
+        "lum": _draw(rng, "lum", size),
+        "dep": deps[dep_idx],
+        "com": deps[dep_idx] + pd.Series(rng.integers(1, 400, size)).map("{:03d}".format).to_numpy(object),
+        "agg": _draw(rng, "agg", size),
+        "int": _draw(rng, "int", size),
+        "atm": _draw(rng, "atm", size),
+        "col": _draw(rng, "col", size),
+        "adr": rng.choice(np.array(ADRESSES, dtype=object), size),
+        "lat": lat.round(6),
+        "long": lon.round(6),
+    })
+
+    lieux = pd.DataFrame({
+        "Num_Acc": num_acc,
+        "catr": _draw(rng, "catr", size),
+        "voie": rng.integers(1, 1000, size).astype(str),
+        "v1": "",
+        "v2": "",
+        "circ": _draw(rng, "circ", size),
+        "nbv": rng.choice([1, 2, 3, 4], size, p=[0.15, 0.60, 0.10, 0.15]),
+        "vosp": rng.choice([0, 1, 2, 3], size, p=[0.90, 0.03, 0.04, 0.03]),
+        "prof": _draw(rng, "prof", size),
+        "pr": "(1)",
+        "pr1": "(0)",
+        "plan": _draw(rng, "plan", size),
+        "lartpc": "",
+        "larrout": rng.choice([6.0, 7.0, 10.5, 14.0], size),
+        "surf": _draw(rng, "surf", size),
+        "infra": _draw(rng, "infra", size),
+        "situ": _draw(rng, "situ", size),
+        "vma": rng.choice([30, 50, 70, 80, 90, 110, 130], size, p=[0.12, 0.45, 0.08, 0.20, 0.05, 0.04, 0.06]),
+    })
+
+    # Véhicules : 1 à 5 par accident
+    nb_vehicules = _counts(rng, VEHICULES_PAR_ACCIDENT, size)
+    n_veh = int(nb_vehicules.sum())
+    vehicle_ids = (first_vehicle + np.arange(n_veh)).astype(str).astype(object)
+    vehicules = pd.DataFrame({
+        "Num_Acc": np.repeat(num_acc, nb_vehicules),
+        "id_vehicule": vehicle_ids,
+        "num_veh": _NUM_VEH[_rank_within(nb_vehicules)],
+        "senc": rng.choice([-1, 1, 2, 3], n_veh, p=[0.01, 0.55, 0.40, 0.04]),
+        "catv": _draw(rng, "catv", n_veh),
+        "obs": rng.choice([0, 1, 2, 4, 6], n_veh, p=[0.90, 0.03, 0.02, 0.02, 0.03]),
+        "obsm": rng.choice([0, 1, 2, 9], n_veh, p=[0.15, 0.08, 0.72, 0.05]),
+        "choc": _draw(rng, "choc", n_veh),
+        "manv": rng.integers(1, 27, n_veh),
+        "motor": rng.choice([-1, 0, 1, 2, 3], n_veh, p=[0.02, 0.08, 0.82, 0.04, 0.04]),
+        "occutc": "",
+    })
+
+    # Usagers : 1 à 5 par véhicule, le premier étant le conducteur
+    nb_usagers = _counts(rng, USAGERS_PAR_VEHICULE, n_veh)
+    n_usr = int(nb_usagers.sum())
+    rang = _rank_within(nb_usagers)
+    catu = np.where(rang == 0, 1, _draw(rng, "catu", n_usr)).astype(np.int8)
+    usagers = pd.DataFrame({
+        "Num_Acc": np.repeat(vehicules["Num_Acc"].to_numpy(), nb_usagers),
+        "id_usager": (first_user + np.arange(n_usr)).astype(str).astype(object),
+        "id_vehicule": np.repeat(vehicle_ids, nb_usagers),
+        "num_veh": np.repeat(vehicules["num_veh"].to_numpy(), nb_usagers),
+        "place": np.where(catu == 1, 1, rng.integers(2, 10, n_usr)),
+        "catu": catu,
+        "grav": _draw(rng, "grav", n_usr),
+        "sexe": _draw(rng, "sexe", n_usr),
+        "an_nais": year - np.clip(rng.normal(40, 17, n_usr), 1, 95).astype(np.int16),
+        "trajet": _draw(rng, "trajet", n_usr),
+        "secu1": rng.choice([0, 1, 2, 8], n_usr, p=[0.05, 0.75, 0.15, 0.05]),
+        "secu2": rng.choice([-1, 0, 8], n_usr, p=[0.60, 0.30, 0.10]),
+        "secu3": -1,
+        "locp": np.where(catu == 3, rng.integers(1, 10, n_usr), -1),
+        "actp": np.where(catu == 3, rng.choice(np.array(["1", "3", "A", "B"], dtype=object), n_usr), "-1"),
+        "etatp": np.where(catu == 3, rng.integers(1, 4, n_usr), -1),
+    })
+    return {"caract": caract, "lieux": lieux, "vehicules": vehicules, "usagers": usagers}
+
+
+def generate_year(n_accidents, year, directory, seed=0, chunk_size=CHUNK_SIZE):
+    """Écrit `directory/<année>/<table>.csv` pour `n_accidents` accidents."""
+    rng = np.random.default_rng([seed, year])
+    target = os.path.join(directory, str(year))
+    os.makedirs(target, exist_ok=True)
+    paths = {table: os.path.join(target, f"{table}.csv") for table in ["caract", "lieux", "vehicules", "usagers"]}
+    first_vehicle = first_user = 0
+    for start in range(0, n_accidents, chunk_size):
+        size = min(chunk_size, n_accidents - start)
+        tables = generate_chunk(rng, year, start + 1, size, first_vehicle, first_user)
+        first_vehicle += len(tables["vehicules"])
+        first_user += len(tables["usagers"])
+        for table, df in tables.items():
+            df.to_csv(paths[table], sep=";", decimal=",", index=False,
+                      mode="w" if start == 0 else "a", header=start == 0)
+    return paths
+
+
+def generate(n_accidents, years, directory, seed=0):
+    """Répartit `n_accidents` sur les années demandées : {année: {table: chemin}}."""
+    per_year = np.full(len(years), n_accidents // len(years))
+    per_year[: n_accidents % len(years)] += 1
+    return {year: generate_year(int(n), year, directory, seed) for year, n in zip(years, per_year)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des fichiers BAAC synthétiques.")
+    parser.add_argument("accidents", type=int, help="nombre total d'accidents")
+    parser.add_argument("--annees", type=int, nargs="+", default=[2023])
+    parser.add_argument("--dossier", default="data")
+    parser.add_argument("--graine", type=int, default=0)
+    args = parser.parse_args()
+    for year, paths in generate(args.accidents, args.annees, args.dossier, args.graine).items():
+        print(year, ", ".join(paths.values()))
@@ -0,0 +1,321 @@
+"""Test de charge du tableau de bord : sessions simultanées simulées, en local.
+
+Chaque session est une `AppTest` (tests sans navigateur de Streamlit) exécutée
+dans un thread du processus, comme les sessions d'un serveur Streamlit : les
+caches (st.cache_resource, st.cache_data) et le magasin partagé sont communs
+à toutes les sessions. Une session ouvre le tableau de bord, puis enchaîne
+des interactions tirées au hasard parmi `INTERACTIONS` (fichier des
+variables, département d'Île-de-France, zone de la carte, filtres de la barre
+latérale, recherche par adresse...), avec un temps de réflexion éventuel.
+
+Pour chaque nombre de sessions demandé, le rapport donne :
+
+- la latence des réexécutions (p50, p90, p95, p99), globale et par interaction ;
+- le débit (réexécutions par seconde) ;
+- la courbe mémoire du processus (RSS échantillonnée) et sa croissance par session ;
+- les calculs des fonctions en cache pendant le palier (accidents/instrumentation.py).
+
+AppTest réexécute le script entier à chaque interaction, y compris pour un
+widget d'un fragment, et ne mesure ni le réseau ni le rendu dans le
+navigateur : les latences sont des majorants du coût serveur d'une
+interaction. Les données synthétiques sont celles de la suite de benchmarks
+(benchmarks/run.py) ; les résultats sont enregistrés dans
+benchmarks/results/charge-<commit>.json.
+
+    python -m benchmarks.load --sessions 1 4 16 --interactions 20
+    python -m benchmarks.load --sessions 8 --pause 2 --taille 1000000
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from accidents import bitmaps, figures, ingestion, instrumentation, schema
+from accidents.descriptions import DESCRIPTIONS
+from benchmarks import run
+
+APP_SCRIPT = os.path.join(os.path.dirname(run.BENCH_DIR), "streamlit_app.py")
+
+# Percentiles de latence rapportés
+PERCENTILES = [50, 90, 95, 99]
+
+# Recherches par adresse simulées (adresses des données synthétiques, cf. benchmarks/generate.py)
+ADDRESS_QUERIES = ["rue de la rep", "avenue jean jaures", "bd gambetta", "RN 7", "a6", "place de la g", "victor hugo"]
+
+
+def _zones(options):
+    """Zones de la carte : la France et les départements affichés (« Département 75 »)."""
+    return ["France"] + [option.rsplit(" ", 1)[-1] for option in options]
+
+
+# Interactions scriptées : {nom: (type de widget, début du libellé, valeurs candidates selon les options
+# affichées)}. Seules les valeurs candidates dont le libellé figure parmi les options sont choisies.
+INTERACTIONS = {
+    "fichier_variables": ("selectbox", "Choisissez un fichier", lambda options: list(DESCRIPTIONS)),
+    "departement_idf": ("selectbox", "Choisissez un département", lambda options: list(figures.IDF_DEPARTMENTS)),
+    "zone_carte": ("selectbox", "Zone affichée", _zones),
+    "niveau_choroplethe": ("radio", "Niveau", lambda options: ["dep", "com"]),
+    "rayon_hotspots": ("select_slider", "Rayon de voisinage", lambda options: [100, 200, 300, 500, 1000]),
+    "recherche_adresse": ("text_input", "Adresse", lambda options: ADDRESS_QUERIES),
+}
+
+# Filtres de la barre latérale, y compris ceux ajoutés plus tard à bitmaps.FILTER_DIMENSIONS
+for _column, _label in bitmaps.FILTER_DIMENSIONS.items():
+    INTERACTIONS[f"filtre_{_column}"] = (
+        "multiselect", _label, lambda options, column=_column: list(schema.LABELS.get(column, {})) + options)
+
+
+def _rss_mb():
+    """Mémoire résidente actuelle du processus (Mo), ou son pic hors Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemorySampler:
+    """Échantillonne la mémoire résidente du processus dans un thread : [(secondes, Mo)]."""
+
+    def __init__(self, period):
+        self.period = period
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memoire", daemon=True)
+
+    def _sample(self):
+        self.samples.append((round(time.perf_counter() - self._start, 2), round(_rss_mb(), 1)))
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self._sample()
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def _label(widget, value):
+    try:
+        return str(widget.format_func(value))
+    except Exception:
+        # Valeur candidate étrangère au widget
+        return None
+
+
+def interact(at, name, rng):
+    """Applique une interaction à une session ; faux si son widget n'est pas affiché."""
+    kind, label, candidates = INTERACTIONS[name]
+    widgets = [widget for widget in getattr(at, kind) if widget.label.startswith(label)]
+    if not widgets:
+        return False
+    widget = widgets[0]
+    if kind == "text_input":
+        widget.set_value(rng.choice(candidates(None)))
+        return True
+
+    # Valeurs des options affichées, retrouvées par leur libellé
+    choices = {}
+    for value in candidates(widget.options):
+        choices.setdefault(_label(widget, value), value)
+    values = [choices[option] for option in widget.options if option in choices]
+    if not values:
+        return False
+    if kind == "multiselect":
+        # Zéro, une ou deux valeurs : les filtres ne s'accumulent pas jusqu'à tout exclure
+        widget.set_value(rng.sample(values, min(len(values), rng.choice([0, 1, 2]))))
+    else:
+        widget.set_value(rng.choice(values))
+    return True
+
+
+def timed_run(at, session, name, records, origin):
+    """Réexécute le script d'une session et enregistre sa durée."""
+    start = time.perf_counter()
+    error = None
+    try:
+        at.run()
+        if at.exception:
+            error = at.exception[0].message
+    except Exception as e:
+        # Délai dépassé ou erreur du moteur de test
+        error = f"{type(e).__name__}: {e}"
+    records.append({
+        "session": session,
+        "interaction": name,
+        "debut_s": round(start - origin, 3),
+        "duree_s": time.perf_counter() - start,
+        "erreur": error,
+    })
+    return error is None
+
+
+def simulate(session, interactions, pause, seed, timeout, go, records, origin):
+    """Une session : ouverture du tableau de bord, puis `interactions` interactions au hasard."""
+    rng = random.Random(seed * 100_003 + session)
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    go.wait()
+    if not timed_run(at, session, "ouverture", records, origin[0]):
+        return
+    for _ in range(interactions):
+        if pause:
+            # Temps de réflexion de l'utilisateur
+            time.sleep(rng.expovariate(1 / pause))
+        name = rng.choice(list(INTERACTIONS))
+        if interact(at, name, rng) and not timed_run(at, session, name, records, origin[0]):
+            return
+
+
+def _calculs():
+    return {row["fonction"]: row["calculs"] for row in instrumentation.cache_summary(process_wide=True)}
+
+
+def _percentiles(durations):
+    return {f"p{p}": round(float(np.percentile(durations, p)) * 1000, 1) for p in PERCENTILES}
+
+
+def run_level(sessions, interactions, pause, seed, timeout, period):
+    """Palier de charge : `sessions` sessions simultanées ; mesures agrégées."""
+    records = []
+    go = threading.Event()
+    origin = [0.0]
+    before = _calculs()
+    threads = [threading.Thread(target=simulate, name=f"session-{number}",
+                                args=(number, interactions, pause, seed, timeout, go, records, origin))
+               for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    with MemorySampler(period) as memory:
+        origin[0] = time.perf_counter()
+        go.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - origin[0]
+
+    after = _calculs()
+    durations = np.array([record["duree_s"] for record in records])
+    by_interaction = {}
+    for name in dict.fromkeys(record["interaction"] for record in records):
+        selected = np.array([record["duree_s"] for record in records if record["interaction"] == name])
+        by_interaction[name] = {"reexecutions": len(selected), **_percentiles(selected)}
+    rss = [value for _, value in memory.samples]
+    return {
+        "sessions": sessions,
+        "reexecutions": len(records),
+        "duree_s": round(elapsed, 2),
+        "debit_par_s": round(len(records) / elapsed, 2),
+        "latence_ms": _percentiles(durations) if len(durations) else {},
+        "erreurs": [record for record in records if record["erreur"]],
+        "memoire_mo": {
+            "debut": rss[0],
+            "pic": max(rss),
+            "fin": rss[-1],
+            "croissance_par_session": round((rss[-1] - rss[0]) / sessions, 1),
+        },
+        "par_interaction": by_interaction,
+        "calculs_en_cache": {name: count - before.get(name, 0) for name, count in after.items()
+                             if count > before.get(name, 0)},
+        "courbe_memoire": memory.samples,
+    }
+
+
+def warm_up(seed, timeout):
+    """Session préalable non mesurée : ouverture puis chaque interaction une fois (caches chauds)."""
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    at.run()
+    for name in INTERACTIONS:
+        if interact(at, name, rng):
+            at.run()
+    return [exception.message for exception in at.exception]
+
+
+def print_level(level):
+    latency = level["latence_ms"]
+    memory = level["memoire_mo"]
+    print(f"  {level['sessions']:>8} {level['reexecutions']:>8} {level['debit_par_s']:>8.2f}"
+          + "".join(f" {latency.get(f'p{p}', float('nan')):>8.0f}" for p in PERCENTILES)
+          + f" {len(level['erreurs']):>7} {memory['debut']:>7.0f} {memory['pic']:>7.0f} {memory['fin']:>7.0f}",
+          flush=True)
+
+
+def save_report(revision, key, levels):
+    """Enregistre les paliers dans benchmarks/results/charge-<commit>.json."""
+    os.makedirs(run.RESULTS_DIR, exist_ok=True)
+    path = os.path.join(run.RESULTS_DIR, f"charge-{revision}.json")
+    report = {
+        "commit": revision,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": sys.version.split()[0], "plateforme": platform.platform(),
+                    "processeurs": os.cpu_count()},
+        "donnees": key,
+        "paliers": levels,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge du tableau de bord (sessions simulées).")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8],
+                        help="nombres de sessions simultanées, un palier chacun")
+    parser.add_argument("--interactions", type=int, default=10, help="interactions par session")
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="temps de réflexion moyen entre deux interactions (s)")
+    parser.add_argument("--taille", type=int, default=100_000, help="nombre d'accidents synthétiques")
+    parser.add_argument("--annees", type=int, nargs="+", default=[2023])
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--delai", type=float, default=300, help="délai maximal d'une réexécution (s)")
+    parser.add_argument("--periode", type=float, default=0.25, help="période d'échantillonnage de la mémoire (s)")
+    args = parser.parse_args()
+
+    # Pas de journal de Streamlit pendant le test
+    logging.disable(logging.WARNING)
+
+    revision = run.git_revision()
+    root = run.prepare_data(args.taille, args.annees, args.graine)
+    # Le tableau de bord utilise des chemins relatifs à la racine du projet (data/, data/cache/)
+    os.chdir(root)
+    ingestion.ingest_partitions(ingestion.discover_partitions())
+
+    start = time.perf_counter()
+    errors = warm_up(args.graine, args.delai)
+    print(f"Préchauffage : {time.perf_counter() - start:.1f} s" + (f", erreurs : {errors}" if errors else ""))
+
+    print(f"{'sessions':>10} {'réexéc.':>8} {'débit/s':>8}" + "".join(f" {f'p{p} ms':>8}" for p in PERCENTILES)
+          + f" {'erreurs':>7} {'RSS déb':>7} {'pic':>7} {'fin':>7}")
+    levels = []
+    for sessions in sorted(args.sessions):
+        levels.append(run_level(sessions, args.interactions, args.pause, args.graine, args.delai, args.periode))
+        print_level(levels[-1])
+
+    heaviest = levels[-1]
+    print(f"\nLatence par interaction ({heaviest['sessions']} sessions) :")
+    for name, stats in sorted(heaviest["par_interaction"].items(), key=lambda item: -item[1]["p95"]):
+        print(f"  {name:<24} {stats['reexecutions']:>5} réexéc.  p50 {stats['p50']:>7.0f} ms  p95 {stats['p95']:>7.0f} ms")
+    for level in levels:
+        if level["calculs_en_cache"]:
+            print(f"Calculs en cache ({level['sessions']} sessions) : {level['calculs_en_cache']}")
+        for error in level["erreurs"][:3]:
+            print(f"Erreur ({level['sessions']} sessions, {error['interaction']}) : {error['erreur']}")
+
+    key = f"{args.taille}-{'-'.join(map(str, args.annees))}"
+    print(f"Résultats : {save_report(revision, key, levels)}")
@@ -0,0 +1,264 @@
+"""Suite de benchmarks du pipeline de données du tableau de bord.
+
+Pour chaque taille demandée, des fichiers BAAC synthétiques sont générés
+(une fois, dans benchmarks/data/), puis chaque étape est chronométrée :
+lecture CSV, dérivation des variables temporelles, ingestion Arrow,
+chargement, diff incrémental par accident, requête et jointures, filtrage,
+mode approché (échantillons et intervalles de confiance), construction du
+cube, chaque agrégation des graphiques, construction des figures, des cartes
+et des hotspots, index de recherche par adresse, export des données
+filtrées, modèle de gravité.
+
+Les résultats sont enregistrés dans benchmarks/results/<commit>.json afin de
+comparer les commits entre eux :
+
+    python -m benchmarks.run --tailles 100000 1000000 --annees 2022 2023
+    python -m benchmarks.run --comparer 3c2977a 719d159
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from accidents import (artifacts, bitmaps, cube, export, features, figures, hotspots, ingestion, lod, maps, model,
+                       query, refresh, sampling, schema, search, spatial)
+from benchmarks import generate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_ROOT = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+# Mêmes colonnes et filtres que le tableau de bord (accidents/figures.py)
+COLONNES_TABLEAU = figures.COLONNES_TABLEAU
+FILTRES_MOTORISES = figures.FILTRES_MOTORISES
+IDF = figures.FILTRE_IDF
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Bench:
+    """Chronomètre une suite d'étapes et garde leurs résultats."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, func, repeat=None):
+        durations = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            value = func()
+            durations.append(time.perf_counter() - start)
+        self.results[name] = {
+            "median_s": round(statistics.median(durations), 4),
+            "min_s": round(min(durations), 4),
+            "repetitions": len(durations),
+            "lignes": len(value) if hasattr(value, "__len__") else None,
+            "rss_max_mo": round(_max_rss_mb(), 1),
+        }
+        print(f"  {name:<32} {self.results[name]['median_s']:>9.3f} s", flush=True)
+        return value
+
+
+def prepare_data(size, years, seed=0):
+    """Dossier de travail de la taille demandée, avec ses fichiers générés."""
+    root = os.path.join(DATA_ROOT, f"{size}-{'-'.join(map(str, years))}-{seed}")
+    if not os.path.exists(os.path.join(root, "ok")):
+        print(f"Génération de {size} accidents ({', '.join(map(str, years))})...", flush=True)
+        shutil.rmtree(root, ignore_errors=True)
+        generate.generate(size, years, os.path.join(root, ingestion.DATA_DIR), seed)
+        open(os.path.join(root, "ok"), "w").close()
+    return root
+
+
+def run_suite(repeat):
+    """Exécute toutes les étapes sur les données du dossier courant."""
+    bench = Bench(repeat)
+    partitions = ingestion.discover_partitions()
+    files = [path for tables in partitions.values() for path in tables.values()]
+
+    # Lecture et typage des CSV, variables temporelles comprises
+    frames = bench.measure("lecture_csv", lambda: [ingestion.read_source(path) for path in files], repeat=1)
+    caract = pd.concat([df for path, df in zip(files, frames) if schema.table_name(path) == "caract"])
+    frames = None
+    bench.measure("variables_temporelles", lambda: features.add_time_features(caract))
+    caract = None
+
+    # Conversion Arrow à froid (pool de processus), puis relecture memory-map
+    shutil.rmtree(ingestion.CACHE_DIR, ignore_errors=True)
+    bench.measure("ingestion_arrow", lambda: ingestion.ingest_partitions(partitions), repeat=1)
+    bench.measure("chargement_arrow", lambda: [ingestion.load_table(path) for path in files])
+
+    # Rafraîchissement incrémental : empreintes par accident et diff de deux versions d'une année
+    year_tables = {table: feather.read_table(ingestion.ensure_cached(path), memory_map=True)
+                   for table, path in next(iter(partitions.values())).items()}
+    bench.measure("diff_accidents", lambda: refresh.diff_accidents(year_tables, year_tables))
+
+    # Requête du tableau de bord : filtres poussés à la lecture, puis jointures
+    star = bench.measure("requete_jointures",
+                         lambda: query.run_partitioned_query(partitions, COLONNES_TABLEAU, FILTRES_MOTORISES))
+    accidents = bench.measure("vue_usagers", lambda: star.user_view(COLONNES_TABLEAU))
+    bench.measure("filtrage_idf", lambda: accidents[accidents['dep'].isin(IDF['dep'])])
+    index = bench.measure("index_bitmap", lambda: bitmaps.BitmapIndex(accidents), repeat=1)
+    croises = {'dep': IDF['dep'], 'grav': [3, 4], 'plage_horaire': ["Soir (18h-6h)"]}
+    bench.measure("filtres_croises_bitmap", lambda: index.mask(croises))
+    bench.measure("figures_filtrees", lambda: figures.build_all(figures.filtered_cubes(accidents[index.mask(croises)])))
+
+    # Mode approché : échantillons stratifiés, figures estimées et intervalles de confiance
+    samples = bench.measure("echantillons_stratifies", lambda: sampling.stratified_samples(accidents), repeat=1)
+    sample = samples[min(samples)]
+    sample['grav_desc'] = schema.label_series(sample['grav'], 'grav')
+    strates = sampling.strata_sizes(sample)
+    bench.measure("figures_estimees", lambda: figures.build_all(sample))
+    bench.measure("intervalles_confiance",
+                  lambda: [sampling.estimate_figure(name, sample, strates) for name in sampling.ESTIMATES])
+
+    # Cube de comptages et agrégations des graphiques
+    frame = bench.measure("requete_cube",
+                          lambda: query.run_partitioned_query(partitions, cube.COLUMNS, FILTRES_MOTORISES)
+                          .user_view(cube.COLUMNS))
+    cubes = bench.measure("construction_cubes", lambda: cube.build_cubes(frame))
+    frame = None
+    for cube_groupe in cubes.values():
+        cube_groupe['grav_desc'] = schema.label_series(cube_groupe['grav'], 'grav')
+    temps, heure = cubes["temps"], cubes["heure"]
+    bench.measure("agregation_gravite", lambda: cube.rollup(temps, ['grav_desc']))
+    bench.measure("agregation_plage_horaire",
+                  lambda: cube.crosstab(heure, 'plage_horaire', 'grav_desc', where=IDF, normalize=True))
+    bench.measure("agregation_departement",
+                  lambda: cube.crosstab(cubes["departement"], 'dep', 'grav_desc', where=IDF, normalize=True))
+    bench.measure("agregation_jour_semaine",
+                  lambda: cube.crosstab(cubes["jour_semaine"], 'jour_semaine', 'grav_desc', where=IDF))
+    bench.measure("agregation_serie_temporelle", lambda: cube.rollup(temps, ['an', 'mois', 'jour']))
+    bench.measure("agregation_heure", lambda: cube.rollup(heure, ['heure'], where=IDF))
+    bench.measure("agregation_mensuelle", lambda: cube.rollup(temps, ['mois', 'grav_desc']))
+    bench.measure("agregation_annees", lambda: cube.rollup(temps, ['an', 'grav_desc']))
+    built = bench.measure("construction_figures", lambda: figures.build_all(cubes))
+    bench.measure("serialisation_figures", lambda: [artifacts.serialize(figure) for figure in built.values()])
+
+    # Cartes : pyramide de grilles, couches affichées, index spatial, carte folium
+    lat, lon, grav = accidents['lat'], accidents['long'], accidents['grav']
+    pyramid = bench.measure("pyramide_lod", lambda: lod.build_pyramid(lat, lon, grav))
+    bench.measure("couche_lod_france", lambda: lod.select_layer(lat, lon, pyramid, lod.FRANCE_BBOX))
+    paris = (48.81, 48.91, 2.22, 2.47)
+    bench.measure("couche_lod_paris", lambda: lod.select_layer(lat, lon, pyramid, paris))
+    spatial_index = bench.measure("index_spatial", lambda: spatial.SpatialIndex(lat, lon))
+    bench.measure("recherche_rayon", lambda: spatial_index.within_distance(48.853, 2.35, 2000))
+    dep_75 = accidents[accidents['dep'] == "75"]
+    bench.measure("carte_departement",
+                  lambda: maps.department_map(dep_75['lat'], dep_75['long'], dep_75['grav']).get_root().render())
+    bench.measure("hotspots", lambda: hotspots.detect(lat, lon, grav))
+
+    # Recherche par adresse : index inversé normalisé, recherche et classement des rues
+    adresses = bench.measure("table_recherche", lambda: search.build_accidents(partitions), repeat=1)
+    postings = bench.measure("index_recherche", lambda: search.build_postings(adresses), repeat=1)
+    address_index = search.AddressIndex(adresses, postings)
+    trouves = bench.measure("recherche_adresse", lambda: address_index.search("rue de la rep"))
+    bench.measure("classement_rues", lambda: address_index.street_ranking(trouves, by="graves"))
+
+    # Export des usagers filtrés, par lots, année par année
+    schema_export = export.export_schema(partitions, COLONNES_TABLEAU)
+    bench.measure("export_parquet", lambda: export.write_export(
+        export.filtered_batches(partitions, "usagers", COLONNES_TABLEAU, FILTRES_MOTORISES, croises, schema_export),
+        schema_export, os.path.join(export.EXPORTS_DIR, "benchmark.parquet"), "parquet"))
+
+    # Modèle de gravité : entraînement multi-thread et scoring par lots
+    frame = bench.measure("requete_modele", lambda: model.load_training_frame(partitions), repeat=1)
+    artifact = bench.measure("entrainement_modele", lambda: model.train(frame), repeat=1)
+    bench.measure("scoring_risque", lambda: model.risk_by(artifact, frame, ['dep', 'heure']))
+    frame = None
+
+    bench.results["_volumes"] = {
+        "usagers_filtres": len(accidents),
+        "cellules_cubes": {groupe: len(cube_groupe) for groupe, cube_groupe in cubes.items()},
+        "usagers_paris": len(dep_75),
+    }
+    return bench.results
+
+
+def git_revision():
+    """Commit courant (suffixé de « -dirty » si l'arbre de travail est modifié)."""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip()
+    revision = git("rev-parse", "--short", "HEAD") or "inconnu"
+    dirty = git("status", "--porcelain", "--untracked-files=no")
+    return f"{revision}-dirty" if dirty else revision
+
+
+def save_results(revision, key, results):
+    """Ajoute les mesures d'une configuration au fichier de résultats du commit."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{revision}.json")
+    report = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            report = json.load(f)
+    report.update({
+        "commit": revision,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": sys.version.split()[0], "plateforme": platform.platform(),
+                    "processeurs": os.cpu_count()},
+        "versions": {"pandas": pd.__version__, "numpy": np.__version__},
+    })
+    report.setdefault("mesures", {})[key] = results
+    with open(path, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def compare(old, new):
+    """Affiche le rapport des durées médianes entre deux commits."""
+    reports = []
+    for revision in (old, new):
+        with open(os.path.join(RESULTS_DIR, f"{revision}.json")) as f:
+            reports.append(json.load(f)["mesures"])
+    for key in sorted(set(reports[0]) & set(reports[1])):
+        print(f"\n{key} : {old} -> {new}")
+        for stage, before in reports[0][key].items():
+            after = reports[1][key].get(stage)
+            if stage.startswith("_") or after is None:
+                continue
+            ratio = after["median_s"] / before["median_s"] if before["median_s"] else float("nan")
+            print(f"  {stage:<32} {before['median_s']:>9.3f} s {after['median_s']:>9.3f} s  x{ratio:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline sur données synthétiques.")
+    parser.add_argument("--tailles", type=int, nargs="+", default=[100_000],
+                        help="nombres d'accidents, ex. 100000 1000000 10000000")
+    parser.add_argument("--annees", type=int, nargs="+", default=[2023])
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--comparer", nargs=2, metavar=("AVANT", "APRES"))
+    args = parser.parse_args()
+
+    if args.comparer:
+        compare(*args.comparer)
+        sys.exit()
+
+    revision = git_revision()
+    for size in args.tailles:
+        root = prepare_data(size, args.annees, args.graine)
+        print(f"{size} accidents :", flush=True)
+        # Le pipeline utilise des chemins relatifs à la racine du projet (data/, data/cache/)
+        previous = os.getcwd()
+        os.chdir(root)
+        try:
+            results = run_suite(args.repetitions)
+        finally:
+            os.chdir(previous)
+        key = f"{size}-{'-'.join(map(str, args.annees))}"
+        print(f"Résultats : {save_results(revision, key, results)}")
@@ -1,22 +1,26 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import st_folium
-import seaborn as sns
-import matplotlib.pyplot as plt
-import geopandas as gpd
-import plotly.graph_objects as go
-
-st.set_page_config(page_title="Dashboard - Accidents 2023", layout="wide")
+
+# Les bibliothèques de graphiques et de cartes (plotly, matplotlib, folium, geopandas) sont
+# importées par les sections qui les utilisent, à leur premier affichage
+from accidents import (artifacts, bitmaps, choropleth, export, figures, hotspots, ingestion, instrumentation, lod,
+                       maps, model, query, sampling, schema, search, spatial, startup)
+from accidents.descriptions import DESCRIPTIONS
+
+st.set_page_config(page_title="Dashboard - Accidents de la route", layout="wide")
+
+# Préchauffage des données de la sélection par défaut, lancé une fois par processus (dès le
+# démarrage du serveur avec `python -m accidents.startup`, sinon par la première session)
+prechauffage = startup.start()
 
 # Titre principal
 st.markdown(
     """
     <div style="background-color:#ffcc66;padding:15px;border-radius:10px;text-align:center;">
-    <h1 style="color:#333;"> Tableau de bord : Accidents de la route 2023 </h1>
+    <h1 style="color:#333;"> Tableau de bord : Accidents de la route </h1>
     </div>
     """, unsafe_allow_html=True
 )
@@ -29,23 +33,26 @@ st.sidebar.markdown("""
 - [🌍 Carte Interactive](#carte-interactive)
 - [🔍 Analyse Descriptive](#analyse-descriptive)
 - [📊 Évolution Temporelle des Accidents](#evolution-temporelle-des-accidents)
+- [📅 Comparaison des Années](#comparaison-des-annees)
+- [🤖 Prédiction de la Gravité](#prediction-de-la-gravite)
+- [💾 Export des Données](#export-des-donnees)
 """, unsafe_allow_html=True)
 
 st.markdown("<a id='introduction'></a>", unsafe_allow_html=True)
 st.markdown("## 🏠 Introduction")
 st.markdown("""
-Les données utilisées proviennent de **l'INSEE** et concernent les **accidents de la route en France en 2023**. Elles sont organisées de la façon suivante :
+Les données utilisées proviennent de **l'INSEE** et concernent les **accidents de la route en France**, publiées chaque année. Elles sont organisées de la façon suivante (un fichier par année) :
 
-📂 Caractéristiques (caract-2023.csv)
+📂 Caractéristiques (caract-AAAA.csv)
 - Ce fichier contient des informations générales sur chaque accident 
 
-🌍 Lieux (lieux-2023.csv)
+🌍 Lieux (lieux-AAAA.csv)
 - Ce fichier décrit les caractéristiques du lieu de l’accident 
 
-🚗 Véhicules (vehicules-2023.csv)
+🚗 Véhicules (vehicules-AAAA.csv)
 - Ce fichier recense les informations sur les véhicules impliqués dans chaque accident 
 
-👥 Usagers (usagers-2023.csv)
+👥 Usagers (usagers-AAAA.csv)
 - Ce fichier contient des informations sur les usagers impliqués dans les accidents
 """)
 
@@ -53,473 +60,584 @@ Les données utilisées proviennent de **l'INSEE** et concernent les **accidents
 ## Chargement des données
 st.markdown("<a id='chargement-des-donnees'></a>", unsafe_allow_html=True)
 st.markdown("## 📂 Chargement des Données")
-# Utiliser le cache pour optimiser les performances lors du chargement des fichiers
-@st.cache_data
-def load_data(file_path):
-    """Charge un fichier CSV donné."""
-    try:
-        return pd.read_csv(file_path, sep=';', decimal=',')
-    except FileNotFoundError:
-        st.error(f"Le fichier {file_path} est introuvable.")
-        return None
-
-# Définir les chemins relatifs vers les fichiers
-caract_file_path = "data/caract-2023.csv"
-lieux_file_path = "data/lieux-2023.csv"
-vehicules_file_path = "data/vehicules-2023.csv"
-usagers_file_path = "data/usagers-2023.csv"
+# Emplacement de l'aperçu des données, rempli une fois les données prêtes : les sections
+# statiques qui suivent s'affichent sans attendre le chargement
+zone_chargement = st.container()
+attente_chargement = zone_chargement.empty()
+if not prechauffage.ready.is_set():
+    attente_chargement.info("⏳ Préparation des données en cours...")
 
-caract_df = load_data(caract_file_path)
-lieux_df = load_data(lieux_file_path)
-vehicules_df = load_data(vehicules_file_path)
-usagers_df = load_data(usagers_file_path)
+# Chaque section qui dépend d'un widget est un fragment : changer ce widget ne réexécute
+# que la section concernée, pas le chargement ni les autres graphiques.
 
-# Vérifier que tous les fichiers ont été chargés
-if caract_df is not None and lieux_df is not None and vehicules_df is not None and usagers_df is not None:
-    ## Fusion des bases de données
-    merged_df = caract_df.merge(lieux_df, on='Num_Acc')
-    merged_df = merged_df.merge(vehicules_df, on='Num_Acc')
-    merged_df = merged_df.merge(usagers_df, on='Num_Acc')
+st.markdown("<a id='description-des-variables'></a>", unsafe_allow_html=True)
+st.markdown("## 📝 Description des Variables")
+# Dictionnaire contenant les descriptions des variables pour chaque fichier
+# (défini dans accidents/descriptions.py, il sert aussi de source aux libellés des codes)
+descriptions = DESCRIPTIONS
+
+@st.fragment
+def variables_section():
+    """Descriptions des variables du fichier choisi."""
+    # Sélection du fichier
+    file_choice = st.selectbox(
+        "Choisissez un fichier pour voir toutes ses variables :",
+        options=list(descriptions.keys()),
+        index=0
+    )
 
-    # Supprimer les doublons
-    merged_df = merged_df.drop_duplicates()
+    # Afficher les descriptions
+    if file_choice:
+        st.subheader(f"Descriptions des variables pour : {file_choice}")
+        for variable, description in descriptions[file_choice].items():
+            st.markdown(f"**{variable}** : {description}")
 
-    # Définir les codes des véhicules motorisés
-    codes_motorises = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 14]
+variables_section()
 
-    # Filtrer les données pour conserver uniquement les véhicules motorisés
-    accidents_motorises = merged_df[merged_df['catv'].isin(codes_motorises)]
+# Sections dépendant des données : message d'attente jusqu'à la fin du chargement
+attente_sections = st.empty()
+if not prechauffage.ready.is_set():
+    attente_sections.info("⏳ Les cartes et les graphiques s'afficheront dès que les données seront chargées.")
 
-    # Conversion des colonnes en types numériques
-    accidents_motorises['lat'] = pd.to_numeric(accidents_motorises['lat'], errors='coerce')
-    accidents_motorises['long'] = pd.to_numeric(accidents_motorises['long'], errors='coerce')
-    accidents_motorises['dep'] = pd.to_numeric(accidents_motorises['dep'], errors='coerce')
-    accidents_motorises['com'] = pd.to_numeric(accidents_motorises['com'], errors='coerce')
+# Utiliser le cache pour optimiser les performances lors du chargement des fichiers
+# (le CSV n'est analysé qu'une fois, puis relu depuis son cache Arrow). Les vues usagers
+# sont construites une fois par hôte dans le magasin partagé (accidents/store.py), relues
+# en memory-map par chaque processus, puis partagées entre sessions via st.cache_resource,
+# sans copie : elles ne doivent pas être modifiées.
+# Les fonctions en cache sont instrumentées (appels et calculs effectifs, cf. accidents/instrumentation.py).
+@instrumentation.instrumented(st.cache_resource)
+def load_data(data_version, sources, columns, filters):
+    """Vue usagers des années choisies, filtres appliqués avant les jointures (lecture seule)."""
+    try:
+        # Conversion en parallèle des fichiers pas encore en cache
+        with instrumentation.span("ingestion"):
+            ingestion.ingest_partitions(sources)
+        # Fusion des bases de données (une ligne par usager, sans produit cartésien)
+        with instrumentation.span("vue usagers"):
+            accidents = query.load_partitioned_user_view(sources, columns, filters)
+    except FileNotFoundError as e:
+        st.error(f"Le fichier {e.filename} est introuvable.")
+        return None
+    # Ajout de la description de la gravité (libellés issus du dictionnaire des variables)
+    accidents['grav_desc'] = schema.label_series(accidents['grav'], 'grav')
+    return accidents
+
+# Fichiers sources par année : data/<table>-<année>.csv ou data/<année>/<table>.csv
+# (une fois un rafraîchissement publié, ceux de la génération publiée, cf. accidents/refresh.py)
+partitions = ingestion.discover_partitions()
+if not partitions:
+    attente_chargement.error("Aucun fichier de données trouvé dans le dossier data/.")
+    attente_sections.empty()
+    st.stop()
+
+# Sélection des années : seules leurs partitions sont lues
+annees = st.sidebar.multiselect(
+    "Années analysées :",
+    options=list(partitions),
+    default=[max(partitions)]
+)
+if not annees:
+    attente_chargement.warning("Sélectionnez au moins une année.")
+    attente_sections.empty()
+    st.stop()
+sources = {an: partitions[an] for an in sorted(annees)}
+
+# Version des données : empreinte des fichiers sources de la génération publiée (pointeur
+# data/cache/CURRENT), ou de leur contenu à défaut. Toutes les clés de cache en dépendent :
+# la publication d'un rafraîchissement bascule les sessions d'un bloc vers la nouvelle version.
+data_version = ingestion.data_version([path for tables in sources.values() for path in tables.values()])
+generation = ingestion.published()
+if generation is not None:
+    st.sidebar.caption(f"Données : génération {generation['generation']} publiée le {generation['publie_le']}")
+
+# Colonnes utilisées par les graphiques du tableau de bord
+colonnes_tableau = figures.COLONNES_TABLEAU
+
+# Filtres appliqués à la lecture : véhicules motorisés, coordonnées et gravité renseignées
+# (partagés avec la construction des figures, cf. accidents/figures.py)
+filtres_motorises = figures.FILTRES_MOTORISES
+
+with zone_chargement:
+    # Les données de la sélection par défaut sont préparées par le préchauffage : on attend
+    # sa fin, puis on les relit depuis le magasin partagé (un échec est sans conséquence)
+    with instrumentation.span("attente du préchauffage"):
+        prechauffage.wait()
+    accidents_motorises = load_data(data_version, sources, colonnes_tableau, filtres_motorises)
+
+    # Vérifier que tous les fichiers ont été chargés
+    if accidents_motorises is None:
+        attente_sections.empty()
+        st.error("Un ou plusieurs fichiers n'ont pas pu être chargés. Vérifiez leur emplacement ou leur contenu.")
+        st.stop()
+
+    # Les types (lat/long en flottants, dep/com en codes catégoriels) sont fixés par accidents/schema.py
 
     # Affichage des données fusionnées
-    st.write("Aperçu de la base de données :")
-    st.dataframe(merged_df.head())
-
+    attente_chargement.empty()
+    st.write("Aperçu de la base de données :")
+    st.dataframe(accidents_motorises.head())
+
+# Filtres croisés : évalués sur un index bitmap construit une fois par version des données
+# (accidents/bitmaps.py) ; les usagers retenus servent aux cartes comme aux graphiques
+@instrumentation.instrumented(st.cache_resource)
+def load_row_index(data_version, _accidents):
+    """Index bitmap des usagers motorisés."""
+    return bitmaps.BitmapIndex(_accidents)
+
+index_lignes = load_row_index(data_version, accidents_motorises)
+
+st.sidebar.markdown("### Filtres")
+filtres_croises = {}
+for colonne, libelle in bitmaps.FILTER_DIMENSIONS.items():
+    choix = st.sidebar.multiselect(
+        libelle,
+        options=index_lignes.values(colonne),
+        format_func=lambda valeur, colonne=colonne: bitmaps.value_label(colonne, valeur)
+    )
+    if choix:
+        filtres_croises[colonne] = choix
+date_min, date_max = index_lignes.date_bounds()
+periode = st.sidebar.date_input("Période", value=(date_min, date_max), min_value=date_min, max_value=date_max)
+if len(periode) == 2 and tuple(periode) != (date_min, date_max):
+    filtres_croises[bitmaps.DATE_FILTER] = tuple(periode)
+
+# Clé des filtres pour les caches, masque et sous-ensemble des usagers retenus
+cle_filtres = bitmaps.filter_key(filtres_croises)
+masque_lignes = None
+accidents_filtres = accidents_motorises
+if filtres_croises:
+    with instrumentation.span("filtres croisés"):
+        masque_lignes = index_lignes.mask(filtres_croises)
+        accidents_filtres = accidents_motorises[masque_lignes]
+    st.sidebar.caption(f"{len(accidents_filtres)} usagers retenus sur {len(accidents_motorises)}")
+    if accidents_filtres.empty:
+        st.warning("Aucun usager ne correspond aux filtres choisis.")
+
+# Cubes de comptages, un par groupe de graphiques (accidents/cube.py)
+@instrumentation.instrumented(st.cache_resource)
+def load_severity_cubes(data_version, sources, filters):
+    """Cubes de comptages des usagers impliqués, une partition par année (lecture seule)."""
+    return figures.severity_cubes(sources, filters)
+
+# Figures statiques (analyse descriptive, évolution temporelle, comparaison des années) :
+# artefacts pré-calculés par `python -m accidents.artifacts` s'ils existent pour cette
+# version des données, sinon construites une fois à partir des cubes de comptages
+@instrumentation.instrumented(st.cache_resource)
+def load_figures(data_version, sources, filters):
+    """Figures prêtes à afficher, partagées entre sessions (lecture seule)."""
+    loaded = artifacts.load(artifacts.manifest_key(data_version, filters))
+    if loaded is None:
+        cubes = load_severity_cubes(data_version, sources, filters)
+        with instrumentation.span("construction des figures"):
+            loaded = artifacts.render(figures.build_all(cubes))
+    return loaded
+
+# Figures des filtres croisés : construites à partir des usagers retenus par l'index des lignes
+# (véhicule, luminosité, météo et surface ne sont pas des dimensions des cubes, cf. accidents/cube.py)
+@instrumentation.instrumented(st.cache_resource(max_entries=32))
+def load_filtered_figures(data_version, filter_key, _accidents):
+    """Figures d'un jeu de filtres croisés (aucune si aucun usager n'est retenu)."""
+    if _accidents.empty:
+        return {}
+    return artifacts.render(figures.build_all(figures.filtered_cubes(_accidents)))
+
+# Mode approché : tant que les figures exactes ne sont pas pré-calculées, elles sont estimées
+# sur des échantillons stratifiés de taille croissante (accidents/sampling.py), avec leurs
+# intervalles de confiance, pendant que les figures exactes sont construites en arrière-plan
+@instrumentation.instrumented(st.cache_resource)
+def refine_figures(data_version, sources):
+    """Construction des figures exactes en arrière-plan, lancée une fois par processus."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="affinage-figures")
+    future = executor.submit(artifacts.build, sources)
+    executor.shutdown(wait=False)
+    return future
+
+@instrumentation.instrumented(st.cache_resource)
+def load_sample(data_version, size, sources):
+    """Échantillon stratifié pondéré, taille des strates et index bitmap (lecture seule)."""
+    sample = sampling.load_sample(data_version, size, sources)
+    sample['grav_desc'] = schema.label_series(sample['grav'], 'grav')
+    return sample, sampling.strata_sizes(sample), bitmaps.BitmapIndex(sample)
+
+@instrumentation.instrumented(st.cache_resource(max_entries=32))
+def load_approximate_figures(data_version, size, filter_key, _sample, _mask):
+    """Figures estimées sur l'échantillon (aucune si l'échantillon filtré est vide)."""
+    retenus = _sample if _mask is None else _sample[_mask]
+    if retenus.empty:
+        return {}
+    return artifacts.render(figures.build_all(retenus))
+
+@instrumentation.instrumented(st.cache_resource(max_entries=256))
+def load_estimate(data_version, size, filter_key, name, _sample, _strata, _mask):
+    """Estimations et intervalles de confiance d'une figure."""
+    return sampling.estimate_figure(name, _sample, _strata, _mask)
+
+cle_figures = artifacts.manifest_key(data_version, filtres_motorises)
+approximation = None
+if not (artifacts.available(cle_figures) or st.session_state.get("affinage_termine")):
+    affinage = refine_figures(data_version, sources)
+    niveau = st.session_state.setdefault("niveau_echantillon", 0)
+    taille = sampling.SAMPLE_SIZES[niveau]
+    echantillon, strates, index_echantillon = load_sample(data_version, taille, sources)
+    masque_echantillon = index_echantillon.mask(filtres_croises) if filtres_croises else None
+    approximation = (taille, echantillon, strates, masque_echantillon)
+    figures_statiques = load_approximate_figures(data_version, taille, cle_filtres, echantillon,
+                                                 masque_echantillon)
+elif filtres_croises:
+    figures_statiques = load_filtered_figures(data_version, cle_filtres, accidents_filtres)
 else:
-    st.error("Un ou plusieurs fichiers n'ont pas pu être chargés. Vérifiez leur emplacement ou leur contenu.")
-
-# Réduire la base de données de 50 % aléatoirement
-accidents_motorises = accidents_motorises.sample(frac=0.5, random_state=42)
-
-st.markdown("<a id='description-des-variables'></a>", unsafe_allow_html=True)
-st.markdown("## 📝 Description des Variables")
-# Dictionnaire contenant les descriptions des variables pour chaque fichier
-descriptions = {
-    "Caractéristiques (caract-2023.csv)": {
-        "Num_Acc": "Identifiant unique de l'accident.",
-        "an": "Année de l'accident.",
-        "mois": "Mois de l'accident.",
-        "jour": "Jour de l'accident.",
-        "hrmn": "Heure et minute de l'accident (exemple : '13h45').",
-        "lum": "Conditions de luminosité :\n"
-               "1 : Plein jour.\n"
-               "2 : Crépuscule ou aube.\n"
-               "3 : Nuit sans éclairage.\n"
-               "4 : Nuit avec éclairage non allumé.\n"
-               "5 : Nuit avec éclairage allumé.",
-        "agg": "L'accident a-t-il eu lieu en agglomération ?\n"
-               "1 : Oui.\n"
-               "2 : Non.",
-        "int": "Type d'intersection :\n"
-               "1 : Hors intersection.\n"
-               "2 : Intersection en X.\n"
-               "3 : Intersection en T.\n"
-               "4 : Intersection en Y.\n"
-               "5 : Rond-point.\n"
-               "6 : Place.\n"
-               "7 : Autre intersection.",
-        "atm": "Conditions atmosphériques :\n"
-               "1 : Normales.\n"
-               "2 : Pluie légère.\n"
-               "3 : Pluie forte.\n"
-               "4 : Neige ou grêle.\n"
-               "5 : Brouillard ou fumée.\n"
-               "6 : Vent fort ou tempête.\n"
-               "7 : Temps éblouissant.\n"
-               "8 : Temps couvert.\n"
-               "9 : Autres.",
-        "col": "Type de collision :\n"
-               "1 : Deux véhicules - frontale.\n"
-               "2 : Deux véhicules - par l'arrière.\n"
-               "3 : Deux véhicules - par le côté.\n"
-               "4 : Trois véhicules ou plus - en chaîne.\n"
-               "5 : Trois véhicules ou plus - collisions multiples.\n"
-               "6 : Autre collision.",
-        "dep": "Département où l'accident a eu lieu.",
-        "com": "Commune où l'accident a eu lieu.",
-        "adr": "Adresse approximative de l'accident."
-    },
-    "Lieux (lieux-2023.csv)": {
-        "Num_Acc": "Identifiant unique de l'accident.",
-        "catr": "Catégorie de route :\n"
-                "1 : Autoroute.\n"
-                "2 : Route nationale.\n"
-                "3 : Route départementale.\n"
-                "4 : Voie communale.\n"
-                "5 : Hors réseau public.\n"
-                "6 : Parking.\n"
-                "7 : Autres.",
-        "voie": "Numéro de voie.",
-        "v1": "Numéro de l'indice de lieu (précision géographique).",
-        "v2": "Numéro de l'indice de lieu (précision géographique).",
-        "circ": "Régime de circulation :\n"
-                "1 : À sens unique.\n"
-                "2 : Bidirectionnelle.\n"
-                "3 : Avec voies spécialisées.",
-        "nbv": "Nombre de voies.",
-        "prof": "Profil de la route :\n"
-                "1 : Plat.\n"
-                "2 : Pente.\n"
-                "3 : Sommet de côte.\n"
-                "4 : Bas de côte.",
-        "plan": "Tracé en plan :\n"
-                "1 : Rectiligne.\n"
-                "2 : En courbe à gauche.\n"
-                "3 : En courbe à droite.\n"
-                "4 : En S.",
-        "surf": "État de la surface :\n"
-                "1 : Normale.\n"
-                "2 : Mouillée.\n"
-                "3 : En flaques.\n"
-                "4 : Verglacée.\n"
-                "5 : Boue.\n"
-                "6 : Neige.\n"
-                "7 : Sable ou gravillons.\n"
-                "8 : Huile.\n"
-                "9 : Autres.",
-        "infra": "Présence d'infrastructure particulière :\n"
-                 "0 : Aucune.\n"
-                 "1 : Souterrain.\n"
-                 "2 : Pont.\n"
-                 "3 : Bretelle.\n"
-                 "4 : Voie ferrée.\n"
-                 "5 : Carrefour aménagé.\n"
-                 "6 : Zone piétonne.\n"
-                 "7 : Zone de péage.",
-        "situ": "Localisation de l'accident :\n"
-                "1 : Sur chaussée.\n"
-                "2 : Sur bande d'arrêt d'urgence.\n"
-                "3 : Sur accotement.\n"
-                "4 : Sur trottoir.\n"
-                "5 : Sur piste cyclable."
-    },
-    "Véhicules (vehicules-2023.csv)": {
-        "Num_Acc": "Identifiant unique de l'accident.",
-        "id_vehicule": "Identifiant unique du véhicule.",
-        "catv": "Catégorie du véhicule :\n"
-                "1 : Vélo.\n"
-                "2 : Cyclomoteur.\n"
-                "3 : Moto < 50 cm³.\n"
-                "4 : Moto > 50 cm³.\n"
-                "5 : VL seul.\n"
-                "6 : VL + remorque.\n"
-                "7 : VU seul.\n"
-                "8 : VU + remorque.\n"
-                "9 : PL seul 3,5T < PTAC < 7,5T.\n"
-                "10 : PL > 7,5T.\n"
-                "11 : Bus.\n"
-                "12 : Tramway.\n"
-                "13 : Train.\n"
-                "14 : Engin spécial.\n"
-                "15 : Autre.",
-        "obs": "Obstacle fixe heurté.",
-        "obsm": "Obstacle mobile heurté.",
-        "choc": "Point initial du choc :\n"
-                "1 : Avant.\n"
-                "2 : Avant droit.\n"
-                "3 : Avant gauche.\n"
-                "4 : Arrière.\n"
-                "5 : Arrière droit.\n"
-                "6 : Arrière gauche.",
-        "manv": "Manœuvre principale avant l'accident."
-    },
-    "Usagers (usagers-2023.csv)": {
-        "Num_Acc": "Identifiant unique de l'accident.",
-        "id_vehicule": "Identifiant unique du véhicule associé.",
-        "place": "Position dans le véhicule (conducteur, passager, etc.).",
-        "catu": "Catégorie d'usager :\n"
-                "1 : Conducteur.\n"
-                "2 : Passager.\n"
-                "3 : Piéton.",
-        "grav": "Gravité de l'accident pour la personne :\n"
-                "1 : Indemne.\n"
-                "2 : Blessé léger.\n"
-                "3 : Blessé hospitalisé.\n"
-                "4 : Tué.",
-        "sexe": "Sexe de l'usager :\n"
-                "1 : Masculin.\n"
-                "2 : Féminin.",
-        "trajet": "Raison du déplacement :\n"
-                  "1 : Domicile-travail.\n"
-                  "2 : Domicile-école.\n"
-                  "3 : Déplacement professionnel.\n"
-                  "4 : Loisirs.\n"
-                  "5 : Autres.",
-        "secu": "Utilisation des équipements de sécurité (ceinture, casque, etc.)."
-    }
-}
-
-# Interface utilisateur
+    figures_statiques = load_figures(data_version, sources, filtres_motorises)
+
+@st.fragment(run_every=2)
+def refinement_status():
+    """Passe aux figures exactes dès qu'elles sont prêtes, sinon à l'échantillon suivant."""
+    if affinage.done():
+        if affinage.exception() is not None:
+            # Les figures exactes seront construites au premier affichage
+            st.session_state["affinage_termine"] = True
+        st.rerun()
+    # L'échantillon suivant n'est chargé qu'une fois les figures de l'échantillon courant affichées
+    # (ce fragment s'exécute avant elles lors d'une exécution complète du script)
+    elif (st.session_state.get("niveau_affiche") == st.session_state["niveau_echantillon"]
+          and st.session_state["niveau_echantillon"] < len(sampling.SAMPLE_SIZES) - 1):
+        st.session_state["niveau_echantillon"] += 1
+        st.rerun()
+    st.info(f"Résultats estimés sur un échantillon stratifié de {len(echantillon)} usagers "
+            "(intervalles de confiance à 95 %) : calcul des valeurs exactes en cours.")
+
+def show_figure(name, **kwargs):
+    """Affiche une figure statique selon son type (Plotly, image PNG ou tableau)."""
+    figure = figures_statiques.get(name)
+    if figure is None:
+        # Figure sans données pour les filtres choisis
+        return
+    if isinstance(figure, bytes):
+        instrumentation.image(figure, name)
+    elif isinstance(figure, pd.DataFrame):
+        st.dataframe(figure)
+    else:
+        instrumentation.plotly_chart(figure, name, **kwargs)
+    if approximation is not None:
+        taille, echantillon, strates, masque_echantillon = approximation
+        estimation = load_estimate(data_version, taille, cle_filtres, name, echantillon, strates,
+                                   masque_echantillon)
+        if estimation is not None:
+            with st.expander("Estimation et intervalle de confiance à 95 %"):
+                st.dataframe(estimation, hide_index=True)
 
-# Sélection du fichier
-file_choice = st.selectbox(
-    "Choisissez un fichier pour voir toutes ses variables :",
-    options=list(descriptions.keys()),
-    index=0
-)
 
-# Afficher les descriptions
-if file_choice:
-    st.subheader(f"Descriptions des variables pour : {file_choice}")
-    for variable, description in descriptions[file_choice].items():
-        st.markdown(f"**{variable}** : {description}")
+# Données prêtes : les sections qui en dépendent remplacent le message d'attente
+attente_sections.empty()
 
 st.markdown("<a id='carte-interactive'></a>", unsafe_allow_html=True)
 st.markdown("## 🌍 Carte Interactive")
 st.markdown("### Carte de France")
-# Ajout de la description de la gravité
-gravite_dict = {
-    1: "Blessé léger",
-    2: "Indemne",
-    3: "Blessé hospitalisé",
-    4: "Tué"
-}
-accidents_motorises['grav_desc'] = accidents_motorises['grav'].map(gravite_dict)
-
-# Filtrage des lignes avec des valeurs valides
-accidents_motorises = accidents_motorises.dropna(subset=['lat', 'long', 'grav_desc'])
-
-# Création de la carte
-fig = px.scatter_mapbox(
-    accidents_motorises,
-    lat='lat',
-    lon='long',
-    color='grav_desc',
-    color_discrete_map={
-        "Indemne": "#0080ff",
-        "Blessé léger": "#ffff66",
-        "Blessé hospitalisé": "#ff9933",
-        "Tué": "#ff3300"
-    },
-    mapbox_style="open-street-map",
-    zoom=12,
-    height=800,
-    hover_name='grav_desc'
-)
 
-fig.update_layout(legend_title="Gravité")
-
-# Affichage de la carte dans Streamlit
-st.plotly_chart(fig, use_container_width=True)
+# Les lignes sans coordonnées ni gravité connue sont écartées à la lecture (filtres_motorises)
+
+# Grilles de densité pré-agrégées par niveau de zoom (une fois par version des données et filtres)
+@instrumentation.instrumented(st.cache_resource(max_entries=16))
+def load_pyramid(data_version, filter_key, _accidents):
+    """Grilles de densité des accidents pour chaque niveau de zoom."""
+    return lod.build_pyramid(_accidents['lat'], _accidents['long'], _accidents['grav'])
+
+# Emprise de chaque département (centiles 1-99 % pour écarter les coordonnées aberrantes)
+@instrumentation.instrumented(st.cache_data)
+def load_dep_bboxes(data_version, _accidents):
+    """Emprise (lat_min, lat_max, lon_min, lon_max) de chaque département."""
+    grouped = _accidents.groupby('dep', observed=True)
+    bounds = pd.concat([
+        grouped['lat'].quantile(0.01), grouped['lat'].quantile(0.99),
+        grouped['long'].quantile(0.01), grouped['long'].quantile(0.99),
+    ], axis=1)
+    return {dep: tuple(row) for dep, row in zip(bounds.index, bounds.to_numpy())}
+
+@st.fragment
+def national_map_section():
+    """Carte nationale, en points ou en grille de densité selon la zone."""
+    import plotly.express as px
+
+    pyramid = load_pyramid(data_version, cle_filtres, accidents_filtres)
+    dep_bboxes = load_dep_bboxes(data_version, accidents_motorises)
+
+    # Zone affichée : la France entière est servie en grille de densité, un département en points
+    zone = st.selectbox(
+        "Zone affichée :",
+        options=["France"] + sorted(dep_bboxes),
+        format_func=lambda x: "France métropolitaine" if x == "France" else f"Département {x}"
+    )
+    bbox = lod.FRANCE_BBOX if zone == "France" else dep_bboxes[zone]
+    layer, layer_data = lod.select_layer(accidents_filtres['lat'], accidents_filtres['long'], pyramid, bbox)
+
+    # Création de la carte
+    if layer == "points":
+        fig = px.scatter_mapbox(
+            accidents_filtres[layer_data],
+            lat='lat',
+            lon='long',
+            color='grav_desc',
+            color_discrete_map={
+                "Indemne": "#0080ff",
+                "Blessé léger": "#ffff66",
+                "Blessé hospitalisé": "#ff9933",
+                "Tué": "#ff3300"
+            },
+            mapbox_style="open-street-map",
+            zoom=lod.zoom_for_bbox(bbox),
+            height=800,
+            hover_name='grav_desc'
+        )
+        fig.update_layout(legend_title="Gravité")
+    else:
+        # Trop de points pour la zone : une bulle par cellule de grille
+        fig = px.scatter_mapbox(
+            layer_data,
+            lat='lat',
+            lon='long',
+            size='count',
+            color='part_graves',
+            color_continuous_scale="YlOrRd",
+            range_color=(0, 1),
+            labels={'count': "Nombre d'usagers", 'part_graves': "Part hospitalisés ou tués"},
+            mapbox_style="open-street-map",
+            zoom=lod.zoom_for_bbox(bbox),
+            height=800,
+        )
+
+    # Affichage de la carte dans Streamlit
+    instrumentation.plotly_chart(fig, "carte nationale", use_container_width=True)
+
+national_map_section()
 
 # Liste des départements d'Île-de-France
-idf_departments = {
-    75: "Paris",
-    77: "Seine-et-Marne",
-    78: "Yvelines",
-    91: "Essonne",
-    92: "Hauts-de-Seine",
-    93: "Seine-Saint-Denis",
-    94: "Val-de-Marne",
-    95: "Val-d'Oise"
-}
+idf_departments = figures.IDF_DEPARTMENTS
 
 # Interface utilisateur
 st.markdown("### Carte Île-de-France")
 
-# Menu pour sélectionner un département
-selected_dep = st.selectbox(
-    "Choisissez un département :",
-    options=list(idf_departments.keys()),
-    format_func=lambda x: f"{idf_departments[x]} ({x})"
-)
-
-# Filtrer les données pour le département sélectionné
-filtered_data = accidents_motorises[accidents_motorises["dep"] == selected_dep]
-
-# Fonction pour générer la carte (cachée pour éviter le recalcul)
-@st.cache_data
-def create_map(filtered_data):
-    # Initialiser une carte centrée sur le département sélectionné
-    m = folium.Map(
-        location=[filtered_data["lat"].mean(), filtered_data["long"].mean()],
-        zoom_start=10
+# Fonction pour générer la carte, mise en cache par département, version des données et filtres
+# (le DataFrame n'entre pas dans la clé du cache, d'où le préfixe « _ »)
+@instrumentation.instrumented(st.cache_resource(max_entries=16))
+def create_map(selected_dep, data_version, filter_key, _accidents):
+    """Carte folium d'un département, ou None s'il n'a aucun accident."""
+    filtered_data = _accidents[_accidents["dep"] == selected_dep]
+    if filtered_data.empty:
+        return None
+    return maps.department_map(filtered_data["lat"], filtered_data["long"], filtered_data["grav"])
+
+@st.fragment
+def idf_map_section():
+    """Carte folium du département d'Île-de-France choisi."""
+    # Menu pour sélectionner un département
+    selected_dep = st.selectbox(
+        "Choisissez un département :",
+        options=list(idf_departments.keys()),
+        format_func=lambda x: f"{idf_departments[x]} ({x})"
     )
 
-    # Ajouter des marqueurs pour les accidents
-    for _, row in filtered_data.iterrows():
-        folium.CircleMarker(
-            location=[row["lat"], row["long"]],
-            radius=6,
-            color="red" if row["grav"] == 4 else "orange" if row["grav"] == 3 else "blue",
-            fill=True,
-            fill_opacity=0.7,
-            popup=f"Gravité : {row['grav']}"
-        ).add_to(m)
-    return m
-
-# Créer la carte uniquement si des données existent
-if not filtered_data.empty:
-    accident_map = create_map(filtered_data)
-    st_folium(accident_map, width=800, height=500)
-else:
-    st.warning("Aucune donnée disponible pour le département sélectionné.")
-
-
-# Ajouter une description de la gravité
-gravite_dict = {
-    1: "Indemne",
-    2: "Blessé léger",
-    3: "Blessé hospitalisé",
-    4: "Tué"
-}
-accidents_motorises['grav_desc'] = accidents_motorises['grav'].map(gravite_dict)
-
-# Liste des départements d'Île-de-France
-idf_departments = [75, 77, 78, 91, 92, 93, 94, 95]
-
-# Filtrer uniquement les départements d'Île-de-France
-accidents_motorises_idf = accidents_motorises[accidents_motorises['dep'].isin(idf_departments)]
-
-# Ajouter une colonne pour les plages horaires
-def categorize_time(hour):
-    if 6 <= hour < 12:
-        return "Matin (6h-12h)"
-    elif 12 <= hour < 18:
-        return "Après-midi (12h-18h)"
+    # Créer la carte uniquement si des données existent
+    accident_map = create_map(selected_dep, data_version, cle_filtres, accidents_filtres)
+    if accident_map is not None:
+        instrumentation.folium_map(accident_map, "carte Île-de-France", width=800, height=500)
     else:
-        return "Soir (18h-6h)"
-accidents_motorises_idf['heure'] = accidents_motorises_idf['hrmn'].str.split(':').str[0].astype(int)
-accidents_motorises_idf['plage_horaire'] = accidents_motorises_idf['heure'].apply(categorize_time)
-
-# Ajouter une colonne avec les jours de la semaine
-accidents_motorises_idf['jour_semaine_en'] = pd.to_datetime(
-    accidents_motorises_idf[['an', 'mois', 'jour']].rename(columns={'an': 'year', 'mois': 'month', 'jour': 'day'})
-).dt.day_name()
-
-# Traduire les jours de la semaine en français
-jours_traduction = {
-    "Monday": "lundi",
-    "Tuesday": "mardi",
-    "Wednesday": "mercredi",
-    "Thursday": "jeudi",
-    "Friday": "vendredi",
-    "Saturday": "samedi",
-    "Sunday": "dimanche"
-}
-accidents_motorises_idf['jour_semaine'] = accidents_motorises_idf['jour_semaine_en'].map(jours_traduction)
+        st.warning("Aucune donnée disponible pour le département sélectionné.")
+
+idf_map_section()
+
+
+# Carte choroplèthe : contours pré-simplifiés selon le niveau de zoom (cf. accidents/choropleth.py)
+st.markdown("### Carte par Département et par Commune")
+
+@instrumentation.instrumented(st.cache_resource(max_entries=32))
+def load_area_stats(data_version, filter_key, level, _accidents):
+    """Nombre d'usagers et part des usagers gravement atteints par zone."""
+    return choropleth.severity_by_area(_accidents, level)
+
+@instrumentation.instrumented(st.cache_resource(max_entries=16))
+def load_area_geojson(level, tolerance, prefix):
+    """Contours simplifiés d'un niveau, restreints aux codes commençant par `prefix`."""
+    geojson = choropleth.load_geojson(level, tolerance)
+    if geojson is None or not prefix:
+        return geojson
+    return choropleth.subset(geojson, prefix)
+
+@st.fragment
+def choropleth_section():
+    """Carte choroplèthe des départements ou des communes."""
+    dep_bboxes = load_dep_bboxes(data_version, accidents_motorises)
+    col_niveau, col_zone, col_indicateur = st.columns(3)
+    level = col_niveau.radio("Niveau :", options=["dep", "com"], horizontal=True,
+                             format_func=lambda x: "Départements" if x == "dep" else "Communes")
+    zone = col_zone.selectbox(
+        "Zone :",
+        options=["France"] + sorted(dep_bboxes),
+        format_func=lambda x: "France métropolitaine" if x == "France" else f"Département {x}",
+        key="zone_choroplethe"
+    )
+    metric = col_indicateur.radio("Indicateur :", options=["part_graves", "count"], horizontal=True,
+                                  format_func=lambda x: "Part hospitalisés ou tués" if x == "part_graves"
+                                  else "Nombre d'usagers")
+
+    bbox = lod.FRANCE_BBOX if zone == "France" else dep_bboxes[zone]
+    zoom = lod.zoom_for_bbox(bbox)
+    # Pour un département, seules ses communes sont envoyées au navigateur
+    prefix = zone if level == "com" and zone != "France" else ""
+    geojson = load_area_geojson(level, choropleth.tolerance_for_zoom(zoom), prefix)
+    if geojson is None:
+        st.info(f"Contours absents : ajoutez {choropleth.LEVELS[level][0]} pour afficher cette carte.")
+        return
+    center = ((bbox[0] + bbox[1]) / 2, (bbox[2] + bbox[3]) / 2)
+    fig = choropleth.choropleth_figure(geojson, load_area_stats(data_version, cle_filtres, level, accidents_filtres),
+                                       metric, zoom, center)
+    instrumentation.plotly_chart(fig, "carte choroplèthe", use_container_width=True)
+
+choropleth_section()
+
+
+# Recherche géographique à partir de l'index spatial des accidents
+st.markdown("### Recherche géographique")
+
+# Index spatial (STRtree, Lambert-93 en métropole et UTM outre-mer), construit une fois par version des données
+@instrumentation.instrumented(st.cache_resource)
+def load_spatial_index(data_version, _accidents):
+    """Index spatial des accidents motorisés."""
+    return spatial.SpatialIndex(_accidents['lat'], _accidents['long'])
+
+@instrumentation.instrumented(st.cache_resource)
+def load_communes(path):
+    """Contours des communes, ou None si le fichier n'est pas présent."""
+    if not os.path.exists(path):
+        return None
+    return spatial.load_boundaries(path)
+
+def retained(positions):
+    """Positions d'usagers restreintes à ceux retenus par les filtres croisés."""
+    return positions if masque_lignes is None else positions[masque_lignes[positions]]
+
+@st.fragment
+def geo_search_section():
+    """Accidents autour d'un point et dans une commune."""
+    spatial_index = load_spatial_index(data_version, accidents_motorises)
+
+    col_lat, col_lon, col_rayon = st.columns(3)
+    centre_lat = col_lat.number_input("Latitude", value=48.8530, format="%.4f")
+    centre_lon = col_lon.number_input("Longitude", value=2.3499, format="%.4f")
+    rayon = col_rayon.number_input("Rayon (m)", min_value=50, max_value=50000, value=500, step=50)
+
+    # L'index couvre tous les usagers : les filtres croisés s'appliquent aux positions trouvées
+    proches = accidents_motorises.iloc[retained(spatial_index.within_distance(centre_lat, centre_lon, rayon))]
+    st.write(f"{len(proches)} usagers impliqués dans un accident à moins de {rayon} m :")
+    st.dataframe(proches['grav_desc'].value_counts().rename("Nombre d'usagers"))
+
+    positions, distances = spatial_index.nearest(centre_lat, centre_lon, 10, mask=masque_lignes)
+    plus_proches = accidents_motorises.iloc[positions][['Num_Acc', 'dep', 'com', 'grav_desc']]
+    st.write("Les 10 usagers accidentés les plus proches :")
+    st.dataframe(plus_proches.assign(distance_m=distances.round()))
+
+    # Filtre par commune, si les contours sont disponibles localement
+    communes = load_communes(spatial.COMMUNES_PATH)
+    if communes is not None:
+        commune = st.selectbox(
+            "Accidents dans la commune :",
+            options=communes.index,
+            format_func=lambda i: f"{communes.at[i, spatial.COMMUNE_NAME]} ({communes.at[i, spatial.COMMUNE_CODE]})"
+        )
+        dans_commune = accidents_motorises.iloc[retained(spatial_index.in_polygon(communes.geometry[commune]))]
+        st.write(f"{len(dans_commune)} usagers impliqués dans un accident dans cette commune :")
+        st.dataframe(dans_commune['grav_desc'].value_counts().rename("Nombre d'usagers"))
+
+geo_search_section()
+
+
+# Recherche par adresse, route ou commune : index inversé normalisé (cf. accidents/search.py)
+st.markdown("### Recherche par Adresse")
+
+@instrumentation.instrumented(st.cache_resource)
+def load_search_index(data_version, sources):
+    """Index des adresses, routes et communes des accidents (lecture seule)."""
+    return search.load_index(data_version, sources)
+
+@st.fragment
+def address_search_section():
+    """Accidents d'une adresse, d'une route ou d'une commune, et classement des rues."""
+    texte = st.text_input("Adresse, route ou code commune :", placeholder="ex. rue de la République, RN 7, 75056")
+    if not search.terms(texte):
+        st.caption("Accents, casse et abréviations (av., bd, RN...) sont ignorés ; le dernier mot peut être incomplet.")
+        return
+    index = load_search_index(data_version, sources)
+    positions = index.search(texte)
+    # L'index couvre tous les accidents des années choisies, sans les filtres de la barre latérale
+    st.write(f"{len(positions)} accidents trouvés sur {len(index)} (années {', '.join(map(str, sources))}) :")
+    if not len(positions):
+        return
+    st.dataframe(index.matches(positions[:1000])[['Num_Acc', 'an', 'dep', 'com', 'adr', 'voie', 'usagers']])
+
+    critere = st.radio("Classer les rues par :", options=["accidents", "graves"], horizontal=True,
+                       format_func=lambda x: {"accidents": "Nombre d'accidents",
+                                              "graves": "Usagers hospitalisés ou tués"}[x])
+    classement = index.street_ranking(positions, by=critere)
+    st.dataframe(search.severity_labels(classement).head(20).set_index("rang"))
+    if st.checkbox("Afficher le nuage des rues"):
+        png = search.wordcloud_png(classement, weight=critere)
+        if png is None:
+            st.info("Nuage indisponible (module wordcloud absent ou aucune rue nommée).")
+        else:
+            instrumentation.image(png, "nuage des rues")
+
+address_search_section()
+
+
+# Zones à forte concentration : grille pré-agrégée puis DBSCAN pondéré (cf. accidents/hotspots.py)
+st.markdown("### Zones à Forte Concentration d'Accidents")
+
+@instrumentation.instrumented(st.cache_resource(max_entries=16))
+def load_hotspots(data_version, filter_key, eps_metres, min_usagers, _accidents):
+    """Hotspots des usagers retenus, classés par nombre d'usagers."""
+    return hotspots.detect(_accidents['lat'], _accidents['long'], _accidents['grav'],
+                           eps_metres=eps_metres, min_usagers=min_usagers)
+
+@st.fragment
+def hotspots_section():
+    """Carte et classement des hotspots."""
+    col_rayon, col_min = st.columns(2)
+    eps_metres = col_rayon.select_slider("Rayon de voisinage (m) :", options=[100, 200, 300, 500, 1000],
+                                         value=hotspots.EPS_METRES)
+    min_usagers = col_min.select_slider("Usagers minimum :", options=[10, 20, 30, 50, 100, 200],
+                                        value=hotspots.MIN_USAGERS)
+
+    zones = load_hotspots(data_version, cle_filtres, eps_metres, min_usagers, accidents_filtres)
+    if zones.empty:
+        st.info("Aucune zone ne regroupe assez d'usagers avec ces paramètres.")
+        return
+    st.write(f"{len(zones)} zones regroupant {int(zones['count'].sum())} usagers :")
+    center = ((lod.FRANCE_BBOX[0] + lod.FRANCE_BBOX[1]) / 2, (lod.FRANCE_BBOX[2] + lod.FRANCE_BBOX[3]) / 2)
+    fig = hotspots.hotspots_figure(zones, lod.zoom_for_bbox(lod.FRANCE_BBOX), center)
+    instrumentation.plotly_chart(fig, "carte des hotspots", use_container_width=True)
+    st.dataframe(hotspots.severity_labels(zones).head(20).set_index("rang"))
+
+hotspots_section()
 
 
 st.markdown("<a id='analyse-descriptive'></a>", unsafe_allow_html=True)
 st.markdown("## 🔍 Analyse Descriptive")
 
-# Dictionnaire pour l'affichage des variables
-variables_disponibles = {
-    "plage_horaire": "Plage Horaire",
-    "catv": "Catégorie de Véhicules",
-    "dep": "Département",
-    "jour_semaine": "Jour de la Semaine",
-    "pie_grav": "Camembert (Répartition par Gravité)"
-}
+if approximation is not None:
+    refinement_status()
+
+# Les analyses Île-de-France sont des agrégations du cube restreintes à ces départements
+# (figures construites dans accidents/figures.py)
 
 # 5. Camembert (Répartition par Gravité)
 st.markdown("### Répartition des Accidents par Gravité")
-grav_count = accidents_motorises['grav_desc'].value_counts().reset_index()
-grav_count.columns = ['Gravité', 'Nombre d\'accidents']
-
-fig = px.pie(
-    grav_count,
-    values='Nombre d\'accidents',
-    names='Gravité',
-    color_discrete_sequence=px.colors.sequential.RdBu,
-    template="presentation",
-    hole=0.4  # Donut chart
-)
-st.plotly_chart(fig, use_container_width=True)
-# Analyse des différentes options (sans menu déroulant)
+show_figure("gravite", use_container_width=True)
 
 # 1. Plage Horaire
 st.markdown("### Répartition des Accidents par Plage Horaire et Gravité")
-# Création des données pour la heatmap
-# Création des données pour la heatmap
-heatmap_data = pd.crosstab(
-    accidents_motorises_idf["plage_horaire"],
-    accidents_motorises_idf["grav_desc"],
-    normalize='index'
-)
-
-heatmap_data = heatmap_data.reindex(["Matin (6h-12h)", "Après-midi (12h-18h)", "Soir (18h-6h)"])
-
-# Création de la heatmap avec Plotly
-fig = px.imshow(
-    heatmap_data,
-    text_auto=".2f",
-    labels=dict(x="Gravité", y="Plage Horaire", color="Proportion"),
-    color_continuous_scale="YlOrRd"
-)
-
-# Personnalisation du thème noir
-fig.update_layout(
-    title = " ",
-    xaxis=dict(tickangle=-45, title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
-    yaxis=dict(title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
-    plot_bgcolor="black",
-    paper_bgcolor="black",
-    font=dict(color="white")
-)
-
-# Affichage dans Streamlit
-st.plotly_chart(fig, use_container_width=True)
-
+show_figure("plage_horaire", use_container_width=True)
 
 # 3. Département
-# Création des données pour la heatmap
 st.markdown("### Répartition des Accidents par Département")
-heatmap_data = pd.crosstab(
-    accidents_motorises_idf["dep"],
-    accidents_motorises_idf["grav_desc"],
-    normalize='index'
-)
-
-# Renommer les départements
-heatmap_data.index = heatmap_data.index.map({
-    75: "Paris",
-    77: "Seine-et-Marne",
-    78: "Yvelines",
-    91: "Essonne",
-    92: "Hauts-de-Seine",
-    93: "Seine-Saint-Denis",
-    94: "Val-de-Marne",
-    95: "Val-d'Oise"
-})
-
-# Création de la heatmap avec Plotly
-fig = px.imshow(
-    heatmap_data,
-    text_auto=".2f",  # Formater les valeurs avec 2 décimales
-    labels=dict(x="Gravité", y="Département", color="Proportion"),
-    color_continuous_scale="YlOrRd"
-)
-
-# Personnalisation du thème noir
-fig.update_layout(
-    title=" ",  # Supprime le titre
-    xaxis=dict(tickangle=-45, title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
-    yaxis=dict(title_font=dict(size=14, color='white'), tickfont=dict(color='white')),
-    plot_bgcolor="black",  # Fond noir pour la zone des graphiques
-    paper_bgcolor="black",  # Fond noir pour tout le fond du graphique
-    font=dict(color="white")  # Texte en blanc
-)
-
-# Affichage dans Streamlit
-st.plotly_chart(fig, use_container_width=True)
-
-
+show_figure("departement", use_container_width=True)
 
 
 # Evolution temporelle des accidents
@@ -528,160 +646,146 @@ st.markdown("## 📊 Évolution Temporelle des Accidents")
 
 # 4. Jour de la Semaine
 st.markdown("### Distribution des Accidents par Jour de la Semaine")
+show_figure("jour_semaine")
 
-# Réorganiser les jours de la semaine
-jours_ordre = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
-stacked_data = pd.crosstab(
-    accidents_motorises_idf["jour_semaine"],
-    accidents_motorises_idf["grav_desc"]
-)
-stacked_data = stacked_data.reindex(jours_ordre)
-
-colors = ["#ffcc66", "#ff9966", "#FFFF00", "#ff3333"]
-
-# Création de la figure
-fig, ax = plt.subplots(figsize=(12, 6))
-
-# Définir le fond noir
-fig.patch.set_facecolor('black')  # Fond noir pour la figure
-ax.set_facecolor('black')  # Fond noir pour le graphique
+st.markdown("### Evolution Temporelle des Accidents")
+show_figure("serie_temporelle", use_container_width=True)
 
-# Traçage des données empilées
-stacked_data.plot(
-    kind='bar',
-    stacked=True,
-    figsize=(12, 6),
-    color=colors,
-    ax=ax
-)
-
-# Personnalisation des titres et axes
-ax.set_title(" ", fontsize=16, fontweight='bold', color='white')
-ax.set_xlabel("Jour de la Semaine", fontsize=14, color='white')
-ax.set_ylabel("Nombre d'Accidents", fontsize=14, color='white')
-ax.legend(
-    title="Gravité",
-    fontsize=12,
-    title_fontsize=14,
-    loc='upper left',
-    bbox_to_anchor=(1.05, 1),
-    labelcolor='white'  # Couleur des labels de légende
-)
-
-# Ajustement des couleurs des ticks
-plt.xticks(fontsize=12, rotation=45, color='white')
-plt.yticks(fontsize=12, color='white')
+st.markdown("### Distribution des Accidents par Heure de la Journée ")
+show_figure("heure")
 
-# Affichage dans Streamlit
-st.pyplot(fig)
+show_figure("mensuel", use_container_width=True)
 
 
-st.markdown("### Evolution Temporelle des Accidents en 2023 ")
+# Comparaison d'une année sur l'autre (agrégations du cube par année)
+st.markdown("<a id='comparaison-des-annees'></a>", unsafe_allow_html=True)
+st.markdown("## 📅 Comparaison des Années")
 
-# Préparer les données temporelles
-time_analysis = accidents_motorises.groupby(['mois', 'jour']).size().reset_index(name='count')
-time_analysis['date'] = pd.to_datetime(
-    {'year': 2023, 'month': time_analysis['mois'], 'day': time_analysis['jour']}
-)
+if len(annees) < 2:
+    st.info("Sélectionnez plusieurs années dans la barre latérale pour les comparer.")
+else:
+    st.markdown("### Usagers impliqués par Année et Gravité")
+    show_figure("annees_gravite", use_container_width=True)
 
-# Trier les données par date
-time_analysis = time_analysis.sort_values('date')
-
-## Créer le graphique avec Plotly
-fig = px.line(
-    time_analysis,
-    x='date',
-    y='count',
-    title=" ",
-    labels={'date': 'Date', 'count': "Nombre d'accidents"},
-    markers=True,  # Ajouter des marqueurs
-    line_shape='spline',  # Lissage de la courbe
-    color_discrete_sequence=["#FF5733"]  # Couleur vibrante
-)
+    # Variation du total d'une année sur l'autre
+    show_figure("variation_annees")
 
-# Mettre à jour le design du graphique
-fig.update_layout(
-    title=dict(
-        text=" ",
-        font=dict(size=20, color='#f7f7f7', family="Arial")  # Titre en blanc
-    ),
-    xaxis=dict(
-        title="Date",
-        showgrid=True,
-        gridcolor="rgba(200,200,200,0.3)",  # Couleur discrète pour les lignes de la grille
-        tickformat="%b %d",  # Afficher le mois et le jour
-        tickangle=-45,
-        title_font=dict(color="white"),  # Texte de l'axe X en blanc
-        tickfont=dict(color="white")  # Ticks en blanc
-    ),
-    yaxis=dict(
-        title="Nombre d'accidents",
-        showgrid=True,
-        gridcolor="rgba(200,200,200,0.3)",  # Couleur discrète pour les lignes de la grille
-        title_font=dict(color="white"),  # Texte de l'axe Y en blanc
-        tickfont=dict(color="white")  # Ticks en blanc
-    ),
-    plot_bgcolor="#303030",  # Fond du graphique (gris foncé pour s'aligner sur le thème sombre)
-    paper_bgcolor="#303030",  # Fond de la figure (même couleur que le Dashboard)
-    font=dict(color="white"),  # Couleur du texte
-    margin=dict(l=50, r=50, t=80, b=50),
-    hovermode="x unified"  # Info survol unifiée
-)
+    st.markdown("### Évolution Mensuelle par Année")
+    show_figure("mensuel_annees", use_container_width=True)
 
-# Afficher le graphique
-st.plotly_chart(fig, use_container_width=True)
+# Figures de l'échantillon courant affichées : l'affinage peut passer à l'échantillon suivant
+if approximation is not None:
+    st.session_state["niveau_affiche"] = st.session_state["niveau_echantillon"]
 
 
-data = accidents_motorises_idf['heure']
+# Prédiction de la gravité : modèle entraîné hors ligne (python -m accidents.model), scoring par lots
+st.markdown("<a id='prediction-de-la-gravite'></a>", unsafe_allow_html=True)
+st.markdown("## 🤖 Prédiction de la Gravité")
 
-st.markdown("### Distribution des Accidents par Heure de la Journée ")
+@instrumentation.instrumented(st.cache_resource)
+def load_grav_model(data_version, trained):
+    """Modèle de gravité de cette version des données, ou None s'il n'est pas entraîné.
 
-# Créer un histogramme interactif avec Plotly
-fig = px.histogram(
-    data, 
-    x=data, 
-    nbins=24,  # 24 bins pour les heures de la journée
-    title=" ",
-    labels={'x': 'Heure', 'y': 'Fréquence'},  # Étiquettes des axes
-    color_discrete_sequence=["#FF5733"]  # Couleur personnalisée
-)
-
-# Ajouter des options de style
-fig.update_layout(
-    title=dict(
-        font=dict(size=20, family='Arial', color='#f7f7f7')
-    ),
-    xaxis=dict(
-        title="Heure",
-        tickmode='linear',
-        tick0=0,
-        dtick=2  # Affiche une graduation toutes les deux heures
-    ),
-    yaxis=dict(title="Fréquence"),
-    bargap=0.1  # Espacement entre les barres
-)
-
-# Afficher avec Streamlit
-st.plotly_chart(fig)
+    `trained` fait partie de la clé de cache : un modèle entraîné hors ligne après le
+    démarrage est chargé au rechargement suivant de la page.
+    """
+    return model.load_model(data_version)
+
+@instrumentation.instrumented(st.cache_resource)
+def load_risk(data_version, sources, filters, _artifact):
+    """Risque prédit (hospitalisé ou tué) par département et heure, sur les usagers motorisés."""
+    frame = query.run_partitioned_query(sources, model.COLUMNS, filters + model.FILTERS).user_view(model.COLUMNS)
+    return model.risk_by(_artifact, frame, ['dep', 'heure'])
+
+modele_gravite = load_grav_model(
+    data_version, os.path.exists(model.model_path(data_version, model.DEFAULT_PARAMS)))
+if modele_gravite is None:
+    # Le modèle n'est jamais entraîné dans une session : seul l'artefact hors ligne est chargé
+    st.info("Aucun modèle entraîné pour ces données. Entraînement hors ligne : "
+            f"`python -m accidents.model {' '.join(map(str, sources))}`.")
+else:
+    import plotly.express as px
+
+    st.write("Qualité du modèle (échantillon de test) :", modele_gravite["metrics"])
+    risque = load_risk(data_version, sources, filtres_motorises, modele_gravite)
+
+    st.markdown("### Risque Prédit par Département et Heure")
+    risque_idf = risque[risque['dep'].isin(list(idf_departments))]
+    carte_risque = risque_idf.pivot(index='dep', columns='heure', values='risque')
+    carte_risque.index = carte_risque.index.map(idf_departments)
+    fig = px.imshow(
+        carte_risque,
+        labels=dict(x="Heure", y="Département", color="Probabilité"),
+        color_continuous_scale="YlOrRd",
+        aspect="auto"
+    )
+    instrumentation.plotly_chart(fig, "risque prédit", use_container_width=True)
 
+    st.markdown("### Départements au Risque Prédit le plus Élevé")
+    par_departement = risque.assign(pondere=risque['risque'] * risque['usagers']).groupby('dep', observed=True)
+    classement = (par_departement['pondere'].sum() / par_departement['usagers'].sum()).rename("Risque moyen")
+    st.dataframe(classement.sort_values(ascending=False).head(10).round(3))
 
-monthly_data = accidents_motorises.groupby(['mois', 'grav_desc']).size().reset_index(name='count')
-fig = px.line(
-    monthly_data,
-    x='mois',
-    y='count',
-    color='grav_desc',
-    title=" ",
-    markers=True,
-    line_shape='spline',
-    color_discrete_sequence=px.colors.qualitative.Dark24
-)
 
-fig.update_layout(
-    title=dict(
-        font=dict(size=20, family='Arial', color='#f7f7f7')
-    )
-)
-st.plotly_chart(fig, use_container_width=True)
+# Export des lignes filtrées : construit par lots en arrière-plan dans static/exports/ puis servi
+# depuis le disque par Streamlit (cf. accidents/export.py)
+st.markdown("<a id='export-des-donnees'></a>", unsafe_allow_html=True)
+st.markdown("## 💾 Export des Données")
 
+@instrumentation.instrumented(st.cache_data)
+def load_export_columns(data_version, sources, view):
+    """Colonnes exportables d'une vue."""
+    return export.view_columns(sources, view)
 
+@st.fragment(run_every=1)
+def export_progress(path):
+    """Avancement d'un export en cours, interrogé chaque seconde jusqu'à sa fin."""
+    if export.status(path)[0] == "en_cours":
+        st.info("⏳ Export en cours de construction...")
+    else:
+        # Export terminé : l'état final est affiché hors de ce fragment, l'interrogation s'arrête
+        st.rerun()
+
+def export_result(path, etat, detail):
+    """État final d'un export : erreur, ou lien de téléchargement."""
+    if etat == "echec":
+        st.error(f"L'export a échoué : {detail}")
+    elif etat == "pret" and detail > export.MAX_EXPORT_BYTES:
+        st.warning(f"Export trop volumineux pour être téléchargé ({detail / 1e6:.0f} Mo) : choisissez le format "
+                   "Parquet ou CSV compressé, moins de colonnes ou des filtres plus restrictifs.")
+    elif etat == "pret":
+        nom = os.path.basename(path)
+        st.markdown(f'<a href="{export.url(path)}" download="{nom}">📥 Télécharger {nom} ({detail / 1e6:.1f} Mo)</a>',
+                    unsafe_allow_html=True)
+
+@st.fragment
+def export_section():
+    """Choix de la vue, du format et des colonnes exportées."""
+    col_vue, col_format = st.columns(2)
+    vue = col_vue.radio("Table :", options=list(export.VIEWS), format_func=lambda x: export.VIEWS[x][0])
+    format_export = col_format.radio("Format :", options=list(export.FORMATS),
+                                     format_func=lambda x: export.FORMATS[x][0])
+    options = load_export_columns(data_version, sources, vue)
+    colonnes = st.multiselect("Colonnes exportées :", options=options,
+                              default=[c for c in export.DEFAULT_COLUMNS[vue] if c in options], key=f"colonnes_{vue}")
+    st.caption(f"Années {', '.join(map(str, sources))}, véhicules motorisés"
+               + (", filtres de la barre latérale appliqués" if filtres_croises else ""))
+    if not colonnes:
+        st.info("Choisissez au moins une colonne.")
+        return
+    if st.button("Préparer l'export"):
+        st.session_state["export"] = export.submit(data_version, sources, vue, colonnes, format_export,
+                                                   filtres_motorises, filtres_croises)
+    chemin = export.export_path(data_version, vue, colonnes, format_export, filtres_motorises, filtres_croises)
+    if st.session_state.get("export") == chemin:
+        etat, detail = export.status(chemin)
+        if etat == "en_cours":
+            export_progress(chemin)
+        else:
+            export_result(chemin, etat, detail)
+
+export_section()
+
+
+# Panneau d'instrumentation caché (paramètre d'URL ?admin=1)
+instrumentation.admin_panel()